@@ -0,0 +1,172 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from metrics import SharedState
+
+
+def user_suffix():
+    """-<uid> on systems with user IDs, so users of one machine never share a directory"""
+    return f"-{os.getuid()}" if hasattr(os, "getuid") else ""
+
+
+def default_cache_dir():
+    """$XDG_CACHE_HOME/offline-compiler, or a per-user directory in the temp dir"""
+    xdg_cache = os.environ.get("XDG_CACHE_HOME")
+    if xdg_cache and os.path.isabs(xdg_cache):
+        return os.path.join(xdg_cache, "offline-compiler")
+    return os.path.join(tempfile.gettempdir(), f"offline-compiler-cache{user_suffix()}")
+
+
+def private_dir(path):
+    """Create path accessible only to the current user, or check an existing one
+
+    Programs are run from these directories, so one that another user owns
+    or can write to could be used to plant binaries; PermissionError is
+    raised instead of using it.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return path
+    info = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path):
+        raise PermissionError(f"{path} is not a directory")
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by another user")
+    if info.st_mode & 0o022:
+        raise PermissionError(f"{path} is writable by other users")
+    return path
+
+
+class ArtifactCache:
+    """On-disk LRU cache of build artifacts keyed by a hash of their inputs"""
+
+    VERSION_TIMEOUT = 10
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._versions = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        # Hit, miss and eviction counts of every process using this directory
+        self.counters = SharedState(os.path.join(cache_dir, ".stats.json"))
+
+    def compiler_version(self, compiler):
+        """Return the resolved path and version banner of a compiler binary"""
+        path = shutil.which(compiler) or compiler
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = 0
+
+        with self._lock:
+            cached = self._versions.get(path)
+        if cached and cached[0] == mtime:
+            return path, cached[1]
+
+        try:
+            result = subprocess.run(
+                [path, "--version"],
+                capture_output=True,
+                text=True,
+                timeout=self.VERSION_TIMEOUT
+            )
+            version = result.stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            version = ""
+
+        with self._lock:
+            self._versions[path] = (mtime, version)
+        return path, version
+
+    def make_key(self, source, language, compiler_cmd):
+        """Hash the source, language, compiler binary/version and options"""
+        compiler_path, version = self.compiler_version(compiler_cmd[0])
+        digest = hashlib.sha256()
+        for part in [language, compiler_path, version, *compiler_cmd[1:], "", source]:
+            data = part.encode("utf-8", "surrogateescape")
+            digest.update(f"{len(data)}:".encode())
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def fetch(self, key, dest_path):
+        """Copy a cached artifact to dest_path, returning True on a hit"""
+        entry_path = self._entry_path(key)
+        with self._lock:
+            try:
+                # Touch the entry so eviction sees it as recently used
+                os.utime(entry_path)
+                try:
+                    os.link(entry_path, dest_path)
+                except OSError:
+                    shutil.copy2(entry_path, dest_path)
+            except FileNotFoundError:
+                self.counters.add(misses=1)
+                return False
+            self.counters.add(hits=1)
+            return True
+
+    def store(self, key, artifact_path):
+        """Add an artifact to the cache and evict old entries over the size limit"""
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            shutil.copy2(artifact_path, tmp_path)
+            # Atomic rename so concurrent readers never see a partial file
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        evictions = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evictions += 1
+        if evictions:
+            self.counters.add(evictions=evictions)
+
+    def stats(self):
+        """Return hit/miss counters and current cache usage"""
+        entries = self._entries()
+        counters = self.counters.read()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes
+        }
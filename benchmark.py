@@ -0,0 +1,315 @@
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from main import CodeCompiler
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "corpus")
+
+TOOLCHAINS = {"python": "python", "c": "gcc", "cpp": "g++", "rust": "rustc"}
+COMMENT_PREFIX = {"python": "#", "c": "//", "cpp": "//", "rust": "//"}
+
+
+def load_corpus(corpus_dir=CORPUS_DIR, languages=None):
+    """Return the benchmark programs whose toolchain is installed
+
+    Each program is a source file named after its language's extension,
+    with its stdin in an optional <file>.in next to it.
+    """
+    extensions = {ext: language for language, ext in CodeCompiler.SUPPORTED_LANGUAGES.items()}
+    programs = []
+    for name in sorted(os.listdir(corpus_dir)):
+        language = extensions.get(os.path.splitext(name)[1][1:])
+        if language is None or (languages and language not in languages):
+            continue
+        if not shutil.which(TOOLCHAINS[language]):
+            continue
+        with open(os.path.join(corpus_dir, name)) as f:
+            code = f.read()
+        input_path = os.path.join(corpus_dir, name + ".in")
+        user_input = ""
+        if os.path.exists(input_path):
+            with open(input_path) as f:
+                user_input = f.read()
+        programs.append({"name": name, "language": language, "code": code, "input": user_input})
+    return programs
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return round(ordered[rank - 1], 4)
+
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": round(max(values), 4)
+    }
+
+
+class InProcessClient:
+    """Calls CodeCompiler directly, as the /compile route does"""
+
+    def __init__(self, cache_dir, result_cache=False):
+        self.compiler = CodeCompiler(cache_dir=cache_dir)
+        if not result_cache:
+            # Measure real runs rather than memoized results
+            self.compiler.result_cache = None
+
+    def compile(self, code, user_input, language, options):
+        return self.compiler.compile_and_execute(code, user_input, language, options.split())
+
+
+class HttpClient:
+    """Posts to /compile, keeping one connection per thread"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.path = parts.path.rstrip("/") + "/compile"
+        self._local = threading.local()
+
+    def compile(self, code, user_input, language, options):
+        body = urlencode({"code": code, "input": user_input, "language": language, "options": options})
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                connection.request("POST", self.path, body, headers)
+                response = connection.getresponse()
+                return json.loads(response.read())
+            except (http.client.HTTPException, OSError):
+                # The server may close idle keep-alive connections
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+class LocalServer:
+    """Runs the Flask app on an ephemeral port in a background thread"""
+
+    def __init__(self, cache_dir, result_cache=False):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        import main
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self._main = main
+        self._compiler = main.compiler
+        main.compiler = CodeCompiler(cache_dir=cache_dir)
+        if not result_cache:
+            main.compiler.result_cache = None
+        self.server = make_server("127.0.0.1", 0, main.app, threaded=True, request_handler=QuietHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+        self._main.compiler = self._compiler
+
+
+def _unique(code, language):
+    """Make a submission miss every build cache while compiling the same"""
+    return f"{code}\n{COMMENT_PREFIX[language]} {uuid.uuid4().hex}\n"
+
+
+def run_benchmark(client, programs, iterations=3, concurrency=1, cold=False, options=None, warmup=1):
+    """Send every program iterations times and collect latency statistics
+
+    A warm-up pass runs first and is not measured. With cold=True every
+    submission is made unique so that compile caches never hit. Responses
+    marked "cached" come from the server's result cache; they are counted
+    and timed apart from real runs.
+    """
+    options = options or {}
+
+    def send(program):
+        code = _unique(program["code"], program["language"]) if cold else program["code"]
+        start = time.perf_counter()
+        try:
+            result = client.compile(code, program["input"], program["language"], options.get(program["language"], ""))
+        except Exception as e:
+            result = {"success": False, "compile_error": f"Benchmark client error: {e}"}
+        return program, time.perf_counter() - start, result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, programs * warmup))
+        start = time.perf_counter()
+        samples = list(executor.map(send, programs * iterations))
+        elapsed = time.perf_counter() - start
+
+    per_language = {}
+    errors = []
+    for program, latency, result in samples:
+        stats = per_language.setdefault(program["language"], {
+            "total": [], "compile": [], "run": [], "cached": [], "errors": 0
+        })
+        if not result.get("success") or result.get("exit_code") not in (0, None) or result.get("compile_error"):
+            stats["errors"] += 1
+            errors.append({"program": program["name"], "result": result})
+        if result.get("cached"):
+            # Answered from a server's result cache, with the timings of an earlier run
+            stats["cached"].append(latency)
+            continue
+        stats["total"].append(latency)
+        stats["compile"].append(result.get("build_time"))
+        stats["run"].append(result.get("run_time"))
+
+    return {
+        "requests": len(samples),
+        "cached_requests": sum(len(stats["cached"]) for stats in per_language.values()),
+        "elapsed": round(elapsed, 4),
+        "throughput_rps": round(len(samples) / elapsed, 4) if elapsed else None,
+        "latency": summarize([latency for _, latency, result in samples if not result.get("cached")]),
+        "languages": {
+            language: {
+                "requests": len(stats["total"]),
+                "errors": stats["errors"],
+                "total": summarize(stats["total"]),
+                "compile": summarize(stats["compile"]),
+                "run": summarize(stats["run"]),
+                "cached": summarize(stats["cached"])
+            }
+            for language, stats in sorted(per_language.items())
+        },
+        "errors": errors[:10]
+    }
+
+
+def _toolchain_versions(languages):
+    versions = {}
+    for language in languages:
+        try:
+            output = subprocess.run([TOOLCHAINS[language], "--version"], capture_output=True, text=True).stdout
+        except OSError:
+            continue
+        versions[language] = output.splitlines()[0] if output else ""
+    return versions
+
+
+def _git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(old, new):
+    """Return text lines comparing p50/p95 latencies of two saved runs"""
+    lines = [f"{'language':<8} {'phase':<8} {'p50 old':>9} {'p50 new':>9} {'p95 old':>9} {'p95 new':>9}"]
+    for language in sorted(set(old["languages"]) | set(new["languages"])):
+        for phase in ("total", "compile", "run"):
+            before = (old["languages"].get(language) or {}).get(phase) or {}
+            after = (new["languages"].get(language) or {}).get(phase) or {}
+            cells = [before.get("p50"), after.get("p50"), before.get("p95"), after.get("p95")]
+            lines.append(f"{language:<8} {phase:<8} " + " ".join(
+                f"{cell:>9.4f}" if cell is not None else f"{'-':>9}" for cell in cells
+            ))
+    lines.append(f"throughput: {old.get('throughput_rps')} -> {new.get('throughput_rps')} requests/s")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure compile and run latency of the compiler service")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", help="benchmark a running server instead of starting one (http mode)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=3, help="times each program is sent")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured passes over the corpus")
+    parser.add_argument("--languages", help="comma separated subset, e.g. python,c")
+    parser.add_argument("--cold", action="store_true", help="make every submission unique so build caches miss")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="let repeated submissions be answered from the result cache")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="print a comparison with an earlier results file")
+    args = parser.parse_args()
+
+    languages = args.languages.split(",") if args.languages else None
+    programs = load_corpus(args.corpus, languages)
+    if not programs:
+        parser.error("no benchmark programs with an installed toolchain")
+
+    cache_dir = tempfile.mkdtemp(prefix="offline-compiler-bench-")
+    server = None
+    try:
+        if args.mode == "inprocess":
+            client = InProcessClient(cache_dir, args.result_cache)
+        else:
+            if not args.url:
+                server = LocalServer(cache_dir, args.result_cache)
+            client = HttpClient(args.url or server.url)
+        results = run_benchmark(client, programs, args.iterations, args.concurrency, args.cold, warmup=args.warmup)
+    finally:
+        if server:
+            server.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    used_languages = sorted({program["language"] for program in programs})
+    results["meta"] = {
+        "mode": args.mode,
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "iterations": args.iterations,
+        "cold": args.cold,
+        "result_cache": args.result_cache,
+        "programs": [program["name"] for program in programs],
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "toolchains": _toolchain_versions(used_languages)
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print("\n".join(compare(previous, results)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+#include <stdio.h>
+
+int main() {
+    long n;
+    if (scanf("%ld", &n) != 1) return 1;
+    for (long i = 0; i < n; i++) printf("%ld %ld\n", i, i * i);
+    return 0;
+}
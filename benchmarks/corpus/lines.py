@@ -0,0 +1,4 @@
+import sys
+
+n = int(input())
+sys.stdout.write("".join(f"{i} {i * i}\n" for i in range(n)))
@@ -0,0 +1,12 @@
+use std::io::{self, BufWriter, Read, Write};
+
+fn main() {
+    let mut input = String::new();
+    io::stdin().read_to_string(&mut input).unwrap();
+    let n: u64 = input.trim().parse().unwrap();
+    let stdout = io::stdout();
+    let mut out = BufWriter::new(stdout.lock());
+    for i in 0..n {
+        writeln!(out, "{} {}", i, i * i).unwrap();
+    }
+}
@@ -0,0 +1,7 @@
+n = int(input())
+is_prime = bytearray([1]) * (n + 1)
+is_prime[0:2] = b"\x00\x00"
+for i in range(2, int(n ** 0.5) + 1):
+    if is_prime[i]:
+        is_prime[i * i::i] = bytearray(len(range(i * i, n + 1, i)))
+print(sum(is_prime))
@@ -0,0 +1,15 @@
+#include <algorithm>
+#include <iostream>
+#include <random>
+#include <vector>
+
+int main() {
+    int n;
+    std::cin >> n;
+    std::mt19937 rng(42);
+    std::vector<unsigned> values(n);
+    for (auto &value : values) value = rng();
+    std::sort(values.begin(), values.end());
+    std::cout << values[n / 2] << "\n";
+    return 0;
+}
@@ -0,0 +1,11 @@
+#include <bits/stdc++.h>
+using namespace std;
+
+int main() {
+    int n;
+    cin >> n;
+    map<int, int> counts;
+    for (int i = 0; i < n; i++) counts[i % 97]++;
+    cout << counts.size() << "\n";
+    return 0;
+}
@@ -0,0 +1,178 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+
+# Bundle name -> files under static/, in load order. The page loads the
+# EAGER_BUNDLES up front and the others the first time they are needed.
+BUNDLES = {
+    "editor.css": [
+        "css/codemirror/codemirror.min.css",
+        "css/codemirror/addon/fold/foldgutter.min.css",
+        "css/codemirror/addon/hint/show-hint.min.css",
+        "css/fontawesome/all.min.css",
+    ],
+    "editor.js": [
+        "js/codemirror/codemirror.min.js",
+        "js/codemirror/mode/rust/rust.min.js",
+        "js/codemirror/addon/edit/closebrackets.min.js",
+        "js/codemirror/addon/edit/matchbrackets.min.js",
+        "js/codemirror/addon/edit/closetag.min.js",
+        "js/codemirror/addon/fold/foldcode.min.js",
+        "js/codemirror/addon/fold/foldgutter.min.js",
+        "js/codemirror/addon/fold/brace-fold.min.js",
+        "js/codemirror/addon/fold/comment-fold.min.js",
+        "js/codemirror/addon/search/searchcursor.min.js",
+        "js/codemirror/addon/selection/active-line.min.js",
+        "js/codemirror/addon/comment/comment.min.js",
+        "js/codemirror/addon/display/placeholder.min.js",
+        # Hints open as soon as the user types, so they are not worth a lazy load
+        "js/codemirror/addon/hint/show-hint.min.js",
+        "js/codemirror/addon/hint/anyword-hint.min.js",
+        "js/codemirror/addon/edit/trailingspace.min.js",
+        "js/codemirror/keymap/sublime.min.js",
+    ],
+    "mode-python.js": ["js/codemirror/mode/python/python.min.js"],
+    "mode-clike.js": ["js/codemirror/mode/clike/clike.min.js"],
+    "theme-dracula.css": ["css/codemirror/theme/dracula.min.css"],
+    "theme-monokai.css": ["css/codemirror/theme/monokai.min.css"],
+    "theme-material.css": ["css/codemirror/theme/material.min.css"],
+    "theme-nord.css": ["css/codemirror/theme/nord.min.css"],
+    "theme-solarized.css": ["css/codemirror/theme/solarized.min.css"],
+    "search.css": [
+        "css/codemirror/addon/dialog/dialog.min.css",
+        "css/codemirror/addon/search/matchesonscrollbar.min.css",
+    ],
+    "search.js": [
+        "js/codemirror/addon/dialog/dialog.min.js",
+        "js/codemirror/addon/search/search.min.js",
+        "js/codemirror/addon/search/jump-to-line.min.js",
+        "js/codemirror/addon/search/match-highlighter.min.js",
+    ],
+    "beautify.js": [
+        "js/beautify/beautify.min.js",
+        "js/beautify/beautify-css.min.js",
+        "js/beautify/beautify-html.min.js",
+    ],
+}
+EAGER_BUNDLES = ["editor.css", "editor.js"]
+
+_SOURCE_MAP_PATTERN = re.compile(r'^\s*(//[#@]\s*sourceMappingURL=.*|/\*[#@]\s*sourceMappingURL=.*?\*/)\s*$', re.MULTILINE)
+_CSS_COMMENT_PATTERN = re.compile(r'/\*(?!!).*?\*/', re.DOTALL)
+_CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def rewrite_css_urls(css, source_path, bundle_dir="dist"):
+    """Make relative url(...) references in a stylesheet work from the bundle directory
+
+    Paths are relative to static/, using forward slashes.
+    """
+    source_dir = posixpath.dirname(source_path)
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(("data:", "http:", "https:", "/", "#")):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(posixpath.join(source_dir, path))
+        return f"url({quote}{posixpath.relpath(target, bundle_dir)}{suffix}{quote})"
+
+    return _CSS_URL_PATTERN.sub(replace, css)
+
+
+def minify_css(css):
+    """Drop comments (except /*! licenses */) and blank lines
+
+    Whitespace inside rules is left alone since it can be significant in
+    strings and calc() expressions.
+    """
+    css = _CSS_COMMENT_PATTERN.sub("", css)
+    return "\n".join(line.strip() for line in css.splitlines() if line.strip())
+
+
+def minify_js(js):
+    """Strip source map references and surrounding whitespace
+
+    The inputs are minified upstream; rewriting JavaScript any further
+    safely would need a real parser.
+    """
+    return _SOURCE_MAP_PATTERN.sub("", js).strip()
+
+
+def build_bundle(name, files, static_dir=STATIC_DIR):
+    """Return the concatenated, minified content of a bundle"""
+    parts = []
+    for path in files:
+        with open(os.path.join(static_dir, *path.split("/")), encoding="utf-8") as f:
+            content = f.read()
+        if name.endswith(".css"):
+            parts.append(minify_css(rewrite_css_urls(content, path)))
+        else:
+            # Separate scripts so one without a trailing semicolon cannot merge into the next
+            parts.append(minify_js(content) + "\n;")
+    return "\n".join(parts).encode("utf-8")
+
+
+def _write(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(bundles=None, static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Write content-hashed bundles with .gz/.br variants and a manifest
+
+    Returns the manifest, mapping bundle names to hashed file names.
+    """
+    bundles = BUNDLES if bundles is None else bundles
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    for name, files in bundles.items():
+        data = build_bundle(name, files, static_dir)
+        stem, ext = os.path.splitext(name)
+        hashed_name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        path = os.path.join(dist_dir, hashed_name)
+        _write(path, data)
+        _write(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli:
+            _write(path + ".br", brotli.compress(data, quality=11))
+        manifest[name] = hashed_name
+
+    # Remove bundles from earlier builds
+    keep = set(manifest.values())
+    for entry in os.listdir(dist_dir):
+        base = entry[:-3] if entry.endswith((".gz", ".br")) else entry
+        if entry != MANIFEST_NAME and base not in keep:
+            os.remove(os.path.join(dist_dir, entry))
+
+    _write(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle, fingerprint and precompress the editor's static assets")
+    parser.parse_args()
+    manifest = build()
+    for name, hashed_name in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(DIST_DIR, hashed_name))
+        gz_size = os.path.getsize(os.path.join(DIST_DIR, hashed_name + ".gz"))
+        print(f"{name} -> dist/{hashed_name} ({size} bytes, {gz_size} gzipped)")
+    if not brotli:
+        print("brotli is not installed; only gzip variants were written")
+
+
+if __name__ == '__main__':
+    main()
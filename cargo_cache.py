@@ -0,0 +1,419 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Path roots that never name a crates.io dependency
+RUST_BUILTIN_ROOTS = {
+    'std', 'core', 'alloc', 'proc_macro', 'test', 'crate', 'self', 'super', 'Self',
+    'bool', 'char', 'str', 'f32', 'f64',
+    'i8', 'i16', 'i32', 'i64', 'i128', 'isize',
+    'u8', 'u16', 'u32', 'u64', 'u128', 'usize',
+    # Tool attribute namespaces such as #[rustfmt::skip]
+    'rustfmt', 'clippy', 'rustdoc',
+}
+
+_RUST_NOISE_PATTERN = re.compile(
+    r'//[^\n]*'                        # line comments
+    r'|/\*.*?\*/'                      # block comments
+    r'|(?<!\w)r(#*)".*?"\1'            # raw strings
+    r'|b?"(?:\\.|[^"\\])*"'            # strings
+    r"|b?'(?:\\.|[^'\\])'",            # chars (leaves lifetimes alone)
+    re.S
+)
+_RUST_USE_PATTERN = re.compile(r'\buse\s+([^;]+);')
+_RUST_EXTERN_CRATE_PATTERN = re.compile(r'\bextern\s+crate\s+(\w+)')
+_RUST_LOCAL_ITEM_PATTERN = re.compile(
+    r'\b(?:mod|struct|enum|union|trait|type|fn|const|static)\s+(?:mut\s+)?(?!fn\b)(\w+)'
+)
+_RUST_PATH_ROOT_PATTERN = re.compile(r'(?<![\w:.$\'])([A-Za-z_]\w*)\s*::')
+
+
+def _split_use_list(items):
+    """Split the inside of a use-tree brace group on top-level commas"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(items):
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(items[start:i])
+            start = i + 1
+    parts.append(items[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _use_tree_roots(tree):
+    """Return the first path segment(s) of a use tree"""
+    tree = tree.strip()
+    if tree.startswith('::'):
+        tree = tree[2:].strip()
+    if tree.startswith('{'):
+        roots = []
+        for item in _split_use_list(tree[1:tree.rfind('}')]):
+            roots.extend(_use_tree_roots(item))
+        return roots
+    return [re.split(r'\s|::', tree, maxsplit=1)[0]]
+
+
+def _use_tree_bindings(tree, parent=None):
+    """Return the names a use tree brings into scope"""
+    tree = tree.strip()
+    if '{' in tree:
+        prefix, _, rest = tree.partition('{')
+        segments = [seg.strip() for seg in prefix.split('::') if seg.strip()]
+        last = segments[-1] if segments else parent
+        names = []
+        for item in _split_use_list(rest[:rest.rfind('}')]):
+            names.extend(_use_tree_bindings(item, last))
+        return names
+
+    alias = re.search(r'\bas\s+(\w+)$', tree)
+    if alias:
+        return [alias.group(1)]
+
+    segments = [seg.strip() for seg in tree.split('::') if seg.strip()]
+    if not segments or segments[-1] == '*':
+        return []
+    if segments[-1] == 'self':
+        return [segments[-2] if len(segments) > 1 else parent]
+    return [segments[-1]]
+
+
+def find_external_crates(code):
+    """Return the sorted crate names a Rust program refers to
+
+    Comments and string literals are ignored, and std/core paths, primitive
+    types, local modules, types, functions and constants, and names imported by `use` are not counted.
+    """
+    code = _RUST_NOISE_PATTERN.sub(' ', code)
+
+    crates = set(_RUST_EXTERN_CRATE_PATTERN.findall(code))
+    local_items = set(_RUST_LOCAL_ITEM_PATTERN.findall(code))
+    imported = set()
+    for tree in _RUST_USE_PATTERN.findall(code):
+        crates.update(_use_tree_roots(tree))
+        imported.update(name for name in _use_tree_bindings(tree) if name)
+
+    # Bare paths such as `rand::thread_rng()` need no `use` since 2018
+    body = _RUST_USE_PATTERN.sub(' ', code)
+    for root in _RUST_PATH_ROOT_PATTERN.findall(body):
+        if root not in imported and not root[0].isupper():
+            crates.add(root)
+
+    return sorted(crate for crate in crates - RUST_BUILTIN_ROOTS - local_items if crate)
+
+
+def _read_lockfile_versions(lockfile_path, root_package):
+    """Return {crate: version} for the direct dependencies in a Cargo.lock"""
+    with open(lockfile_path) as f:
+        content = f.read()
+
+    packages = []
+    for block in content.split('[[package]]')[1:]:
+        name = re.search(r'^name = "([^"]+)"', block, re.M)
+        version = re.search(r'^version = "([^"]+)"', block, re.M)
+        deps = re.search(r'^dependencies = \[(.*?)\]', block, re.M | re.S)
+        packages.append((
+            name.group(1),
+            version.group(1),
+            re.findall(r'"([^"]+)"', deps.group(1)) if deps else []
+        ))
+
+    versions = {}
+    for name, _, deps in packages:
+        if name != root_package:
+            continue
+        for dep in deps:
+            dep_name, _, dep_version = dep.partition(' ')
+            if not dep_version:
+                dep_version = next(v for n, v, _ in packages if n == dep_name)
+            versions[dep_name] = dep_version
+    return versions
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path, shared with other server processes
+
+    Yields the open lock file.
+    """
+    with open(path, "a+b") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield lock_file
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CargoCache:
+    """Persistent Cargo build state shared by requests using the same crates"""
+
+    # Crates built ahead of time by `python cargo_cache.py prewarm`
+    PREWARM_CRATES = [
+        "rand",
+        "regex",
+        "itertools",
+        "num",
+        "serde",
+        "serde_json",
+        "chrono",
+        "lazy_static",
+    ]
+    # Dependency sets that get a precomputed Cargo.lock when vendoring
+    KNOWN_DEPENDENCY_SETS = [[crate] for crate in PREWARM_CRATES] + [
+        ["serde", "serde_json"],
+        ["rand", "itertools"],
+    ]
+    PREWARM_TIMEOUT = 900
+
+    def __init__(self, cache_dir, vendor_dir=None):
+        self.cache_dir = cache_dir
+        self.vendor_dir = vendor_dir or os.path.join(cache_dir, "vendor")
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._vendor_manifest = (None, {})
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def vendor_crates_dir(self):
+        return os.path.join(self.vendor_dir, "crates")
+
+    @property
+    def vendor_manifest_path(self):
+        return os.path.join(self.vendor_dir, "versions.json")
+
+    def vendored_versions(self):
+        """Return {crate: version} for the vendored registry, or {} if absent"""
+        try:
+            mtime = os.path.getmtime(self.vendor_manifest_path)
+        except OSError:
+            return {}
+        if self._vendor_manifest[0] != mtime:
+            with open(self.vendor_manifest_path) as f:
+                self._vendor_manifest = (mtime, json.load(f))
+        return self._vendor_manifest[1]
+
+    def key(self, dependencies):
+        """Key a dependency set independently of detection order"""
+        joined = "\n".join(sorted(set(dependencies)))
+        # Re-vendoring changes the versions, so it starts a fresh cache
+        vendored = json.dumps(self.vendored_versions(), sort_keys=True)
+        return hashlib.sha256(f"{joined}\n{vendored}".encode()).hexdigest()[:16]
+
+    def _state_dir(self, dependencies):
+        state_dir = os.path.join(self.cache_dir, self.key(dependencies))
+        os.makedirs(state_dir, exist_ok=True)
+        return state_dir
+
+    def target_dir(self, dependencies):
+        return os.path.join(self._state_dir(dependencies), "target")
+
+    def binary_path(self, dependencies):
+        """Path of the release binary produced by build()"""
+        name = "rust_project.exe" if os.name == "nt" else "rust_project"
+        return os.path.join(self.target_dir(dependencies), "release", name)
+
+    def manifest(self, dependencies):
+        """Return Cargo.toml content for a project using the given crates"""
+        toml_content = '[package]\nname = "rust_project"\nversion = "0.1.0"\nedition = "2021"\n\n[dependencies]\n'
+        versions = self.vendored_versions()
+        for dep in sorted(set(dependencies)):
+            requirement = f"={versions[dep]}" if dep in versions else "*"
+            toml_content += f'{dep} = "{requirement}"\n'
+        return toml_content
+
+    def _write_source_config(self, cargo_dir):
+        """Point a project at the vendored registry instead of crates.io"""
+        config_dir = os.path.join(cargo_dir, ".cargo")
+        os.makedirs(config_dir, exist_ok=True)
+        crates_dir = self.vendor_crates_dir.replace("\\", "/")
+        with open(os.path.join(config_dir, "config.toml"), "w") as f:
+            f.write(
+                '[source.crates-io]\nreplace-with = "vendored-sources"\n\n'
+                f'[source.vendored-sources]\ndirectory = "{crates_dir}"\n'
+            )
+
+    def build_env(self, dependencies):
+        env = os.environ.copy()
+        env["CARGO_TARGET_DIR"] = self.target_dir(dependencies)
+        return env
+
+    @contextmanager
+    def lock(self, dependencies):
+        """Serialize builds that share a target directory"""
+        key = self.key(dependencies)
+        with self._locks_lock:
+            thread_lock = self._locks.setdefault(key, threading.Lock())
+        with thread_lock:
+            with file_lock(os.path.join(self._state_dir(dependencies), ".lock")):
+                yield
+
+    def prepare(self, cargo_dir, dependencies):
+        """Seed a fresh project with the lockfile resolved by earlier builds"""
+        if self.vendored_versions():
+            self._write_source_config(cargo_dir)
+        lockfile = os.path.join(self._state_dir(dependencies), "Cargo.lock")
+        if os.path.exists(lockfile):
+            shutil.copy2(lockfile, os.path.join(cargo_dir, "Cargo.lock"))
+
+    def build(self, cargo_dir, dependencies, timeout, incremental_dir=None):
+        """Run `cargo build --release` against the shared target directory
+
+        With incremental_dir, the project itself (but not its dependencies,
+        which stay shared) is compiled incrementally with its state kept there.
+        Must be called while holding lock(dependencies).
+        """
+        self.prepare(cargo_dir, dependencies)
+        build_cmd = ["cargo", "rustc" if incremental_dir else "build", "--release"]
+        if self.vendored_versions():
+            build_cmd.append("--offline")
+        if incremental_dir:
+            build_cmd += ["--", "-C", f"incremental={incremental_dir}"]
+        build_result = subprocess.run(
+            build_cmd,
+            cwd=cargo_dir,
+            env=self.build_env(dependencies),
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+        lockfile = os.path.join(cargo_dir, "Cargo.lock")
+        if build_result.returncode == 0 and os.path.exists(lockfile):
+            shutil.copy2(lockfile, os.path.join(self._state_dir(dependencies), "Cargo.lock"))
+        return build_result
+
+    def _write_project(self, cargo_dir, dependencies):
+        os.makedirs(os.path.join(cargo_dir, "src"), exist_ok=True)
+        with open(os.path.join(cargo_dir, "src", "main.rs"), "w") as f:
+            f.write("fn main() {}\n")
+        with open(os.path.join(cargo_dir, "Cargo.toml"), "w") as f:
+            f.write(self.manifest(dependencies))
+
+    def vendor(self, crates=None, timeout=None):
+        """Vendor crates and their dependencies into a local registry
+
+        Needs network access once; afterwards builds resolve every known
+        dependency set from the vendored copy with a precomputed Cargo.lock.
+        """
+        crates = sorted(set(crates or self.PREWARM_CRATES))
+        workspace = os.path.join(self.vendor_dir, "workspace")
+        shutil.rmtree(workspace, ignore_errors=True)
+        os.makedirs(workspace)
+        toml_content = '[package]\nname = "vendor_workspace"\nversion = "0.1.0"\nedition = "2021"\n\n[dependencies]\n'
+        for crate in crates:
+            toml_content += f'{crate} = "*"\n'
+        os.makedirs(os.path.join(workspace, "src"))
+        with open(os.path.join(workspace, "src", "main.rs"), "w") as f:
+            f.write("fn main() {}\n")
+        with open(os.path.join(workspace, "Cargo.toml"), "w") as f:
+            f.write(toml_content)
+
+        vendor_result = subprocess.run(
+            ["cargo", "vendor", "--versioned-dirs", self.vendor_crates_dir],
+            cwd=workspace,
+            capture_output=True,
+            text=True,
+            timeout=timeout or self.PREWARM_TIMEOUT
+        )
+        if vendor_result.returncode != 0:
+            print(vendor_result.stderr)
+            return False
+
+        versions = _read_lockfile_versions(os.path.join(workspace, "Cargo.lock"), "vendor_workspace")
+        tmp_path = self.vendor_manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(versions, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.vendor_manifest_path)
+        print(f"Vendored {len(versions)} crates into {self.vendor_crates_dir}")
+
+        for dependencies in self.KNOWN_DEPENDENCY_SETS:
+            if not set(dependencies) <= set(versions):
+                continue
+            self.generate_lockfile(dependencies)
+        return True
+
+    def generate_lockfile(self, dependencies):
+        """Resolve a dependency set against the vendored registry ahead of time"""
+        with tempfile.TemporaryDirectory() as cargo_dir:
+            self._write_project(cargo_dir, dependencies)
+            self._write_source_config(cargo_dir)
+            with self.lock(dependencies):
+                lock_result = subprocess.run(
+                    ["cargo", "generate-lockfile", "--offline"],
+                    cwd=cargo_dir,
+                    capture_output=True,
+                    text=True
+                )
+                if lock_result.returncode != 0:
+                    print(lock_result.stderr)
+                    return False
+                shutil.copy2(
+                    os.path.join(cargo_dir, "Cargo.lock"),
+                    os.path.join(self._state_dir(dependencies), "Cargo.lock")
+                )
+        print(f"Locked {' '.join(dependencies)}")
+        return True
+
+    def prewarm(self, crates=None, timeout=None):
+        """Build each crate once so later requests only compile user code"""
+        results = {}
+        for crate in crates or self.PREWARM_CRATES:
+            with tempfile.TemporaryDirectory() as cargo_dir:
+                self._write_project(cargo_dir, [crate])
+
+                try:
+                    with self.lock([crate]):
+                        build_result = self.build(cargo_dir, [crate], timeout or self.PREWARM_TIMEOUT)
+                    results[crate] = build_result.returncode == 0
+                    if not results[crate]:
+                        print(build_result.stderr)
+                except subprocess.TimeoutExpired:
+                    results[crate] = False
+            print(f"{crate}: {'ok' if results[crate] else 'failed'}")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the shared Cargo build cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prewarm_parser = subparsers.add_parser("prewarm", help="build popular crates ahead of time")
+    prewarm_parser.add_argument("crates", nargs="*", help=f"crates to build (default: {' '.join(CargoCache.PREWARM_CRATES)})")
+    vendor_parser = subparsers.add_parser("vendor", help="vendor crates into a local offline registry")
+    vendor_parser.add_argument("crates", nargs="*", help="crates to vendor (default: the prewarm list)")
+    args = parser.parse_args()
+
+    from main import CodeCompiler
+
+    cache = CodeCompiler().cargo_cache
+    if args.command == "prewarm":
+        results = cache.prewarm(args.crates)
+        raise SystemExit(0 if all(results.values()) else 1)
+    elif args.command == "vendor":
+        raise SystemExit(0 if cache.vendor(args.crates) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,253 +1,370 @@
+import argparse
+import hashlib
+import http.client
+import io
+import json
 import os
-import requests
-import urllib.parse
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import time
 import zipfile
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urljoin, urlsplit
 
-# Base directories (move these to the top)
-static_dir = "static"
-js_dir = os.path.join(static_dir, "js")
-css_dir = os.path.join(static_dir, "css")
-fonts_dir = os.path.join(static_dir, "fonts")
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT_DIR, "static")
+MANIFEST_PATH = os.path.join(ROOT_DIR, "dependencies.json")
+# Partially downloaded archives; single files resume from <path>.part
+DOWNLOAD_DIR = os.path.join(tempfile.gettempdir(), "offline-compiler-downloads")
 
-def file_exists_and_not_empty(file_path):
-    """
-    Check if a file exists and is not empty.
-    Returns True if the file exists and has content, False otherwise.
-    """
-    if os.path.exists(file_path):
-        return os.path.getsize(file_path) > 0
-    return False
+WORKERS = 8
+RETRIES = 3
+TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
 
-def check_already_install_dependencies_installed():
-    """
-    Check if all required dependencies are already installed.
-    Returns True if all files exist and are not empty, False otherwise.
+
+class DownloadError(Exception):
+    """Raised when a dependency cannot be fetched or fails verification"""
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Return the manifest: {"files": [...], "archives": [...]}
+
+    A file entry has path (relative to static/), url, sha256 and size. An
+    archive entry is a zip with a url, an optional sha256 and members, each
+    with name (inside the zip), path, sha256 and size.
     """
-    # Define paths to check for critical files
-    critical_files = [
-        os.path.join(js_dir, "codemirror", "codemirror.min.js"),
-        os.path.join(css_dir, "codemirror", "codemirror.min.css"),
-        os.path.join(js_dir, "beautify", "beautify.min.js"),
-        os.path.join(css_dir, "fontawesome", "all.min.css"),
-        os.path.join(fonts_dir, "fontawesome", "fa-solid-900.woff2")
-    ]
-    
-    # Check if all critical files exist and are not empty
-    for file_path in critical_files:
-        if not file_exists_and_not_empty(file_path):
-            print(f"Missing dependency: {file_path}")
-            return False
-        else:
-            print(f"Found dependency: {file_path}")
-    
-    print("All dependencies are already installed.")
-    return True
-
-# Add this code right after creating directories but before starting downloads
-if check_already_install_dependencies_installed():
-    print("Skipping download process as dependencies are already installed.")
-    exit(0)
-
-# Modified download function that checks if file exists before downloading
-# Modified download function that checks if file exists before downloading
-def download_file(url, save_path):
-    if file_exists_and_not_empty(save_path):
-        print(f"File already exists: {save_path}")
-        return True
-    
-    print(f"Downloading {url} to {save_path}")
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest.setdefault("files", [])
+    manifest.setdefault("archives", [])
+    return manifest
+
+
+def target_path(static_dir, path):
+    """Resolve a manifest path inside static_dir, refusing ones that escape it"""
+    parts = path.split("/")
+    if path.startswith("/") or ".." in parts or not all(parts):
+        raise DownloadError(f"Invalid path in manifest: {path}")
+    return os.path.join(static_dir, *parts)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_installed(path, entry):
+    """True if path exists with the entry's size and hash"""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-        print(f"Successfully downloaded {url}")
-        return True
-    except Exception as e:
-        print(f"Error downloading {url}: {e}")
+        if os.path.getsize(path) != entry["size"]:
+            return False
+    except OSError:
         return False
+    return file_sha256(path) == entry["sha256"]
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, one per thread and host"""
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _connections(self):
+        if not hasattr(self._local, "connections"):
+            self._local.connections = {}
+        return self._local.connections
+
+    def discard(self, url):
+        """Close the connection used for url, e.g. after an error"""
+        parts = urlsplit(url)
+        connection = self._connections().pop((parts.scheme, parts.netloc), None)
+        if connection:
+            connection.close()
+
+    def get(self, url, headers=None):
+        """Send a GET and return the response, whose body the caller must read"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise DownloadError(f"Unsupported URL: {url}")
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        connections = self._connections()
+        for attempt in range(2):
+            key = (parts.scheme, parts.netloc)
+            reused = key in connections
+            if not reused:
+                connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+                connections[key] = connection_class(parts.netloc, timeout=self.timeout)
+                with self._lock:
+                    self._all.append(connections[key])
+            try:
+                connections[key].request("GET", path, headers=headers or {})
+                return connections[key].getresponse()
+            except (OSError, http.client.HTTPException):
+                self.discard(url)
+                # The server may have closed an idle keep-alive connection
+                if not reused or attempt:
+                    raise
+
+    def close(self):
+        with self._lock:
+            for connection in self._all:
+                connection.close()
+            self._all = []
+
+
+def fetch(pool, url, part_path):
+    """Download url into part_path, continuing a partial file with a Range request"""
+    for _ in range(MAX_REDIRECTS + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = pool.get(url, headers)
+        try:
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                response.read()
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if response.status == 416:
+                # Nothing left to fetch; verification decides whether the file is good
+                response.read()
+                return
+            if response.status == 206 and (response.getheader("Content-Range") or "").startswith(f"bytes {offset}-"):
+                mode = "ab"
+            elif response.status in (200, 206):
+                # The server ignored the Range header; start over
+                mode = "wb"
+            else:
+                response.read()
+                raise DownloadError(f"HTTP {response.status} from {url}")
+            with open(part_path, mode) as f:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    f.write(chunk)
+            return
+        except (OSError, http.client.HTTPException):
+            pool.discard(url)
+            raise
+    raise DownloadError(f"Too many redirects from {url}")
 
-# Create directories
-def ensure_dir(directory):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
-# Base directories
-static_dir = "static"
-js_dir = os.path.join(static_dir, "js")
-css_dir = os.path.join(static_dir, "css")
-fonts_dir = os.path.join(static_dir, "fonts")
-
-# Ensure directories exist before checking for dependencies
-for directory in [static_dir, js_dir, css_dir, fonts_dir]:
-    ensure_dir(directory)
-
-# Now check if dependencies are already installed
-if check_already_install_dependencies_installed():
-    print("Skipping download process as dependencies are already installed.")
-    exit(0)
-# Create subdirectories for libraries
-codemirror_js_dir = os.path.join(js_dir, "codemirror")
-codemirror_css_dir = os.path.join(css_dir, "codemirror")
-fontawesome_css_dir = os.path.join(css_dir, "fontawesome")
-fontawesome_webfonts_dir = os.path.join(fonts_dir, "fontawesome")
-beautify_dir = os.path.join(js_dir, "beautify")
-
-# Ensure subdirectories exist
-for directory in [codemirror_js_dir, codemirror_css_dir, fontawesome_css_dir, 
-                  fontawesome_webfonts_dir, beautify_dir]:
-    ensure_dir(directory)
-
-# Create mode and addon directories for CodeMirror
-codemirror_mode_dir = os.path.join(codemirror_js_dir, "mode")
-codemirror_addon_dir = os.path.join(codemirror_js_dir, "addon")
-codemirror_keymap_dir = os.path.join(codemirror_js_dir, "keymap")
-codemirror_theme_dir = os.path.join(codemirror_css_dir, "theme")
-codemirror_css_addon_dir = os.path.join(codemirror_css_dir, "addon")
-
-# Ensure CodeMirror subdirectories exist
-for directory in [codemirror_mode_dir, codemirror_addon_dir, codemirror_keymap_dir, 
-                  codemirror_theme_dir, codemirror_css_addon_dir]:
-    ensure_dir(directory)
-
-# Further subdirectories for CodeMirror addons
-addon_subdirs = ["edit", "hint", "search", "dialog", "fold", "comment", "selection", "display"]
-for subdir in addon_subdirs:
-    ensure_dir(os.path.join(codemirror_addon_dir, subdir))
-    ensure_dir(os.path.join(codemirror_css_addon_dir, subdir))
-
-# Create mode subdirectories
-mode_subdirs = ["rust", "python", "clike"]
-for subdir in mode_subdirs:
-    ensure_dir(os.path.join(codemirror_mode_dir, subdir))
-
-# Function to download a file
-def download_file(url, save_path):
-    print(f"Downloading {url} to {save_path}")
+
+def download(pool, url, path, sha256=None, size=None, retries=RETRIES):
+    """Fetch url to path through path.part, verifying size and hash"""
+    part_path = path + ".part"
+    error = None
+    for attempt in range(retries):
+        if attempt:
+            time.sleep(min(2 ** attempt, 10))
+        try:
+            fetch(pool, url, part_path)
+        except (OSError, http.client.HTTPException, DownloadError) as e:
+            error = e
+            continue
+        actual_size = os.path.getsize(part_path)
+        if size is not None and actual_size < size:
+            # Resume on the next attempt
+            error = DownloadError(f"{url}: got {actual_size} of {size} bytes")
+            continue
+        if sha256 and file_sha256(part_path) != sha256:
+            os.remove(part_path)
+            error = DownloadError(f"{url}: SHA-256 mismatch")
+            continue
+        os.replace(part_path, path)
+        return
+    raise DownloadError(str(error))
+
+
+def _write_verified(read, path, entry):
+    """Write a file from a readable stream, keeping it only if it matches entry"""
+    part_path = path + ".part"
+    with open(part_path, "wb") as f:
+        shutil.copyfileobj(read, f, CHUNK_SIZE)
+    if not is_installed(part_path, entry):
+        os.remove(part_path)
+        raise DownloadError(f"{entry['path']}: SHA-256 mismatch")
+    os.replace(part_path, path)
+
+
+class Installer:
+    """Installs the manifest's files into static_dir from their URLs or a mirror
+
+    A mirror is a directory or base URL laid out like static/, or a tarball
+    of one as written by make_mirror().
+    """
+
+    def __init__(self, manifest, static_dir=STATIC_DIR, mirror=None, workers=WORKERS, retries=RETRIES,
+                 download_dir=DOWNLOAD_DIR):
+        self.manifest = manifest
+        self.static_dir = static_dir
+        self.mirror = mirror
+        self.workers = workers
+        self.retries = retries
+        self.download_dir = download_dir
+        self.pool = ConnectionPool()
+        self._tar_lock = threading.Lock()
+        self._tar = None
+        self._tar_members = None
+
+    def entries(self):
+        """Every installable file, archive members included"""
+        entries = list(self.manifest["files"])
+        for archive in self.manifest["archives"]:
+            entries.extend(archive["members"])
+        return entries
+
+    def run(self):
+        """Install whatever is missing or modified; returns {path: error} for failures"""
+        failures = {}
+        pending = [entry for entry in self.entries() if not is_installed(target_path(self.static_dir, entry["path"]), entry)]
+        if not pending:
+            print("All dependencies are already installed.")
+            return failures
+
+        def install(entry):
+            path = target_path(self.static_dir, entry["path"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                self._install_file(entry, path)
+                print(f"Installed {entry['path']}")
+            except (OSError, DownloadError, tarfile.TarError) as e:
+                failures[entry["path"]] = str(e)
+                print(f"Failed {entry['path']}: {e}", file=sys.stderr)
+
+        pending_paths = {entry["path"] for entry in pending}
+        # A mirror holds archive members as plain files
+        files = [entry for entry in (pending if self.mirror else self.manifest["files"]) if entry["path"] in pending_paths]
+        archives = [] if self.mirror else [
+            archive for archive in self.manifest["archives"]
+            if any(member["path"] in pending_paths for member in archive["members"])
+        ]
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                archive_futures = [executor.submit(self._install_archive, archive, pending_paths, failures)
+                                   for archive in archives]
+                list(executor.map(install, files))
+                for future in archive_futures:
+                    future.result()
+        finally:
+            self.pool.close()
+            if self._tar:
+                self._tar.close()
+        return failures
+
+    def _install_file(self, entry, path):
+        if self.mirror is None:
+            download(self.pool, entry["url"], path, entry["sha256"], entry["size"], self.retries)
+        elif self.mirror.startswith(("http://", "https://")):
+            url = self.mirror.rstrip("/") + "/" + quote(entry["path"])
+            download(self.pool, url, path, entry["sha256"], entry["size"], self.retries)
+        elif os.path.isdir(self.mirror):
+            with open(target_path(self.mirror, entry["path"]), "rb") as f:
+                _write_verified(f, path, entry)
+        else:
+            with self._tar_lock:
+                data = self._read_tar_member(entry["path"])
+            _write_verified(io.BytesIO(data), path, entry)
+
+    def _read_tar_member(self, path):
+        """Read a file from the mirror tarball; called with _tar_lock held"""
+        if self._tar is None:
+            self._tar = tarfile.open(self.mirror)
+            self._tar_members = {member.name: member for member in self._tar.getmembers() if member.isfile()}
+        for name in (f"static/{path}", path):
+            if name in self._tar_members:
+                return self._tar.extractfile(self._tar_members[name]).read()
+        raise DownloadError(f"{path} is not in {self.mirror}")
+
+    def _install_archive(self, archive, pending_paths, failures):
+        os.makedirs(self.download_dir, exist_ok=True)
+        archive_path = os.path.join(self.download_dir, os.path.basename(urlsplit(archive["url"]).path))
+        members = [member for member in archive["members"] if member["path"] in pending_paths]
+        try:
+            if not (os.path.exists(archive_path) and (not archive.get("sha256") or file_sha256(archive_path) == archive["sha256"])):
+                print(f"Downloading {archive['url']}")
+                download(self.pool, archive["url"], archive_path, archive.get("sha256"), retries=self.retries)
+            with zipfile.ZipFile(archive_path) as z:
+                for member in members:
+                    path = target_path(self.static_dir, member["path"])
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    try:
+                        with z.open(member["name"]) as f:
+                            _write_verified(f, path, member)
+                        print(f"Installed {member['path']}")
+                    except (KeyError, OSError, DownloadError) as e:
+                        failures[member["path"]] = str(e)
+                        print(f"Failed {member['path']}: {e}", file=sys.stderr)
+        except (OSError, DownloadError, zipfile.BadZipFile) as e:
+            for member in members:
+                failures.setdefault(member["path"], str(e))
+            print(f"Failed {archive['url']}: {e}", file=sys.stderr)
+            if isinstance(e, zipfile.BadZipFile):
+                os.remove(archive_path)
+            return
+        if not any(member["path"] in failures for member in members):
+            os.remove(archive_path)
+
+
+def make_mirror(manifest, output, static_dir=STATIC_DIR):
+    """Pack the installed dependencies into a tarball for --mirror"""
+    entries = Installer(manifest, static_dir).entries()
+    for entry in entries:
+        if not is_installed(target_path(static_dir, entry["path"]), entry):
+            raise DownloadError(f"{entry['path']} is missing or modified; install it first")
+    mode = "w:gz" if output.endswith((".tar.gz", ".tgz")) else "w"
+    with tarfile.open(output, mode) as tar:
+        for entry in entries:
+            tar.add(target_path(static_dir, entry["path"]), arcname=f"static/{entry['path']}")
+
+
+def write_manifest(manifest, path=MANIFEST_PATH, static_dir=STATIC_DIR):
+    """Record the hashes and sizes of the files currently in static_dir"""
+    for entry in Installer(manifest, static_dir).entries():
+        file_path = target_path(static_dir, entry["path"])
+        entry["sha256"] = file_sha256(file_path)
+        entry["size"] = os.path.getsize(file_path)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install the editor's JavaScript, CSS and fonts for offline use")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    parser.add_argument("--mirror", help="install from a directory, base URL or tarball laid out like static/")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="concurrent downloads")
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--make-mirror", metavar="TARBALL", help="pack the installed files for use with --mirror")
+    parser.add_argument("--write-manifest", action="store_true",
+                        help="update the manifest's hashes from the files in the static directory")
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-        print(f"Successfully downloaded {url}")
-        return True
-    except Exception as e:
-        print(f"Error downloading {url}: {e}")
-        return False
+        if args.write_manifest:
+            write_manifest(manifest, args.manifest, args.static_dir)
+            print(f"Updated {args.manifest}")
+            return
+        if args.make_mirror:
+            make_mirror(manifest, args.make_mirror, args.static_dir)
+            print(f"Wrote {args.make_mirror}")
+            return
+    except DownloadError as e:
+        sys.exit(str(e))
+
+    failures = Installer(manifest, args.static_dir, args.mirror, args.workers, args.retries).run()
+    if failures:
+        sys.exit(f"{len(failures)} dependencies could not be installed")
+    print("All dependencies are installed.")
 
-# Download CodeMirror main files
-codemirror_version = "5.65.2"
-codemirror_base_url = f"https://cdnjs.cloudflare.com/ajax/libs/codemirror/{codemirror_version}"
-
-# Main CodeMirror JS and CSS
-download_file(f"{codemirror_base_url}/codemirror.min.js", os.path.join(codemirror_js_dir, "codemirror.min.js"))
-download_file(f"{codemirror_base_url}/codemirror.min.css", os.path.join(codemirror_css_dir, "codemirror.min.css"))
-
-# CodeMirror Themes
-themes = ["dracula", "monokai", "material", "nord", "solarized"]
-for theme in themes:
-    download_file(f"{codemirror_base_url}/theme/{theme}.min.css", 
-                 os.path.join(codemirror_theme_dir, f"{theme}.min.css"))
-
-# CodeMirror Modes
-modes = [
-    {"name": "rust", "path": "rust/rust.min.js"},
-    {"name": "python", "path": "python/python.min.js"},
-    {"name": "clike", "path": "clike/clike.min.js"}
-]
-
-for mode in modes:
-    download_file(f"{codemirror_base_url}/mode/{mode['path']}", 
-                 os.path.join(codemirror_mode_dir, mode['path']))
-
-# CodeMirror Addons (JS)
-addons_js = [
-    {"category": "edit", "name": "closebrackets"},
-    {"category": "edit", "name": "matchbrackets"},
-    {"category": "edit", "name": "closetag"},
-    {"category": "edit", "name": "trailingspace"},
-    {"category": "fold", "name": "foldcode"},
-    {"category": "fold", "name": "foldgutter"},
-    {"category": "fold", "name": "brace-fold"},
-    {"category": "fold", "name": "comment-fold"},
-    {"category": "hint", "name": "show-hint"},
-    {"category": "hint", "name": "anyword-hint"},
-    {"category": "search", "name": "search"},
-    {"category": "search", "name": "searchcursor"},
-    {"category": "search", "name": "jump-to-line"},
-    {"category": "search", "name": "match-highlighter"},
-    {"category": "dialog", "name": "dialog"},
-    {"category": "selection", "name": "active-line"},
-    {"category": "comment", "name": "comment"},
-    {"category": "display", "name": "placeholder"}
-]
-
-for addon in addons_js:
-    addon_path = os.path.join(codemirror_addon_dir, addon["category"])
-    ensure_dir(addon_path)
-    download_file(f"{codemirror_base_url}/addon/{addon['category']}/{addon['name']}.min.js", 
-                 os.path.join(addon_path, f"{addon['name']}.min.js"))
-
-# CodeMirror Addons (CSS)
-addons_css = [
-    {"category": "hint", "name": "show-hint"},
-    {"category": "fold", "name": "foldgutter"},
-    {"category": "dialog", "name": "dialog"},
-    {"category": "search", "name": "matchesonscrollbar"}
-]
-
-for addon in addons_css:
-    addon_path = os.path.join(codemirror_css_addon_dir, addon["category"])
-    ensure_dir(addon_path)
-    download_file(f"{codemirror_base_url}/addon/{addon['category']}/{addon['name']}.min.css", 
-                 os.path.join(addon_path, f"{addon['name']}.min.css"))
-
-# CodeMirror Keymaps
-download_file(f"{codemirror_base_url}/keymap/sublime.min.js", 
-             os.path.join(codemirror_keymap_dir, "sublime.min.js"))
-
-# JS-Beautify
-beautify_version = "1.14.7"
-beautify_base_url = f"https://cdnjs.cloudflare.com/ajax/libs/js-beautify/{beautify_version}"
-
-download_file(f"{beautify_base_url}/beautify.min.js", 
-             os.path.join(beautify_dir, "beautify.min.js"))
-download_file(f"{beautify_base_url}/beautify-css.min.js", 
-             os.path.join(beautify_dir, "beautify-css.min.js"))
-download_file(f"{beautify_base_url}/beautify-html.min.js", 
-             os.path.join(beautify_dir, "beautify-html.min.js"))
-
-# Font Awesome (download zip and extract)
-fontawesome_version = "5.15.4"
-fontawesome_url = f"https://use.fontawesome.com/releases/v{fontawesome_version}/fontawesome-free-{fontawesome_version}-web.zip"
-
-print(f"Downloading Font Awesome {fontawesome_version}...")
-try:
-    response = requests.get(fontawesome_url)
-    response.raise_for_status()
-    
-    with zipfile.ZipFile(BytesIO(response.content)) as z:
-        # Extract CSS files
-        css_files = [f for f in z.namelist() if f.startswith(f"fontawesome-free-{fontawesome_version}-web/css/") and f.endswith(".min.css")]
-        for css_file in css_files:
-            filename = os.path.basename(css_file)
-            with open(os.path.join(fontawesome_css_dir, filename), 'wb') as f:
-                f.write(z.read(css_file))
-                print(f"Extracted {filename}")
-        
-        # Extract webfonts
-        webfont_files = [f for f in z.namelist() if f.startswith(f"fontawesome-free-{fontawesome_version}-web/webfonts/")]
-        for webfont_file in webfont_files:
-            filename = os.path.basename(webfont_file)
-            if filename:  # Skip directory entries
-                with open(os.path.join(fontawesome_webfonts_dir, filename), 'wb') as f:
-                    f.write(z.read(webfont_file))
-                    print(f"Extracted {filename}")
-    
-    print("Font Awesome extraction complete")
-except Exception as e:
-    print(f"Error downloading or extracting Font Awesome: {e}")
-
-print("All dependencies downloaded successfully!")
 
+if __name__ == '__main__':
+    main()
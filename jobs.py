@@ -0,0 +1,246 @@
+import json
+import math
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+
+def parse_pool_sizes(spec):
+    """Parse "python=4,rust=1" into {"python": 4, "rust": 1}"""
+    sizes = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        language, _, size = item.partition("=")
+        sizes[language.strip()] = int(size)
+    return sizes
+
+
+class QueueFull(Exception):
+    """Raised when a language's job queue has no room left"""
+
+    def __init__(self, language, retry_after):
+        super().__init__(f"Job queue for {language} is full")
+        self.retry_after = retry_after
+
+
+class Job:
+    """A queued compile request and, once finished, its result"""
+
+    def __init__(self, language, payload):
+        self.id = uuid.uuid4().hex
+        self.language = language
+        self.payload = payload
+        self.status = "queued"
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "language": self.language,
+            "status": self.status,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["language"], None)
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.result = data["result"]
+        job.created_at = data["created_at"]
+        job.started_at = data["started_at"]
+        job.finished_at = data["finished_at"]
+        return job
+
+
+class JobManager:
+    """Runs jobs on bounded per-language worker pools
+
+    With a state_dir, every job's status is also written there so that any
+    server process sharing the directory can answer polls for it.
+    """
+
+    DEFAULT_WORKERS = 2
+    QUEUE_LIMIT = 32
+    JOB_TTL = 600
+    # How often finished jobs are looked for in state_dir
+    EXPIRE_INTERVAL = 60
+
+    def __init__(self, run_job, workers=None, queue_limit=None, job_ttl=None, state_dir=None):
+        self.run_job = run_job
+        self.workers = workers or {}
+        self.queue_limit = queue_limit or self.QUEUE_LIMIT
+        self.job_ttl = job_ttl or self.JOB_TTL
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queues = {}
+        self._durations = {}
+        self._pid = None
+        self._closed = False
+        self._last_expire = 0
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def _queue_for(self, language):
+        """Return the language's queue, starting its workers on first use"""
+        with self._lock:
+            # Worker threads do not survive a fork, so start them per process
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queues = {}
+            if language not in self._queues:
+                job_queue = queue.Queue(maxsize=self.queue_limit)
+                for _ in range(self.workers.get(language, self.DEFAULT_WORKERS)):
+                    threading.Thread(target=self._worker, args=(job_queue,), daemon=True).start()
+                self._queues[language] = job_queue
+            return self._queues[language]
+
+    def submit(self, language, payload):
+        """Queue a job, raising QueueFull when the language's queue is at capacity"""
+        if self._closed:
+            # Shutting down; the client should retry against another process
+            raise QueueFull(language, 1)
+        job_queue = self._queue_for(language)
+        job = Job(language, payload)
+        with self._lock:
+            self._jobs[job.id] = job
+        # Written before a worker can pick the job up, so this never overwrites a later status
+        self._save(job)
+        try:
+            job_queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            self._remove(job.id)
+            raise QueueFull(language, self.retry_after(language))
+        return job
+
+    def get(self, job_id):
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir and re.fullmatch(r'[0-9a-f]{32}', job_id):
+            # Submitted to another server process
+            try:
+                with open(os.path.join(self.state_dir, f"{job_id}.json")) as f:
+                    job = Job.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError):
+                pass
+        return job
+
+    def _save(self, job):
+        if not self.state_dir:
+            return
+        path = os.path.join(self.state_dir, f"{job.id}.json")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _remove(self, job_id):
+        if self.state_dir:
+            try:
+                os.remove(os.path.join(self.state_dir, f"{job_id}.json"))
+            except OSError:
+                pass
+
+    def shutdown(self, timeout=None):
+        """Refuse new jobs and wait for queued and running ones to finish
+
+        Returns False if jobs were still unfinished after timeout seconds.
+        """
+        self._closed = True
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                queues = list(self._queues.values()) if self._pid == os.getpid() else []
+            if all(job_queue.unfinished_tasks == 0 for job_queue in queues):
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def retry_after(self, language):
+        """Estimate the seconds until the language's queue has room again"""
+        workers = self.workers.get(language, self.DEFAULT_WORKERS)
+        queued = self._queues[language].qsize() if language in self._queues else 0
+        with self._lock:
+            average = self._durations.get(language, 1.0)
+        return max(1, math.ceil(queued / max(workers, 1) * average))
+
+    def _worker(self, job_queue):
+        while True:
+            job = job_queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                result, status = self.run_job(**job.payload), "done"
+            except Exception as e:
+                result = {
+                    "success": False,
+                    "compile_error": f"Internal error: {str(e)}",
+                    "output": "",
+                    "runtime_error": ""
+                }
+                status = "failed"
+            finished = Job.from_dict(dict(job.to_dict(), status=status, result=result, finished_at=time.time()))
+            # Saved before this process reports it, so a finished job is never missing from the directory
+            self._save(finished)
+            job.result, job.finished_at = finished.result, finished.finished_at
+            job.status = status
+
+            # Moving average of job duration feeds the Retry-After estimate
+            duration = job.finished_at - job.started_at
+            with self._lock:
+                previous = self._durations.get(job.language, duration)
+                self._durations[job.language] = 0.8 * previous + 0.2 * duration
+            job_queue.task_done()
+
+    def _expire(self):
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.job_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            sweep = self.state_dir and time.time() - self._last_expire >= self.EXPIRE_INTERVAL
+            if sweep:
+                self._last_expire = time.time()
+        if not sweep:
+            return
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            try:
+                # A finished job's file is written when it finishes, so newer files are kept
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if not name.endswith(".tmp"):
+                    # Jobs still queued or running were last written long ago, too
+                    with open(path) as f:
+                        finished_at = json.load(f).get("finished_at")
+                    if finished_at is None or finished_at >= cutoff:
+                        continue
+                os.remove(path)
+            except (OSError, ValueError, AttributeError):
+                pass
@@ -0,0 +1,541 @@
+import hashlib
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+
+try:
+    import resource
+except ImportError:
+    # Windows has no rlimits; runs only get the wall-clock timeout there
+    resource = None
+
+# Statuses of runs stopped by a limit
+MEMORY_LIMIT = "memory_limit"
+CPU_LIMIT = "cpu_limit"
+PROCESS_LIMIT = "process_limit"
+FILE_SIZE_LIMIT = "file_size_limit"
+OPEN_FILES_LIMIT = "open_files_limit"
+
+# How programs report a failed allocation, fork or open once a limit is hit.
+# Only consulted for runs that failed.
+STDERR_PATTERNS = [
+    (MEMORY_LIMIT, re.compile(
+        r'MemoryError|std::bad_alloc|memory allocation of \d+ bytes failed|Cannot allocate memory|out of memory'
+    )),
+    # Shells report children killed by SIGXCPU and SIGXFSZ by name
+    (CPU_LIMIT, re.compile(r'CPU time limit exceeded')),
+    (FILE_SIZE_LIMIT, re.compile(r'File too large|\[Errno 27\]|File size limit exceeded')),
+    (OPEN_FILES_LIMIT, re.compile(r'Too many open files|\[Errno 24\]')),
+]
+# EAGAIN from fork() or thread creation. It has other causes and programs
+# may print it themselves, so it only counts as the reason a failed run
+# ended when it is among the last lines of its stderr.
+PROCESS_LIMIT_PATTERN = re.compile(r'Resource temporarily unavailable')
+PROCESS_LIMIT_LINES = 3
+
+# prlimit options for the rlimits ResourceLimits sets
+PRLIMIT_OPTIONS = {
+    "RLIMIT_AS": "--as",
+    "RLIMIT_CPU": "--cpu",
+    "RLIMIT_NPROC": "--nproc",
+    "RLIMIT_NOFILE": "--nofile",
+    "RLIMIT_FSIZE": "--fsize",
+}
+# How long a count of the user's processes is reused by user_task_count()
+TASK_COUNT_TTL = 1.0
+_task_count = (0.0, None)
+_task_count_lock = threading.Lock()
+
+
+def user_task_count():
+    """Processes and threads of this process's real user ID, or None without /proc
+
+    RLIMIT_NPROC is checked against this number. The count is reused for
+    TASK_COUNT_TTL seconds, since reading it scans every process.
+    """
+    global _task_count
+    with _task_count_lock:
+        counted_at, count = _task_count
+        if time.monotonic() - counted_at < TASK_COUNT_TTL:
+            return count
+        count = None
+        if os.path.isdir("/proc/self/task"):
+            uid = str(os.getuid())
+            count = 0
+            for name in os.listdir("/proc"):
+                if not name.isdigit():
+                    continue
+                try:
+                    with open(f"/proc/{name}/status") as f:
+                        fields = dict(line.split(":", 1) for line in f if ":" in line)
+                except OSError:
+                    continue
+                if fields.get("Uid", "").split()[:1] == [uid]:
+                    count += int(fields.get("Threads", "1"))
+        _task_count = (time.monotonic(), count)
+        return count
+
+
+# Moves the shell into a cgroup given as $0 and execs the rest of the command
+CGROUP_ENTER = 'echo $$ 2>/dev/null >"$0"; exec "$@"'
+# Source of UsageLauncher: usage-launcher FD COMMAND [ARG...]
+USAGE_LAUNCHER_SOURCE = r'''
+#define _GNU_SOURCE
+#include <errno.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/resource.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+#ifdef __linux__
+#include <sys/prctl.h>
+#endif
+
+static pid_t child;
+
+static void stop_child(int sig) {
+    (void) sig;
+    kill(child, SIGKILL);
+}
+
+int main(int argc, char **argv) {
+    if (argc < 3)
+        return 127;
+    int fd = atoi(argv[1]);
+    pid_t launcher = getpid();
+    child = fork();
+    if (child < 0) {
+        perror("fork");
+        return 127;
+    }
+    if (child == 0) {
+#ifdef __linux__
+        /* Killing the launcher kills the program */
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        if (getppid() != launcher)
+            _exit(127);
+#endif
+        close(fd);
+        execvp(argv[2], argv + 2);
+        perror(argv[2]);
+        _exit(127);
+    }
+    /* SIGTERM stops the program; the launcher still reaps it and reports */
+    struct sigaction stop = {0};
+    stop.sa_handler = stop_child;
+    sigemptyset(&stop.sa_mask);
+    sigaction(SIGTERM, &stop, NULL);
+    dprintf(fd, "%d\n", (int) child);
+
+    int status;
+    struct rusage usage;
+    while (wait4(child, &status, 0, &usage) < 0)
+        if (errno != EINTR)
+            return 127;
+    long peak = usage.ru_maxrss;
+#ifdef __APPLE__
+    /* Bytes there, KB elsewhere */
+    peak /= 1024;
+#endif
+    dprintf(fd, "%ld\n", peak);
+    close(fd);
+
+    if (WIFSIGNALED(status)) {
+        /* End the same way, without a core file of the launcher */
+        int sig = WTERMSIG(status);
+        struct rlimit no_core = {0, 0};
+        sigset_t set;
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(sig, SIG_DFL);
+        sigemptyset(&set);
+        sigaddset(&set, sig);
+        sigprocmask(SIG_UNBLOCK, &set, NULL);
+        raise(sig);
+    }
+    return WIFEXITED(status) ? WEXITSTATUS(status) : 1;
+}
+'''
+
+
+def classify(returncode, stderr="", events=None):
+    """Return the limit a finished run ran into, or None
+
+    events are the cgroup counters from Cgroup.events(), if the run had one.
+    """
+    events = events or {}
+    if events.get("oom_kill"):
+        return MEMORY_LIMIT
+    if events.get("pids_max"):
+        return PROCESS_LIMIT
+    if returncode is None or returncode == 0:
+        return None
+    if hasattr(signal, "SIGXCPU") and returncode == -signal.SIGXCPU:
+        return CPU_LIMIT
+    if hasattr(signal, "SIGXFSZ") and returncode == -signal.SIGXFSZ:
+        return FILE_SIZE_LIMIT
+    for status, pattern in STDERR_PATTERNS:
+        if pattern.search(stderr or ""):
+            return status
+    last_lines = "\n".join((stderr or "").rstrip().splitlines()[-PROCESS_LIMIT_LINES:])
+    if PROCESS_LIMIT_PATTERN.search(last_lines):
+        return PROCESS_LIMIT
+    return None
+
+
+class Cgroup:
+    """A cgroup v2 group for one run, created under a delegated parent
+
+    Each run gets its own group with the same cpu.weight, so the kernel
+    splits CPU time evenly between concurrent runs however many threads or
+    processes each starts. memory.max and pids.max bound the whole run
+    including its children.
+    """
+
+    CONTROLLERS = ("cpu", "memory", "pids")
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def create(cls, parent, memory_bytes=0, processes=0, cpu_weight=100):
+        """Create a group under parent, or return None if that is not possible"""
+        try:
+            with open(os.path.join(parent, "cgroup.subtree_control"), "w") as f:
+                f.write(" ".join(f"+{name}" for name in cls.CONTROLLERS))
+        except OSError:
+            # Already enabled, or not ours to change; whatever is enabled applies
+            pass
+        path = os.path.join(parent, f"run-{uuid.uuid4().hex}")
+        try:
+            os.mkdir(path)
+        except OSError:
+            return None
+        group = cls(path)
+        group._set("cpu.weight", cpu_weight)
+        if memory_bytes:
+            group._set("memory.max", memory_bytes)
+            group._set("memory.swap.max", 0)
+        if processes:
+            group._set("pids.max", processes)
+        return group
+
+    def _set(self, name, value):
+        try:
+            with open(os.path.join(self.path, name), "w") as f:
+                f.write(str(value))
+        except OSError:
+            pass
+
+    @property
+    def procs_path(self):
+        return os.path.join(self.path, "cgroup.procs")
+
+    def add(self, pid):
+        """Move an already running process into the group"""
+        try:
+            with open(self.procs_path, "w") as f:
+                f.write(str(pid))
+        except OSError:
+            pass
+
+    def _counter(self, name, key):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                for line in f:
+                    field, _, value = line.partition(" ")
+                    if field == key:
+                        return int(value)
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def memory_peak_kb(self):
+        """Peak memory use of the group in KB, or None before Linux 5.19"""
+        try:
+            with open(os.path.join(self.path, "memory.peak")) as f:
+                return int(f.read()) // 1024
+        except (OSError, ValueError):
+            return None
+
+    def events(self):
+        return {
+            "oom_kill": self._counter("memory.events", "oom_kill"),
+            "pids_max": self._counter("pids.events", "max")
+        }
+
+    def close(self):
+        """Kill whatever is left in the group and remove it"""
+        self._set("cgroup.kill", 1)
+        for _ in range(50):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                # Killed processes leave the group once they are reaped
+                time.sleep(0.01)
+
+
+class UsageLauncher:
+    """A small native launcher that measures the peak memory of a program
+
+    The ru_maxrss of a process forked from the server includes the server's
+    own high-water mark, which it keeps across exec. This launcher is exec'd
+    last, forks the program itself and reaps it with wait4, so the program
+    starts from a process of a few hundred KB and the figure is its own. It
+    writes the program's PID and, once the program has exited, its peak RSS
+    in KB as lines to the descriptor given as its first argument, then ends
+    the same way the program did. SIGTERM makes it kill the program, so a
+    stopped run still reports the program's usage.
+
+    It is built with the system C compiler on first use. path() is None
+    where that is not possible, and runs fall back to sampling /proc.
+    """
+
+    COMPILER = shutil.which("cc") or shutil.which("gcc")
+    BUILD_TIMEOUT = 60
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._path = None
+        self._built = False
+
+    def path(self):
+        """Path of the built launcher, or None"""
+        with self._lock:
+            if not self._built:
+                self._path = self._build()
+                self._built = True
+            return self._path
+
+    def _build(self):
+        if os.name != "posix" or not self.COMPILER:
+            return None
+        digest = hashlib.sha256(USAGE_LAUNCHER_SOURCE.encode()).hexdigest()[:16]
+        path = os.path.join(self.directory, f"usage-launcher-{digest}")
+        if os.access(path, os.X_OK):
+            return path
+        os.makedirs(self.directory, exist_ok=True)
+        fd, source = tempfile.mkstemp(suffix=".c", dir=self.directory)
+        output = source[:-2]
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(USAGE_LAUNCHER_SOURCE)
+            result = subprocess.run(
+                [self.COMPILER, "-O2", "-o", output, source],
+                capture_output=True,
+                timeout=self.BUILD_TIMEOUT
+            )
+            if result.returncode != 0:
+                return None
+            # Atomic, so concurrent builds in other processes never see half a file
+            os.replace(output, path)
+            return path
+        except (OSError, subprocess.SubprocessError):
+            return None
+        finally:
+            for leftover in (source, output):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+
+
+class ResourceLimits:
+    """Kernel-enforced limits for user programs
+
+    Address space, CPU seconds, open files, written file size and process
+    count are set as rlimits of the program, together with a nice level
+    that keeps the server ahead of the programs it runs. With
+    OFFLINE_COMPILER_CGROUP naming a delegated cgroup v2 directory every
+    run also gets a group of its own. 0 disables a limit.
+
+    RLIMIT_NPROC counts every process and thread of the server's user, not
+    only this run's. Unless a fixed limit is configured, each run may start
+    PROCESS_HEADROOM more than the user has when it starts, so a fork bomb
+    stays bounded without a cgroup.
+
+    The server is threaded, where running Python code between fork and exec
+    (Popen's preexec_fn) can deadlock on locks other threads held. So
+    command() applies the limits with small programs that exec the next:
+    sh to enter the cgroup, prlimit and nice. Only where one of those is
+    missing, e.g. prlimit outside Linux, does it fall back to preexec().
+    """
+
+    MEMORY_BYTES = int(os.environ.get("OFFLINE_COMPILER_MEMORY_LIMIT_MB", "1024")) * 1024 * 1024
+    CPU_SECONDS = int(os.environ.get("OFFLINE_COMPILER_CPU_LIMIT", "10"))
+    # None: PROCESS_HEADROOM above the user's current count, see the class docstring
+    PROCESSES = (
+        int(os.environ["OFFLINE_COMPILER_PROCESS_LIMIT"]) if os.environ.get("OFFLINE_COMPILER_PROCESS_LIMIT") else None
+    )
+    PROCESS_HEADROOM = int(os.environ.get("OFFLINE_COMPILER_PROCESS_HEADROOM", "64"))
+    OPEN_FILES = int(os.environ.get("OFFLINE_COMPILER_OPEN_FILES_LIMIT", "256"))
+    FILE_SIZE_BYTES = int(os.environ.get("OFFLINE_COMPILER_FILE_SIZE_LIMIT_MB", "16")) * 1024 * 1024
+    NICE = int(os.environ.get("OFFLINE_COMPILER_NICE", "5"))
+    CGROUP = os.environ.get("OFFLINE_COMPILER_CGROUP")
+    CGROUP_PROCESSES = 64
+    # Launchers used by command(); None where not installed
+    SHELL = shutil.which("sh")
+    PRLIMIT = shutil.which("prlimit")
+    NICE_COMMAND = shutil.which("nice")
+
+    def __init__(self, memory_bytes=None, cpu_seconds=None, processes=None, open_files=None,
+                 file_size_bytes=None, nice=None, cgroup=None, usage_launcher=None):
+        self.memory_bytes = self.MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.cpu_seconds = self.CPU_SECONDS if cpu_seconds is None else cpu_seconds
+        self.processes = self.PROCESSES if processes is None else processes
+        self.open_files = self.OPEN_FILES if open_files is None else open_files
+        self.file_size_bytes = self.FILE_SIZE_BYTES if file_size_bytes is None else file_size_bytes
+        self.nice = self.NICE if nice is None else nice
+        self.cgroup_parent = self.CGROUP if cgroup is None else cgroup
+        # A UsageLauncher measuring the peak memory of runs, if any
+        self.usage_launcher = usage_launcher
+
+    def usage_launcher_path(self):
+        """Path of the usage launcher command() can add, or None"""
+        return self.usage_launcher.path() if self.usage_launcher else None
+
+    def process_limit(self):
+        """RLIMIT_NPROC for a run starting now, or 0 for none"""
+        if self.processes is not None:
+            return self.processes
+        if self.cgroup_parent:
+            # pids.max bounds the run itself
+            return 0
+        count = user_task_count()
+        return count + self.PROCESS_HEADROOM if count is not None else 0
+
+    def unbounded_processes(self):
+        """Why runs have no bound on their processes, or None if they have one"""
+        if self.cgroup_parent:
+            return None
+        if self.processes == 0:
+            return "the process limit is turned off"
+        if self.processes is None and user_task_count() is None:
+            return "processes can only be counted through /proc"
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            return "RLIMIT_NPROC does not apply to root"
+        return None
+
+    def warn_if_unbounded(self):
+        """Warn once at startup when a fork bomb could exhaust the host"""
+        reason = self.unbounded_processes()
+        if reason:
+            warnings.warn(
+                f"Programs can start any number of processes: {reason}. "
+                "Set OFFLINE_COMPILER_CGROUP, or run the server as its own non-root user.",
+                RuntimeWarning
+            )
+
+    def rlimits(self):
+        """(resource, soft, hard) triples to apply, within the server's own hard limits"""
+        if resource is None:
+            return []
+        processes = self.process_limit()
+        wanted = [
+            ("RLIMIT_AS", self.memory_bytes, self.memory_bytes),
+            # SIGXCPU at the soft limit, SIGKILL a second later if it is caught
+            ("RLIMIT_CPU", self.cpu_seconds, self.cpu_seconds + 1),
+            ("RLIMIT_NPROC", processes, processes),
+            ("RLIMIT_NOFILE", self.open_files, self.open_files),
+            ("RLIMIT_FSIZE", self.file_size_bytes, self.file_size_bytes),
+        ]
+        limits = []
+        for name, soft, hard in wanted:
+            which = getattr(resource, name, None)
+            if not soft or which is None:
+                continue
+            current = resource.getrlimit(which)[1]
+            if current != resource.RLIM_INFINITY:
+                soft, hard = min(soft, current), min(hard, current)
+            limits.append((which, soft, hard))
+        return limits
+
+    def command(self, cmd, cgroup=None, usage_fd=None):
+        """Return (cmd, preexec_fn) for Popen that start cmd under these limits
+
+        cmd is prefixed with launchers that apply the limits and exec it,
+        so the program keeps the process ID Popen returns. preexec_fn is
+        None unless a launcher is missing.
+
+        With usage_fd the usage launcher comes last and reports to that
+        descriptor, which must be passed to the child; the program then runs
+        as its child instead.
+        """
+        if os.name != "posix":
+            return cmd, None
+        if usage_fd is not None:
+            cmd = [self.usage_launcher_path(), str(usage_fd), *cmd]
+        limits = self.rlimits()
+        needed = [
+            (self.SHELL, bool(cgroup)),
+            (self.PRLIMIT, bool(limits)),
+            (self.NICE_COMMAND, bool(self.nice)),
+        ]
+        if any(wanted and not path for path, wanted in needed):
+            return cmd, self.preexec(cgroup)
+
+        prefix = []
+        if cgroup:
+            prefix += [self.SHELL, "-c", CGROUP_ENTER, cgroup.procs_path]
+        if limits:
+            options = {getattr(resource, name): option for name, option in PRLIMIT_OPTIONS.items()}
+            prefix += [self.PRLIMIT, *(f"{options[which]}={soft}:{hard}" for which, soft, hard in limits), "--"]
+        if self.nice:
+            prefix += [self.NICE_COMMAND, "-n", str(self.nice)]
+        return prefix + list(cmd), None
+
+    def preexec(self, cgroup=None):
+        """Function for Popen's preexec_fn, or None where there is nothing to apply
+
+        Only used by command() when a launcher is missing; see the class
+        docstring.
+        """
+        if os.name != "posix":
+            return None
+        limits = self.rlimits()
+        nice = self.nice
+        procs_path = cgroup.procs_path if cgroup else None
+
+        def apply():
+            # Runs in the forked child: no locks, no imports
+            if procs_path:
+                try:
+                    with open(procs_path, "w") as f:
+                        f.write(str(os.getpid()))
+                except OSError:
+                    pass
+            if nice:
+                os.nice(nice)
+            for which, soft, hard in limits:
+                resource.setrlimit(which, (soft, hard))
+
+        return apply
+
+    def cgroup(self):
+        """A new Cgroup for one run, or None without a usable cgroup parent"""
+        if not self.cgroup_parent:
+            return None
+        processes = min(self.processes, self.CGROUP_PROCESSES) if self.processes else self.CGROUP_PROCESSES
+        return Cgroup.create(self.cgroup_parent, self.memory_bytes, processes)
+
+    def describe(self, status):
+        """Message for the user about a run stopped by a limit"""
+        return {
+            MEMORY_LIMIT: f"Memory limit exceeded (limit: {self.memory_bytes // 1024 // 1024} MB)",
+            CPU_LIMIT: f"CPU time limit exceeded (limit: {self.cpu_seconds} seconds)",
+            PROCESS_LIMIT: "Process limit exceeded",
+            FILE_SIZE_LIMIT: f"File size limit exceeded (limit: {self.file_size_bytes // 1024 // 1024} MB)",
+            OPEN_FILES_LIMIT: f"Open file limit exceeded (limit: {self.open_files})",
+        }.get(status, "")
@@ -1,8 +1,33 @@
 import os
-import subprocess
-import tempfile
+import json
 import re
-from flask import Flask, request, jsonify, render_template
+import subprocess
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from flask import Flask, Response, abort, request, jsonify, render_template, send_from_directory, stream_with_context, url_for
+
+from artifact_cache import ArtifactCache, default_cache_dir, private_dir
+from build_assets import BUNDLES, DIST_DIR, EAGER_BUNDLES, MANIFEST_NAME
+from cargo_cache import CargoCache, find_external_crates
+from jobs import JobManager, QueueFull, parse_pool_sizes
+from limits import ResourceLimits, UsageLauncher
+from metrics import Metrics, SharedState
+from microbench import (
+    MAX_RUNS, MAX_WARMUP, add_speedups, describe, parse_count, parse_opt_levels, with_opt_level
+)
+from pch_cache import PchCache
+from profiler import GMON_OUT, PROFILE_OPTIONS, PYTHON_PROFILE, python_command, read_gprof_profile, read_python_profile, unavailable
+from project import BuildError, is_link_option, object_path, parse_files, project_files, translation_units
+from python_pool import PythonPool
+from result_cache import ResultCache, is_deterministic
+from runner import capture_process, stream_process
+from serve import SERVICE_NAME
+from sessions import SessionWorkspaces
+from tracing import tracer
+from workspace import WorkspacePool
 
 
 
@@ -21,11 +46,150 @@ class CodeCompiler:
         'cpp': 'cpp'
     }
     
-    EXECUTION_TIMEOUT = 5
-    BUILD_TIMEOUT = 30
+    EXECUTION_TIMEOUT = int(os.environ.get("OFFLINE_COMPILER_RUN_TIMEOUT", "5"))
+    BUILD_TIMEOUT = int(os.environ.get("OFFLINE_COMPILER_BUILD_TIMEOUT", "30"))
+    
+    # Test cases run concurrently by judge() and the most accepted per request
+    JUDGE_WORKERS = os.cpu_count() or 2
+    JUDGE_MAX_CASES = 200
+    
+    CACHE_DIR = os.environ.get("OFFLINE_COMPILER_CACHE_DIR") or default_cache_dir()
+    ARTIFACT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+    OBJECT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    # Translation units of a multi-file project compiled at once
+    BUILD_WORKERS = os.cpu_count() or 2
+    # Pre-started Python interpreters kept ready; 0 disables the pool
+    PYTHON_POOL_SIZE = int(os.environ.get("OFFLINE_COMPILER_PYTHON_POOL", "0"))
+    # Bytes of program output kept per run; beyond it the program is killed,
+    # or with "drain" left to finish while the rest is discarded
+    OUTPUT_LIMIT = int(os.environ.get("OFFLINE_COMPILER_OUTPUT_LIMIT", str(1024 * 1024)))
+    OUTPUT_LIMIT_ACTION = os.environ.get("OFFLINE_COMPILER_OUTPUT_LIMIT_ACTION", "kill")
+    # Where per-request working directories live; defaults to /dev/shm if usable
+    WORKSPACE_DIR = os.environ.get("OFFLINE_COMPILER_WORKSPACE_DIR")
+    # Persistent Rust workspaces for clients that send a session token
+    SESSIONS_ENABLED = os.environ.get("OFFLINE_COMPILER_SESSIONS", "1") != "0"
+    SESSION_IDLE_TIMEOUT = int(os.environ.get("OFFLINE_COMPILER_SESSION_IDLE", str(30 * 60)))
+    SESSION_QUOTA_BYTES = int(os.environ.get("OFFLINE_COMPILER_SESSION_QUOTA_MB", "512")) * 1024 * 1024
+    # Measured runs per benchmark unless asked otherwise, and the wall time
+    # after which a benchmark stops starting new runs
+    BENCHMARK_RUNS = 10
+    BENCHMARK_TIME_LIMIT = int(os.environ.get("OFFLINE_COMPILER_BENCHMARK_TIME", "30"))
+    # gprof needs the program built with its runtime, which Cargo builds do not link
+    CRATES_NOT_PROFILED = "Programs using crates cannot be profiled"
+    # Identical submissions of deterministic programs share results for this
+    # many seconds; 0 disables the result cache
+    RESULT_CACHE_TTL = int(os.environ.get("OFFLINE_COMPILER_RESULT_CACHE_TTL", "60"))
+    RESULT_CACHE_BYTES = int(os.environ.get("OFFLINE_COMPILER_RESULT_CACHE_MB", "64")) * 1024 * 1024
+    
+    def __init__(self, cache_dir=None):
+        # Per-request state lives in thread-local storage so that concurrent
+        # requests sharing this instance get their own working directory
+        self._local = threading.local()
+        self.cache_dir = private_dir(cache_dir or self.CACHE_DIR)
+        self.artifact_cache = ArtifactCache(
+            os.path.join(self.cache_dir, "artifacts"),
+            self.ARTIFACT_CACHE_MAX_BYTES
+        )
+        self.object_cache = ArtifactCache(
+            os.path.join(self.cache_dir, "objects"),
+            self.OBJECT_CACHE_MAX_BYTES
+        )
+        self.pch_cache = PchCache(os.path.join(self.cache_dir, "pch"))
+        # rlimits, nice level and cgroup placement of every program run
+        self.limits = ResourceLimits(usage_launcher=UsageLauncher(os.path.join(self.cache_dir, "launchers")))
+        self.limits.warn_if_unbounded()
+        self.python_pool = PythonPool(self.PYTHON_POOL_SIZE, limits=self.limits) if self.PYTHON_POOL_SIZE else None
+        self.cargo_cache = CargoCache(
+            os.path.join(self.cache_dir, "cargo"),
+            os.environ.get("OFFLINE_COMPILER_VENDOR_DIR")
+        )
+        self.workspaces = WorkspacePool(self.WORKSPACE_DIR)
+        self.sessions = SessionWorkspaces(
+            os.path.join(self.cache_dir, "sessions"),
+            self.SESSION_IDLE_TIMEOUT,
+            self.SESSION_QUOTA_BYTES
+        ) if self.SESSIONS_ENABLED else None
+        # Shared by the worker processes of serve.py through files in the cache directory
+        self.metrics = Metrics(os.path.join(self.cache_dir, "stats", "metrics.json"))
+        self.result_cache = ResultCache(
+            self.RESULT_CACHE_TTL,
+            self.RESULT_CACHE_BYTES,
+            os.path.join(self.cache_dir, "stats", "results.json")
+        ) if self.RESULT_CACHE_TTL > 0 else None
+    
+    @property
+    def temp_dir(self):
+        """Working directory of the request running on the current thread"""
+        return getattr(self._local, "temp_dir", None)
+    
+    @temp_dir.setter
+    def temp_dir(self, value):
+        self._local.temp_dir = value
+    
+    @property
+    def incremental(self):
+        """Whether the current request builds in a persistent session workspace"""
+        return getattr(self._local, "incremental", False)
+    
+    @incremental.setter
+    def incremental(self, value):
+        self._local.incremental = value
+    
+    @property
+    def profiling(self):
+        """Whether the current request builds and runs its program under a profiler"""
+        return getattr(self._local, "profiling", False)
+    
+    @profiling.setter
+    def profiling(self, value):
+        self._local.profiling = value
     
-    def __init__(self):
-        self.temp_dir = None
+    @contextmanager
+    def _workspace(self, language, session=None, profile=False):
+        """Lease the working directory for a request
+        
+        Rust requests with a session token get the session's persistent
+        directory, where incremental compilation state survives between runs.
+        With profile, the program is built and run to produce a profile.
+        """
+        self.profiling = profile
+        try:
+            if session and language == 'rust' and self.sessions:
+                with self.sessions.lease(session) as session_dir:
+                    self.temp_dir = session_dir
+                    self.incremental = True
+                    try:
+                        yield session_dir
+                    finally:
+                        self.incremental = False
+            else:
+                with self.workspaces.lease() as temp_dir:
+                    self.temp_dir = temp_dir
+                    yield temp_dir
+        finally:
+            self.profiling = False
+    
+    @staticmethod
+    def _remove_stale(path):
+        """Remove an output left by an earlier run in a session workspace
+        
+        It may be a hard link into the artifact cache, which must not be
+        written through.
+        """
+        if os.path.lexists(path):
+            os.remove(path)
+    
+    @staticmethod
+    def _write_if_changed(path, content):
+        """Write a file unless it already holds content, keeping its mtime for Cargo"""
+        try:
+            with open(path) as f:
+                if f.read() == content:
+                    return
+        except OSError:
+            pass
+        with open(path, "w") as f:
+            f.write(content)
     
     def _create_source_file(self, code, language):
         """Create source file in temporary directory"""
@@ -35,55 +199,51 @@ class CodeCompiler:
         file_ext = self.SUPPORTED_LANGUAGES[language]
         source_file_path = os.path.join(self.temp_dir, f"main.{file_ext}")
         
-        with open(source_file_path, "w") as source_file:
+        with tracer.span("write_source", bytes=len(code)), open(source_file_path, "w") as source_file:
             source_file.write(code)
         
         return source_file_path
     
     def _execute_python(self, source_file_path, user_input):
         """Execute Python code"""
+        if self.profiling:
+            run_cmd, cwd = self._profile_command(["python", source_file_path], 'python')
+            result = self._run_command(run_cmd, user_input, cwd=cwd)
+            result["build_time"] = 0.0
+            result["profile"] = self._read_profile('python', run_cmd, cwd)
+            return result
+        
+        result = self._run_command(["python", source_file_path], user_input)
+        result["build_time"] = 0.0
+        return result
+    
+    @contextmanager
+    def _warm_python(self, run_cmd, user_input):
+        """Swap a `python main.py` command for a pre-started interpreter
+        
+        Yields (run_cmd, user_input): a worker from the Python pool with
+        the script header ahead of the input, or both unchanged when the
+        pool is off or empty, or run_cmd runs something else.
+        """
+        if not self.python_pool or not isinstance(run_cmd, list) or len(run_cmd) != 2 or run_cmd[0] != "python":
+            yield run_cmd, user_input
+            return
+        process = self.python_pool.acquire()
         try:
-            process = subprocess.Popen(
-                ["python", source_file_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            stdout, stderr = process.communicate(input=user_input, timeout=self.EXECUTION_TIMEOUT)
-            
-            return {
-                "success": True,
-                "compile_error": "",
-                "output": stdout,
-                "runtime_error": stderr
-            }
-        except subprocess.TimeoutExpired:
-            process.kill()
-            return {
-                "success": False,
-                "compile_error": "",
-                "output": "",
-                "runtime_error": f"Program execution timed out (limit: {self.EXECUTION_TIMEOUT} seconds)"
-            }
+            if process:
+                # A pre-started interpreter reads the script path before the input
+                yield process, PythonPool.script_header(run_cmd[1]) + user_input
+            else:
+                yield run_cmd, user_input
+        finally:
+            # Replacements start after the run so that they do not compete with it
+            self.python_pool.refill()
     
     def _needs_cargo(self, code):
         """Check if Rust code needs Cargo for external dependencies"""
-        dependencies = []
-        extern_crate_pattern = re.compile(r'extern crate (\w+);')
-        use_crate_pattern = re.compile(r'use (\w+)::')
-        
-        for line in code.splitlines():
-            extern_match = extern_crate_pattern.search(line)
-            if extern_match:
-                dependencies.append(extern_match.group(1))
-            
-            use_match = use_crate_pattern.search(line)
-            if use_match and use_match.group(1) not in ['std', 'core', 'alloc']:
-                dependencies.append(use_match.group(1))
-        
-        return len(dependencies) > 0, list(set(dependencies))
+        with tracer.span("needs_cargo"):
+            dependencies = find_external_crates(code)
+        return len(dependencies) > 0, dependencies
     
     def _create_cargo_project(self, code, dependencies):
         """Create Cargo project for Rust code with dependencies"""
@@ -91,119 +251,732 @@ class CodeCompiler:
         os.makedirs(os.path.join(cargo_dir, "src"), exist_ok=True)
         
         # Write main.rs
-        with open(os.path.join(cargo_dir, "src", "main.rs"), "w") as f:
-            f.write(code)
+        self._write_if_changed(os.path.join(cargo_dir, "src", "main.rs"), code)
         
         # Write Cargo.toml
-        toml_content = '[package]\nname = "rust_project"\nversion = "0.1.0"\nedition = "2021"\n\n[dependencies]\n'
-        for dep in dependencies:
-            toml_content += f'{dep} = "*"\n'
-        
-        with open(os.path.join(cargo_dir, "Cargo.toml"), "w") as f:
-            f.write(toml_content)
+        self._write_if_changed(os.path.join(cargo_dir, "Cargo.toml"), self.cargo_cache.manifest(dependencies))
         
         return cargo_dir
     
-    def _execute_cargo_project(self, cargo_dir, user_input):
-        """Build and run Cargo project"""
+    def _build_cargo_project(self, cargo_dir, dependencies):
+        """Build Cargo project and copy the produced binary into the temp dir"""
+        executable_path = os.path.join(self.temp_dir, "main.exe")
+        self._remove_stale(executable_path)
+        incremental_dir = os.path.join(self.temp_dir, "incremental") if self.incremental else None
         try:
-            # Build project
-            build_result = subprocess.run(
-                ["cargo", "build", "--release"],
-                cwd=cargo_dir,
-                capture_output=True,
-                text=True,
-                timeout=self.BUILD_TIMEOUT
-            )
-            
-            if build_result.returncode != 0:
-                return {
-                    "success": False,
-                    "compile_error": build_result.stderr,
-                    "output": ""
-                }
-            
-            # Run project
-            run_process = subprocess.Popen(
-                ["cargo", "run", "--release"],
-                cwd=cargo_dir,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            stdout, stderr = run_process.communicate(input=user_input, timeout=self.EXECUTION_TIMEOUT)
-            
-            return {
-                "success": True,
-                "compile_error": "",
-                "output": stdout,
-                "runtime_error": stderr
-            }
-            
+            # The target directory is shared with other requests using the
+            # same crates, so copy the binary out before releasing its lock
+            with self.cargo_cache.lock(dependencies), tracer.span("cargo_build", crates=len(dependencies)):
+                build_result = self.cargo_cache.build(cargo_dir, dependencies, self.BUILD_TIMEOUT, incremental_dir)
+                
+                if build_result.returncode != 0:
+                    return None, {
+                        "success": False,
+                        "compile_error": build_result.stderr,
+                        "output": ""
+                    }
+                
+                shutil.copy2(self.cargo_cache.binary_path(dependencies), executable_path)
         except subprocess.TimeoutExpired as e:
-            if 'run_process' in locals():
-                run_process.kill()
-            return {
+            return None, {
                 "success": False,
                 "compile_error": "",
                 "output": "",
                 "runtime_error": f"Process timed out: {str(e)}"
             }
+        
+        return executable_path, None
     
-    def _compile_and_run_executable(self, source_file_path, compiler_cmd, user_input):
-        """Compile and run executable for C/C++/Rust"""
+    def _execute_cargo_project(self, cargo_dir, user_input, dependencies):
+        """Build Cargo project and run the produced binary"""
+        build_start = time.perf_counter()
+        executable_path, error_result = self._build_cargo_project(cargo_dir, dependencies)
+        build_time = round(time.perf_counter() - build_start, 4)
+        if error_result:
+            error_result["build_time"] = build_time
+            return error_result
+        
+        result = self._run_executable(executable_path, user_input, cwd=cargo_dir)
+        result["build_time"] = build_time
+        if self.profiling:
+            result["profile"] = unavailable("gprof", self.CRATES_NOT_PROFILED)
+        return result
+    
+    def _rustc_command(self, compiler_options):
+        """rustc invocation, keeping incremental state in session workspaces"""
+        compiler_cmd = ["rustc"] + list(compiler_options)
+        if self.incremental:
+            compiler_cmd += ["-C", f"incremental={os.path.join(self.temp_dir, 'incremental')}"]
+        return compiler_cmd
+    
+    def _compile_executable(self, source_file_path, compiler_cmd, language, build_info=None):
+        """Compile an executable, reusing a cached build of identical inputs
+        
+        If build_info is a dict, details such as precompiled header use
+        are added to it.
+        """
         executable_path = os.path.join(self.temp_dir, "main.exe")
-        compile_cmd = compiler_cmd + [source_file_path, "-o", executable_path]
+        self._remove_stale(executable_path)
         
-        # Compile
-        compile_result = subprocess.run(
-            compile_cmd,
-            capture_output=True,
-            text=True
-        )
+        with open(source_file_path) as source_file:
+            source = source_file.read()
+        
+        with tracer.span("artifact_cache") as span:
+            cache_key = self.artifact_cache.make_key(source, language, compiler_cmd)
+            hit = self.artifact_cache.fetch(cache_key, executable_path)
+            span.set(hit=hit)
+        if hit:
+            return executable_path, None
+        
+        pch_options, pch_key = [], None
+        if language == 'cpp':
+            _, compiler_version = self.artifact_cache.compiler_version(compiler_cmd[0])
+            pch_options, pch_key = self.pch_cache.options_for(compiler_cmd, compiler_version, source)
+        
+        compile_start = time.perf_counter()
+        compile_cmd = compiler_cmd + pch_options + [source_file_path, "-o", executable_path]
+        with tracer.span("compile", compiler=compiler_cmd[0], pch=bool(pch_options)):
+            compile_result = subprocess.run(
+                compile_cmd,
+                capture_output=True,
+                text=True
+            )
         
         if compile_result.returncode != 0:
-            return {
+            return None, {
                 "success": False,
                 "compile_error": compile_result.stderr,
                 "output": ""
             }
         
-        # Run
+        if pch_key:
+            saved_time = self.pch_cache.record(pch_key, bool(pch_options), time.perf_counter() - compile_start)
+            if build_info is not None:
+                build_info["pch"] = {"used": bool(pch_options), "saved_time": saved_time}
+        
+        self.artifact_cache.store(cache_key, executable_path)
+        return executable_path, None
+    
+    def _create_project(self, code, files, language):
+        """Write a multi-file project into the temp dir, returning its translation units"""
+        files = project_files(code, files, language, f"main.{self.SUPPORTED_LANGUAGES[language]}")
+        for name, content in files.items():
+            path = os.path.join(self.temp_dir, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+        return translation_units(files, language)
+    
+    def _compile_object(self, workspace, source, compiler, options, language):
+        """Compile one translation unit, reusing a cached object of identical preprocessed input
+        
+        workspace is passed explicitly since this runs on a build pool
+        thread. Returns (cache key, object path, reused) or raises BuildError.
+        """
+        # Relative paths keep the preprocessor's line markers the same in every workspace
+        preprocessed = subprocess.run(
+            [compiler, *options, "-E", source],
+            capture_output=True,
+            cwd=workspace,
+            timeout=self.BUILD_TIMEOUT
+        )
+        if preprocessed.returncode != 0:
+            raise BuildError(preprocessed.stderr.decode(errors="replace"))
+        
+        # Except for the marker naming the working directory that GCC adds with -g
+        preprocessed_text = re.sub(
+            r'^# \d+ "[^"\n]*//"\n', "",
+            preprocessed.stdout.decode("utf-8", "surrogateescape"), count=1, flags=re.MULTILINE
+        )
+        key = self.object_cache.make_key(preprocessed_text, language, [compiler, *options, "-c"])
+        path = object_path(workspace, source)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._remove_stale(path)
+        if self.object_cache.fetch(key, path):
+            return key, path, True
+        
+        # Debug info names the workspace as ".", so the object suits every workspace
+        result = subprocess.run(
+            [compiler, *options, f"-fdebug-prefix-map={workspace}=.", "-c", source, "-o", path],
+            capture_output=True,
+            text=True,
+            cwd=workspace,
+            timeout=self.BUILD_TIMEOUT
+        )
+        if result.returncode != 0:
+            raise BuildError(result.stderr)
+        self.object_cache.store(key, path)
+        return key, path, False
+    
+    def _build_project(self, code, files, language, compiler_cmd, build_info=None):
+        """Build a multi-file C/C++ project
+        
+        Every translation unit compiles to its own object in parallel and
+        unchanged ones come from the object cache, so after an edit only the
+        changed files and the link step run. Returns (executable_path,
+        error_result) like _compile_executable.
+        """
         try:
-            run_process = subprocess.Popen(
-                [executable_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+            sources = self._create_project(code, files, language)
+        except ValueError as e:
+            return None, {"success": False, "compile_error": str(e), "output": ""}
+        workspace = self.temp_dir
+        compiler = compiler_cmd[0]
+        compile_options = [option for option in compiler_cmd[1:] if not is_link_option(option)]
+        link_options = [option for option in compiler_cmd[1:] if is_link_option(option)]
+        
+        try:
+            with tracer.span("compile_objects", total=len(sources)) as span, \
+                    ThreadPoolExecutor(max_workers=min(self.BUILD_WORKERS, len(sources))) as executor:
+                objects = list(executor.map(
+                    lambda source: self._compile_object(workspace, source, compiler, compile_options, language),
+                    sources
+                ))
+                span.set(reused=sum(reused for _, _, reused in objects))
+        except BuildError as e:
+            return None, {"success": False, "compile_error": str(e), "output": ""}
+        except subprocess.TimeoutExpired:
+            return None, {
+                "success": False,
+                "compile_error": f"Build timed out (limit: {self.BUILD_TIMEOUT} seconds)",
+                "output": ""
+            }
+        
+        if build_info is not None:
+            build_info["objects"] = {"total": len(objects), "reused": sum(reused for _, _, reused in objects)}
+        
+        executable_path = os.path.join(self.temp_dir, "main.exe")
+        self._remove_stale(executable_path)
+        link_key = self.artifact_cache.make_key("\n".join(key for key, _, _ in objects), language, compiler_cmd)
+        if self.artifact_cache.fetch(link_key, executable_path):
+            return executable_path, None
+        
+        # Libraries have to come after the objects that use them
+        with tracer.span("link"):
+            link_result = subprocess.run(
+                [compiler, *compile_options, *[path for _, path, _ in objects], *link_options, "-o", executable_path],
+                capture_output=True,
+                text=True,
+                cwd=self.temp_dir,
+                timeout=self.BUILD_TIMEOUT
             )
-            
-            stdout, stderr = run_process.communicate(input=user_input, timeout=self.EXECUTION_TIMEOUT)
-            
-            return {
+        if link_result.returncode != 0:
+            return None, {"success": False, "compile_error": link_result.stderr, "output": ""}
+        self.artifact_cache.store(link_key, executable_path)
+        return executable_path, None
+    
+    def _profile_command(self, run_cmd, language):
+        """Command and working directory for a run in profile mode
+        
+        Python scripts run under cProfile; executables built with
+        PROFILE_OPTIONS write gmon.out into their working directory. Either
+        goes to the workspace, cleared of an earlier run's profile first.
+        """
+        for name in (PYTHON_PROFILE, GMON_OUT):
+            self._remove_stale(os.path.join(self.temp_dir, name))
+        if language == 'python':
+            run_cmd = python_command(run_cmd[-1], os.path.join(self.temp_dir, PYTHON_PROFILE))
+        return run_cmd, self.temp_dir
+    
+    def _read_profile(self, language, run_cmd, cwd):
+        """Collect the profile of a run prepared with _profile_command"""
+        with tracer.span("profile"):
+            if language == 'python':
+                return read_python_profile(os.path.join(cwd, PYTHON_PROFILE))
+            return read_gprof_profile(run_cmd[0], os.path.join(cwd, GMON_OUT), self.BUILD_TIMEOUT)
+    
+    def _run_executable(self, executable_path, user_input, cwd=None):
+        """Run a compiled executable"""
+        return self._run_command([executable_path], user_input, cwd=cwd)
+    
+    def _run_command(self, run_cmd, user_input, cwd=None):
+        """Run a prepared program command with the execution timeout
+        
+        Python scripts run on a warm interpreter when the pool has one.
+        At most OUTPUT_LIMIT bytes of output are kept, and the program runs
+        under self.limits; "status" tells which limit, if any, stopped it.
+        """
+        with self._warm_python(run_cmd, user_input) as (run_cmd, user_input), tracer.span("run") as span:
+            capture = capture_process(
+                run_cmd,
+                user_input,
+                timeout=self.EXECUTION_TIMEOUT,
+                cwd=cwd,
+                output_limit=self.OUTPUT_LIMIT,
+                kill_on_limit=self.OUTPUT_LIMIT_ACTION == "kill",
+                limits=self.limits
+            )
+            span.set(status=capture["status"], pooled=not isinstance(run_cmd, list))
+        
+        if capture["timed_out"]:
+            result = {
+                "success": False,
+                "compile_error": "",
+                "output": "",
+                "runtime_error": f"Program execution timed out (limit: {self.EXECUTION_TIMEOUT} seconds)",
+                "exit_code": None
+            }
+        else:
+            result = {
                 "success": True,
                 "compile_error": "",
-                "output": stdout,
-                "runtime_error": stderr
+                "output": capture["stdout"],
+                "runtime_error": capture["stderr"],
+                "exit_code": capture["returncode"]
             }
-            
-        except subprocess.TimeoutExpired:
-            run_process.kill()
-            return {
+        
+        limit_message = self.limits.describe(capture["status"])
+        if limit_message:
+            result["runtime_error"] += ("\n" if result["runtime_error"] else "") + limit_message
+        
+        for key in ("status", "truncated", "run_time", "cpu_user_time", "cpu_system_time", "max_rss_kb"):
+            result[key] = capture[key]
+        return result
+    
+    def _compile_and_run_executable(self, source_file_path, compiler_cmd, user_input, language):
+        """Compile and run executable for C/C++/Rust"""
+        build_start = time.perf_counter()
+        build_info = {}
+        executable_path, error_result = self._compile_executable(source_file_path, compiler_cmd, language, build_info)
+        build_time = round(time.perf_counter() - build_start, 4)
+        if error_result:
+            error_result["build_time"] = build_time
+            return error_result
+        
+        if self.profiling:
+            run_cmd, cwd = self._profile_command([executable_path], language)
+            result = self._run_command(run_cmd, user_input, cwd=cwd)
+            result["profile"] = self._read_profile(language, run_cmd, cwd)
+        else:
+            result = self._run_executable(executable_path, user_input)
+        result["build_time"] = build_time
+        result.update(build_info)
+        return result
+    
+    @staticmethod
+    def _c_compiler_command(language, compiler_options):
+        return ["gcc" if language == 'c' else "g++"] + list(compiler_options)
+    
+    def _build_and_run_project(self, code, files, language, compiler_options, user_input):
+        """Build and run a multi-file C/C++ project"""
+        build_start = time.perf_counter()
+        build_info = {}
+        compiler_cmd = self._c_compiler_command(language, compiler_options)
+        executable_path, error_result = self._build_project(code, files, language, compiler_cmd, build_info)
+        build_time = round(time.perf_counter() - build_start, 4)
+        if error_result:
+            error_result["build_time"] = build_time
+            return error_result
+        
+        if self.profiling:
+            run_cmd, cwd = self._profile_command([executable_path], language)
+            result = self._run_command(run_cmd, user_input, cwd=cwd)
+            result["profile"] = self._read_profile(language, run_cmd, cwd)
+        else:
+            result = self._run_executable(executable_path, user_input, cwd=self.temp_dir)
+        result["build_time"] = build_time
+        result.update(build_info)
+        return result
+    
+    def _prepare_program(self, code, language, compiler_options, files=None):
+        """Build code in the temp dir and return the command that runs it
+        
+        Returns (run_cmd, cwd, error_result); error_result is set instead
+        of run_cmd when the build failed. With files, code and files form a
+        multi-file C/C++ project.
+        """
+        if self.profiling:
+            compiler_options = list(compiler_options) + PROFILE_OPTIONS.get(language, [])
+        
+        if files:
+            executable_path, error_result = self._build_project(
+                code, files, language, self._c_compiler_command(language, compiler_options)
+            )
+            return [executable_path], None, error_result
+        
+        source_file_path = self._create_source_file(code, language)
+        
+        if language == 'python':
+            return ["python", source_file_path], None, None
+        
+        if language == 'rust':
+            needs_cargo, dependencies = self._needs_cargo(code)
+            if needs_cargo:
+                cargo_dir = self._create_cargo_project(code, dependencies)
+                executable_path, error_result = self._build_cargo_project(cargo_dir, dependencies)
+                return [executable_path], cargo_dir, error_result
+            compiler_cmd = self._rustc_command(compiler_options)
+        elif language == 'c':
+            compiler_cmd = ["gcc"] + list(compiler_options)
+        else:
+            compiler_cmd = ["g++"] + list(compiler_options)
+        
+        executable_path, error_result = self._compile_executable(source_file_path, compiler_cmd, language)
+        return [executable_path], None, error_result
+    
+    def stream_compile_and_execute(self, code, user_input, language, compiler_options, session=None, files=None,
+                                   profile=False):
+        """Compile code and yield (event, data) pairs while the program runs
+        
+        Events are "compile" once the build is done, "stdout" and "stderr"
+        text chunks as the program writes them, and a final "exit". With
+        profile, the exit event carries the program's profile.
+        
+        Deterministic programs go through the result cache like
+        compile_and_execute(): a recent identical run, or one still in
+        progress elsewhere, is replayed with "cached" set on the exit event.
+        """
+        def run():
+            return self._stream_compile_and_execute(code, user_input, language, compiler_options, session, files,
+                                                    profile)
+        
+        sources = "\n".join([code, *(files or {}).values()])
+        if not self.result_cache or profile or not is_deterministic(language, sources):
+            yield from run()
+            return
+        
+        # Stored apart from compile_and_execute() results, which are not events
+        key = "stream:" + ResultCache.make_key(language, code, compiler_options, user_input, files)
+        cached, pending, leader = self.result_cache.claim(key)
+        if not leader:
+            cached = cached or pending.wait()
+            if cached is None:
+                # The run we waited for failed or was abandoned by its client
+                yield from run()
+                return
+            tracer.annotate(cached=True)
+            for event, data in cached["events"]:
+                yield event, dict(data, cached=True) if event == "exit" else data
+            return
+        
+        events = []
+        result = None
+        try:
+            with closing(run()) as stream:
+                for event, data in stream:
+                    events.append((event, data))
+                    yield event, data
+            result = {"events": events}
+        finally:
+            # A client that disconnects leaves result unset, so waiters run the program themselves
+            self.result_cache.release(key, pending, result, self._reproducible_stream)
+    
+    def _stream_compile_and_execute(self, code, user_input, language, compiler_options, session=None, files=None,
+                                    profile=False):
+        """stream_compile_and_execute() without the result cache"""
+        try:
+            with self._workspace(language, session, profile):
+                build_start = time.perf_counter()
+                run_cmd, cwd, error_result = self._prepare_program(code, language, compiler_options, files)
+                build_time = round(time.perf_counter() - build_start, 4)
+                
+                if error_result:
+                    error_result["build_time"] = build_time
+                    yield "compile", error_result
+                    yield "exit", {"success": False, "returncode": None}
+                    return
+                
+                # Only Cargo builds run in a directory of their own
+                profile_cmd = profile and cwd is None
+                if profile_cmd:
+                    run_cmd, cwd = self._profile_command(run_cmd, language)
+                
+                yield "compile", {"success": True, "build_time": build_time}
+                with self._warm_python(run_cmd, user_input) as (process_cmd, process_input):
+                    events = stream_process(
+                        process_cmd,
+                        process_input,
+                        self.EXECUTION_TIMEOUT,
+                        cwd=cwd,
+                        output_limit=self.OUTPUT_LIMIT,
+                        kill_on_limit=self.OUTPUT_LIMIT_ACTION == "kill",
+                        limits=self.limits
+                    )
+                    for event, data in events:
+                        if event == "exit":
+                            data["success"] = not data["timed_out"]
+                            if data["timed_out"]:
+                                data["runtime_error"] = f"Program execution timed out (limit: {self.EXECUTION_TIMEOUT} seconds)"
+                            elif self.limits.describe(data["status"]):
+                                data["runtime_error"] = self.limits.describe(data["status"])
+                            self.metrics.observe(language, dict(data, build_time=build_time))
+                            if profile_cmd:
+                                data["profile"] = self._read_profile(language, run_cmd, cwd)
+                            elif profile:
+                                data["profile"] = unavailable("gprof", self.CRATES_NOT_PROFILED)
+                        yield event, data
+        
+        except Exception as e:
+            yield "compile", {
                 "success": False,
-                "compile_error": "",
+                "compile_error": f"Internal error: {str(e)}",
                 "output": "",
-                "runtime_error": f"Program execution timed out (limit: {self.EXECUTION_TIMEOUT} seconds)"
+                "runtime_error": "",
+                "error": tracer.error_info(e)
             }
+            yield "exit", {"success": False, "returncode": None}
+    
+    @staticmethod
+    def _outputs_match(output, expected):
+        """Compare outputs ignoring trailing whitespace on lines and at the end"""
+        def normalize(text):
+            return [line.rstrip() for line in text.rstrip().splitlines()]
+        return normalize(output) == normalize(expected)
     
-    def compile_and_execute(self, code, user_input, language, compiler_options):
-        """Main method to compile and execute code"""
+    def _judge_case(self, run_cmd, cwd, index, case):
+        """Run one test case and assign it a verdict"""
+        result = self._run_command(run_cmd, case.get("input", ""), cwd=cwd)
+        expected = case.get("expected")
+        
+        if result["exit_code"] is None:
+            verdict = "time_limit_exceeded"
+        elif result["truncated"]:
+            verdict = "output_limit_exceeded"
+        elif result["status"] not in ("ok", "runtime_error"):
+            # memory_limit_exceeded, cpu_limit_exceeded, process_limit_exceeded, ...
+            verdict = f"{result['status']}_exceeded"
+        elif result["exit_code"] != 0:
+            verdict = "runtime_error"
+        elif expected is None:
+            verdict = "ok"
+        elif self._outputs_match(result["output"], expected):
+            verdict = "accepted"
+        else:
+            verdict = "wrong_answer"
+        
+        return {
+            "index": index,
+            "verdict": verdict,
+            "output": result["output"],
+            "runtime_error": result["runtime_error"],
+            "exit_code": result["exit_code"],
+            "status": result["status"],
+            "truncated": result["truncated"],
+            "run_time": result["run_time"],
+            "cpu_user_time": result["cpu_user_time"],
+            "cpu_system_time": result["cpu_system_time"],
+            "max_rss_kb": result["max_rss_kb"]
+        }
+    
+    def judge(self, code, language, compiler_options, cases, files=None):
+        """Compile once and run every test case concurrently
+        
+        Each case is a dict with "input" and optionally "expected" output;
+        EXECUTION_TIMEOUT applies to each case separately.
+        """
         try:
-            with tempfile.TemporaryDirectory() as temp_dir:
+            with self.workspaces.lease() as temp_dir:
                 self.temp_dir = temp_dir
+                build_start = time.perf_counter()
+                run_cmd, cwd, error_result = self._prepare_program(code, language, compiler_options, files)
+                build_time = round(time.perf_counter() - build_start, 4)
+                
+                self.metrics.observe(language, {"build_time": build_time})
+                if error_result:
+                    error_result.update({"build_time": build_time, "cases": []})
+                    return error_result
+                
+                # Every case runs in its own child process; the threads only wait on them
+                with ThreadPoolExecutor(max_workers=self.JUDGE_WORKERS) as executor:
+                    results = list(executor.map(
+                        lambda item: self._judge_case(run_cmd, cwd, *item),
+                        enumerate(cases)
+                    ))
+                for case in results:
+                    self.metrics.observe(language, case)
+        
+        except Exception as e:
+            return {
+                "success": False,
+                "compile_error": f"Internal error: {str(e)}",
+                "output": "",
+                "runtime_error": "",
+                "error": tracer.error_info(e),
+                "cases": []
+            }
+        
+        verdicts = [case["verdict"] for case in results]
+        return {
+            "success": True,
+            "compile_error": "",
+            "build_time": build_time,
+            "cases": results,
+            "summary": {
+                "total": len(results),
+                "passed": sum(verdict in ("accepted", "ok") for verdict in verdicts),
+                "verdict": next((v for v in verdicts if v not in ("accepted", "ok")), "accepted")
+            }
+        }
+    
+    def benchmark_program(self, code, user_input, language, compiler_options, runs=None, warmup=1,
+                          opt_levels=None, files=None):
+        """Build once per variant and time repeated runs of the program
+        
+        The variants are compiler_options at each of opt_levels, or only
+        compiler_options. Builds go through the artifact cache as usual.
+        After warmup unmeasured rounds, the variants take turns for runs
+        measured rounds, so that changes in machine load affect them alike.
+        No new round starts after BENCHMARK_TIME_LIMIT seconds.
+        """
+        runs = self.BENCHMARK_RUNS if runs is None else runs
+        option_sets = [with_opt_level(compiler_options, language, level) for level in opt_levels or []]
+        try:
+            with self._workspace(language):
+                variants = []
+                for options in option_sets or [list(compiler_options)]:
+                    build_start = time.perf_counter()
+                    run_cmd, cwd, error_result = self._prepare_program(code, language, options, files)
+                    build_time = round(time.perf_counter() - build_start, 4)
+                    if error_result:
+                        if opt_levels:
+                            error_result["compile_error"] = f"With {' '.join(options)}:\n{error_result['compile_error']}"
+                        error_result["build_time"] = build_time
+                        return error_result
+                    if cwd is not None and opt_levels:
+                        return {
+                            "success": False,
+                            "compile_error": "Optimization levels cannot be compared for programs using crates",
+                            "output": "",
+                            "runtime_error": "",
+                            "build_time": build_time
+                        }
+                    if language != 'python':
+                        # The next variant's build replaces main.exe
+                        executable_path = os.path.join(self.temp_dir, f"benchmark-{len(variants)}.exe")
+                        os.replace(run_cmd[0], executable_path)
+                        run_cmd = [executable_path]
+                    variants.append({
+                        "options": " ".join(options),
+                        "build_time": build_time,
+                        "run_cmd": run_cmd,
+                        "cwd": cwd,
+                        "first_run": None,
+                        "wall_times": [],
+                        "cpu_times": [],
+                        "max_rss_kb": None
+                    })
+                
+                deadline = time.perf_counter() + self.BENCHMARK_TIME_LIMIT
+                rounds = 0
+                while rounds < warmup + runs and time.perf_counter() < deadline:
+                    for variant in variants:
+                        if variant.get("error"):
+                            continue
+                        result = self._run_command(variant["run_cmd"], user_input, cwd=variant["cwd"])
+                        variant["first_run"] = variant["first_run"] or result
+                        if result["status"] != "ok":
+                            variant["status"] = result["status"]
+                            variant["error"] = result["runtime_error"] or f"Exited with code {result['exit_code']}"
+                        elif rounds >= warmup:
+                            variant["wall_times"].append(result["run_time"])
+                            if result["cpu_user_time"] is not None:
+                                variant["cpu_times"].append(result["cpu_user_time"] + result["cpu_system_time"])
+                            variant["max_rss_kb"] = max(variant["max_rss_kb"] or 0, result["max_rss_kb"] or 0) or None
+                    rounds += 1
+        
+        except Exception as e:
+            return {
+                "success": False,
+                "compile_error": f"Internal error: {str(e)}",
+                "output": "",
+                "runtime_error": "",
+                "error": tracer.error_info(e)
+            }
+        
+        reports = []
+        for variant in variants:
+            report = {
+                "options": variant["options"],
+                "build_time": variant["build_time"],
+                "runs": len(variant["wall_times"]),
+                "wall_time": describe(variant["wall_times"]),
+                "cpu_time": describe(variant["cpu_times"]),
+                "max_rss_kb": variant["max_rss_kb"]
+            }
+            if variant.get("error"):
+                report.update({"status": variant["status"], "error": variant["error"]})
+            reports.append(report)
+        add_speedups(reports)
+        
+        first_run = variants[0]["first_run"] or {}
+        outputs = {variant["first_run"]["output"] for variant in variants if variant["first_run"]}
+        return {
+            "success": not any(variant.get("error") for variant in variants),
+            "compile_error": "",
+            "output": first_run.get("output", ""),
+            "runtime_error": first_run.get("runtime_error", ""),
+            "build_time": round(sum(variant["build_time"] for variant in variants), 4),
+            "benchmark": {
+                "runs": runs,
+                "warmup": warmup,
+                # Stopped at BENCHMARK_TIME_LIMIT before all rounds were run
+                "time_limited": rounds < warmup + runs,
+                # Whether every variant printed the same output on its first run
+                "outputs_match": len(outputs) <= 1,
+                "variants": reports
+            }
+        }
+    
+    def compile_and_execute(self, code, user_input, language, compiler_options, session=None, files=None,
+                            profile=False):
+        """Main method to compile and execute code
+        
+        With a session token, Rust builds reuse incremental compilation
+        state from the session's previous runs. files ({path: content})
+        turns a C/C++ submission into a multi-file project, with code as
+        its main file. With profile, the result has a "profile" of where
+        the program spent its time. Results of programs that look
+        deterministic are shared with identical submissions, both
+        concurrent and recent ones; those are marked "cached".
+        """
+        def run():
+            return self._compile_and_execute(code, user_input, language, compiler_options, session, files, profile)
+        
+        sources = "\n".join([code, *(files or {}).values()])
+        # Profiles are timings and differ from run to run
+        if self.result_cache and not profile and is_deterministic(language, sources):
+            key = ResultCache.make_key(language, code, compiler_options, user_input, files)
+            result = self.result_cache.get_or_compute(key, run, self._reproducible)
+            if result.get("cached"):
+                tracer.annotate(status=result.get("status"), cached=True)
+                return result
+        else:
+            result = run()
+        tracer.annotate(status=result.get("status"))
+        if language in self.SUPPORTED_LANGUAGES:
+            self.metrics.observe(language, result)
+        return result
+    
+    @staticmethod
+    def _reproducible(result):
+        """Whether running the same program again would give the same result"""
+        if result.get("compile_error", "").startswith("Internal error"):
+            return False
+        if "timed out" in result.get("compile_error", "") + result.get("runtime_error", ""):
+            return False
+        # Killed by a signal, possibly from outside
+        return (result.get("exit_code") or 0) >= 0
+    
+    @classmethod
+    def _reproducible_stream(cls, result):
+        """_reproducible() for the events of a streamed run"""
+        events = dict(result["events"])
+        exit_info = events.get("exit", {})
+        if exit_info.get("timed_out"):
+            return False
+        return cls._reproducible(dict(events.get("compile", {}), exit_code=exit_info.get("returncode")))
+    
+    def _compile_and_execute(self, code, user_input, language, compiler_options, session=None, files=None,
+                             profile=False):
+        """Build and run code in a leased workspace, returning the result dict"""
+        try:
+            with self._workspace(language, session, profile):
+                if profile:
+                    compiler_options = list(compiler_options) + PROFILE_OPTIONS.get(language, [])
+                
+                if files:
+                    return self._build_and_run_project(code, files, language, compiler_options, user_input)
+                
                 source_file_path = self._create_source_file(code, language)
                 
                 if language == 'python':
@@ -214,44 +987,161 @@ class CodeCompiler:
                     
                     if needs_cargo:
                         cargo_dir = self._create_cargo_project(code, dependencies)
-                        return self._execute_cargo_project(cargo_dir, user_input)
+                        return self._execute_cargo_project(cargo_dir, user_input, dependencies)
                     else:
-                        compiler_cmd = ["rustc"] + list(compiler_options)
-                        return self._compile_and_run_executable(source_file_path, compiler_cmd, user_input)
+                        compiler_cmd = self._rustc_command(compiler_options)
+                        return self._compile_and_run_executable(source_file_path, compiler_cmd, user_input, language)
                 
                 elif language == 'c':
                     compiler_cmd = ["gcc"] + list(compiler_options)
-                    return self._compile_and_run_executable(source_file_path, compiler_cmd, user_input)
+                    return self._compile_and_run_executable(source_file_path, compiler_cmd, user_input, language)
                 
                 elif language == 'cpp':
                     compiler_cmd = ["g++"] + list(compiler_options)
-                    return self._compile_and_run_executable(source_file_path, compiler_cmd, user_input)
+                    return self._compile_and_run_executable(source_file_path, compiler_cmd, user_input, language)
                 
         except Exception as e:
             return {
                 "success": False,
                 "compile_error": f"Internal error: {str(e)}",
                 "output": "",
-                "runtime_error": ""
+                "runtime_error": "",
+                "error": tracer.error_info(e)
             }
 
 # Global compiler instance
 compiler = CodeCompiler()
 
+# Background job pools, sized per language, e.g. "python=4,rust=1"
+jobs = JobManager(
+    compiler.compile_and_execute,
+    workers=parse_pool_sizes(os.environ.get("OFFLINE_COMPILER_JOB_WORKERS", "")),
+    # Shared so that any server worker process can answer polls
+    state_dir=os.path.join(compiler.cache_dir, "jobs")
+)
+
+def drain(timeout=None):
+    """Let jobs finish and save this process's pending counters before it stops
+
+    Returns False if jobs were still unfinished after timeout seconds.
+    """
+    finished = jobs.shutdown(timeout)
+    SharedState.flush_all()
+    return finished
+
+# Bundles are content-hashed, so browsers may keep them forever
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+_asset_manifest = (None, None)
+
+def asset_manifest():
+    """Return the bundle manifest written by build_assets.py, or None"""
+    global _asset_manifest
+    try:
+        mtime = os.path.getmtime(os.path.join(DIST_DIR, MANIFEST_NAME))
+    except OSError:
+        return None
+    if _asset_manifest[0] != mtime:
+        with open(os.path.join(DIST_DIR, MANIFEST_NAME)) as f:
+            _asset_manifest = (mtime, json.load(f))
+    return _asset_manifest[1]
+
+@app.context_processor
+def inject_assets():
+    """Resolve asset bundles to their built URL, or to the source files if none was built"""
+    manifest = asset_manifest()
+    
+    def asset_urls(name):
+        if manifest and name in manifest:
+            return [url_for('dist_asset', filename=manifest[name])]
+        return [url_for('static', filename=path) for path in BUNDLES[name]]
+    
+    lazy_assets = {name: asset_urls(name) for name in BUNDLES if name not in EAGER_BUNDLES}
+    return {"asset_urls": asset_urls, "lazy_assets": lazy_assets}
+
 @app.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
 
+@app.route('/static/dist/<path:filename>', methods=['GET'])
+def dist_asset(filename):
+    """Serve a fingerprinted bundle, precompressed when the client accepts it"""
+    manifest = asset_manifest()
+    if not manifest or filename not in manifest.values():
+        abort(404)
+    
+    served, encoding = filename, None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if candidate in request.accept_encodings and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+            served, encoding = filename + suffix, candidate
+            break
+    
+    mimetype = "text/css" if filename.endswith(".css") else "text/javascript"
+    response = send_from_directory(DIST_DIR, served, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    response.vary.add('Accept-Encoding')
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report artifact cache hit/miss counters and disk usage
+
+    Counters cover every worker process. The result cache's entries and
+    bytes, and the warm Python pool, are those of the worker that answers,
+    named by its process ID under "worker".
+    """
+    stats = compiler.artifact_cache.stats()
+    stats["objects"] = compiler.object_cache.stats()
+    if compiler.result_cache:
+        stats["results"] = compiler.result_cache.stats()
+    if compiler.python_pool:
+        stats["python_pool"] = compiler.python_pool.stats()
+    stats["worker"] = os.getpid()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose per-language build and run histograms for Prometheus"""
+    return Response(compiler.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Cheap readiness check, also used by the launcher to find a running instance"""
+    return jsonify({"status": "ok", "service": SERVICE_NAME})
+
 @app.route('/compile', methods=['POST'])
 def compile_and_run():
     """Handle code compilation and execution requests"""
+    with tracer.request("compile", request.headers.get('X-Request-ID'),
+                        language=request.form.get('language', 'rust')) as trace:
+        response = _compile_and_run()
+    if trace.request_id:
+        response.headers['X-Request-ID'] = trace.request_id
+    return response
+
+def _compile_and_run():
     try:
         code = request.form.get('code', '')
         user_input = request.form.get('input', '')
         language = request.form.get('language', 'rust')
         compiler_options = request.form.get('options', '').split()
+        session = request.form.get('session') or None
+        profile = request.form.get('profile') in ('1', 'true')
+        
+        try:
+            files = parse_files(request.form.get('files'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "compile_error": str(e),
+                "output": "",
+                "runtime_error": ""
+            })
         
-        if not code.strip():
+        if not code.strip() and not files:
             return jsonify({
                 "success": False,
                 "compile_error": "No code provided",
@@ -259,7 +1149,31 @@ def compile_and_run():
                 "runtime_error": ""
             })
         
-        result = compiler.compile_and_execute(code, user_input, language, compiler_options)
+        if session and not SessionWorkspaces.valid_token(session):
+            return jsonify({
+                "success": False,
+                "compile_error": "Invalid session token",
+                "output": "",
+                "runtime_error": ""
+            })
+        
+        if request.form.get('benchmark') in ('1', 'true'):
+            try:
+                runs = parse_count(request.form.get('runs'), CodeCompiler.BENCHMARK_RUNS, 1, MAX_RUNS, "runs")
+                warmup = parse_count(request.form.get('warmup'), 1, 0, MAX_WARMUP, "warmup")
+                opt_levels = parse_opt_levels(request.form.get('opt_levels'), language)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "compile_error": str(e),
+                    "output": "",
+                    "runtime_error": ""
+                })
+            return jsonify(compiler.benchmark_program(
+                code, user_input, language, compiler_options, runs, warmup, opt_levels, files
+            ))
+        
+        result = compiler.compile_and_execute(code, user_input, language, compiler_options, session, files, profile)
         return jsonify(result)
         
     except Exception as e:
@@ -267,8 +1181,159 @@ def compile_and_run():
             "success": False,
             "compile_error": f"Request processing error: {str(e)}",
             "output": "",
-            "runtime_error": ""
+            "runtime_error": "",
+            "error": tracer.error_info(e)
         })
 
+@app.route('/compile/stream', methods=['POST'])
+def compile_and_stream():
+    """Compile and run code, streaming output as Server-Sent Events"""
+    code = request.form.get('code', '')
+    user_input = request.form.get('input', '')
+    language = request.form.get('language', 'rust')
+    compiler_options = request.form.get('options', '').split()
+    session = request.form.get('session') or None
+    profile = request.form.get('profile') in ('1', 'true')
+    
+    try:
+        files = parse_files(request.form.get('files'))
+        error = None
+    except ValueError as e:
+        files, error = None, str(e)
+    
+    if error or (not code.strip() and not files):
+        events = iter([
+            ("compile", {"success": False, "compile_error": error or "No code provided", "output": "", "runtime_error": ""}),
+            ("exit", {"success": False, "returncode": None})
+        ])
+    elif session and not SessionWorkspaces.valid_token(session):
+        events = iter([
+            ("compile", {"success": False, "compile_error": "Invalid session token", "output": "", "runtime_error": ""}),
+            ("exit", {"success": False, "returncode": None})
+        ])
+    else:
+        events = compiler.stream_compile_and_execute(
+            code, user_input, language, compiler_options, session, files, profile
+        )
+    
+    # The build and run happen while the response streams
+    trace = tracer.request("compile/stream", request.headers.get('X-Request-ID'), language=language)
+    
+    def generate():
+        with trace:
+            for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if trace.request_id:
+        headers['X-Request-ID'] = trace.request_id
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers=headers
+    )
+
+@app.route('/debug/slow', methods=['GET'])
+def debug_slow():
+    """List the slowest recent traced requests with their phases, for local clients only"""
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(403)
+    if not tracer.enabled:
+        return jsonify({"error": "Tracing is disabled; set OFFLINE_COMPILER_TRACE=1"}), 404
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({"requests": tracer.slowest(max(limit, 1))})
+
+@app.route('/judge', methods=['POST'])
+def judge():
+    """Compile once and run the program against a batch of test cases
+    
+    Expects a JSON body with code, language, options and a list of cases,
+    each with an "input" and an optional "expected" output. C and C++
+    projects may add more source and header files as files.
+    """
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    code = payload.get('code', '')
+    language = payload.get('language', 'rust')
+    options = payload.get('options', '')
+    cases = payload.get('cases', [])
+    files = payload.get('files') or None
+    
+    if not isinstance(code, str):
+        return jsonify({"error": "code must be a string"}), 400
+    if not isinstance(language, str):
+        return jsonify({"error": "language must be a string"}), 400
+    if isinstance(options, str):
+        compiler_options = options.split()
+    elif isinstance(options, list) and all(isinstance(option, str) for option in options):
+        compiler_options = options
+    else:
+        return jsonify({"error": "options must be a string or a list of strings"}), 400
+    if files is not None and not (isinstance(files, dict) and all(isinstance(v, str) for v in files.values())):
+        return jsonify({"error": "files must be an object mapping paths to contents"}), 400
+    if not code.strip() and not files:
+        return jsonify({"error": "No code provided"}), 400
+    if language not in CodeCompiler.SUPPORTED_LANGUAGES:
+        return jsonify({"error": f"Unsupported language: {language}"}), 400
+    if not isinstance(cases, list) or not all(isinstance(case, dict) for case in cases):
+        return jsonify({"error": "cases must be a list of objects"}), 400
+    if len(cases) > CodeCompiler.JUDGE_MAX_CASES:
+        return jsonify({"error": f"Too many cases (limit: {CodeCompiler.JUDGE_MAX_CASES})"}), 400
+    for index, case in enumerate(cases):
+        if not isinstance(case.get("input", ""), str):
+            return jsonify({"error": f"cases[{index}].input must be a string"}), 400
+        if not isinstance(case.get("expected", ""), (str, type(None))):
+            return jsonify({"error": f"cases[{index}].expected must be a string or null"}), 400
+    
+    return jsonify(compiler.judge(code, language, compiler_options, cases, files))
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a compile request and return its job ID"""
+    code = request.form.get('code', '')
+    user_input = request.form.get('input', '')
+    language = request.form.get('language', 'rust')
+    compiler_options = request.form.get('options', '').split()
+    
+    try:
+        files = parse_files(request.form.get('files'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not code.strip() and not files:
+        return jsonify({"error": "No code provided"}), 400
+    if language not in CodeCompiler.SUPPORTED_LANGUAGES:
+        return jsonify({"error": f"Unsupported language: {language}"}), 400
+    
+    try:
+        job = jobs.submit(language, {
+            "code": code,
+            "user_input": user_input,
+            "language": language,
+            "compiler_options": compiler_options,
+            "files": files,
+            "profile": request.form.get('profile') in ('1', 'true')
+        })
+    except QueueFull as e:
+        response = jsonify({"error": str(e), "retry_after": e.retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    
+    response = jsonify({"job_id": job.id, "status": job.status})
+    response.status_code = 202
+    response.headers['Location'] = f"/jobs/{job.id}"
+    return response
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the status and, once finished, the result of a job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server; set FLASK_DEBUG=1 for the debugger and reloader.
+    # Use serve.py in production.
+    app.run(host='0.0.0.0', port=5000)
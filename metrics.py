@@ -0,0 +1,199 @@
+import atexit
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from cargo_cache import file_lock
+
+# name: (result key, help text, unit scale, bucket upper bounds)
+HISTOGRAMS = {
+    "build_time_seconds": (
+        "build_time", "Wall time spent compiling, including cache lookups", 1,
+        [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+    ),
+    "run_time_seconds": (
+        "run_time", "Wall time of program runs", 1,
+        [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    ),
+    "cpu_user_seconds": (
+        "cpu_user_time", "User CPU time of program runs", 1,
+        [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    ),
+    "cpu_system_seconds": (
+        "cpu_system_time", "System CPU time of program runs", 1,
+        [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    ),
+    "max_rss_bytes": (
+        "max_rss_kb", "Peak resident memory of program runs, where it could be measured", 1024,
+        [2 ** n * 1024 * 1024 for n in range(0, 13, 2)]
+    ),
+}
+
+
+def _added(total, delta):
+    """Sum of two documents: numbers add, lists add item by item"""
+    if isinstance(delta, dict):
+        merged = total if isinstance(total, dict) else {}
+        for key, value in delta.items():
+            merged[key] = _added(merged.get(key), value)
+        return merged
+    if isinstance(delta, list):
+        if isinstance(total, list) and len(total) == len(delta):
+            return [_added(a, b) for a, b in zip(total, delta)]
+        return copy.deepcopy(delta)
+    if isinstance(total, (int, float)):
+        return total + delta
+    return delta
+
+
+class SharedState:
+    """A JSON document of totals that every server process adds to
+
+    Additions collect in this process's memory and are merged into the
+    file at path at most every FLUSH_INTERVAL seconds, under a file lock
+    with an atomic replace, so the worker processes of serve.py add to
+    the same totals and a replaced worker's counts are kept. Reading
+    merges this process's additions first; those of other workers show up
+    once they flush. Without a path the document lives in memory.
+    """
+
+    FLUSH_INTERVAL = 1.0
+
+    # Instances with a file, for flush_all()
+    _instances = weakref.WeakSet()
+
+    def __init__(self, path=None, flush_interval=None):
+        self.path = path
+        self.flush_interval = self.FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._lock = threading.Lock()
+        # Not yet merged into the file; everything without a path
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._instances.add(self)
+
+    @classmethod
+    def flush_all(cls):
+        """Merge the pending additions of every instance into their files"""
+        for state in list(cls._instances):
+            state.flush()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data):
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _flush(self):
+        self._flushed_at = time.monotonic()
+        if not self.path or not self._pending:
+            return
+        try:
+            with file_lock(self.path + ".lock"):
+                self._write(_added(self._load(), self._pending))
+        except OSError:
+            # Kept for the next flush, e.g. while the cache directory is recreated
+            return
+        self._pending = {}
+
+    @contextmanager
+    def update(self):
+        """Yield this process's pending additions for changing in place"""
+        with self._lock:
+            yield self._pending
+            if time.monotonic() - self._flushed_at >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """Merge the pending additions into the file now"""
+        with self._lock:
+            self._flush()
+
+    def read(self):
+        """Return a copy of the totals"""
+        with self._lock:
+            if not self.path:
+                return copy.deepcopy(self._pending)
+            self._flush()
+            return self._load()
+
+    def add(self, **amounts):
+        """Add to the named counters"""
+        with self.update() as data:
+            for name, amount in amounts.items():
+                data[name] = data.get(name, 0) + amount
+
+
+# Forked serve.py workers exit without atexit; they flush when draining
+atexit.register(SharedState.flush_all)
+
+
+class Metrics:
+    """Per-language histograms of build and run resource usage
+
+    With a path the histograms are a SharedState, so every worker process
+    of serve.py adds to the same series and any of them renders the totals.
+    """
+
+    PREFIX = "offline_compiler_"
+
+    def __init__(self, path=None):
+        # "histogram name/language" -> [bucket counts, sum, count]
+        self._series = SharedState(path)
+
+    def observe(self, language, result):
+        """Record the timings and usage found in a result dict"""
+        with self._series.update() as all_series:
+            for name, (key, _, scale, buckets) in HISTOGRAMS.items():
+                value = result.get(key)
+                if value is None:
+                    continue
+                value *= scale
+                series = all_series.get(f"{name}/{language}")
+                if series is None or len(series[0]) != len(buckets):
+                    series = all_series[f"{name}/{language}"] = [[0] * len(buckets), 0, 0]
+                for i, bound in enumerate(buckets):
+                    if value <= bound:
+                        series[0][i] += 1
+                series[1] += value
+                series[2] += 1
+
+    def render(self):
+        """Return all histograms in the Prometheus text format"""
+        lines = []
+        all_series = self._series.read()
+        for name, (_, help_text, _, buckets) in HISTOGRAMS.items():
+            metric = self.PREFIX + name
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for series_key, (counts, total, count) in sorted(all_series.items()):
+                series_name, _, language = series_key.partition("/")
+                if series_name != name or len(counts) != len(buckets):
+                    continue
+                labels = f'language="{language}"'
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+                lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{metric}_sum{{{labels}}} {round(total, 6)}')
+                lines.append(f'{metric}_count{{{labels}}} {count}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,94 @@
+import statistics
+
+MAX_RUNS = 100
+MAX_WARMUP = 10
+MAX_LEVELS = 6
+
+# Optimization levels each compiler accepts, as in -O<level> / -C opt-level=<level>
+OPT_LEVELS = {
+    "c": ("0", "1", "2", "3", "s", "z", "g", "fast"),
+    "cpp": ("0", "1", "2", "3", "s", "z", "g", "fast"),
+    "rust": ("0", "1", "2", "3", "s", "z"),
+}
+
+
+def parse_count(value, default, minimum, maximum, name):
+    """Decode a run count field, raising ValueError with a message for the user"""
+    if value is None or not value.strip():
+        return default
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number")
+    if not minimum <= count <= maximum:
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return count
+
+
+def parse_opt_levels(value, language):
+    """Decode a comma separated list of optimization levels such as "O0,O2,O3"
+
+    Returns None when value is empty. Raises ValueError with a message for
+    the user.
+    """
+    if not value or not value.strip():
+        return None
+    if language not in OPT_LEVELS:
+        raise ValueError("Optimization levels can be compared for C, C++ and Rust")
+    levels = []
+    for item in value.split(","):
+        level = item.strip().lstrip("-")
+        if level.startswith("O"):
+            level = level[1:]
+        if level not in OPT_LEVELS[language]:
+            raise ValueError(f"Unknown optimization level: {item.strip()}")
+        if level not in levels:
+            levels.append(level)
+    if len(levels) > MAX_LEVELS:
+        raise ValueError(f"Too many optimization levels (limit: {MAX_LEVELS})")
+    return levels
+
+
+def with_opt_level(options, language, level):
+    """options with any optimization flag replaced by the given level"""
+    result = []
+    skip = False
+    for i, option in enumerate(options):
+        if skip:
+            skip = False
+            continue
+        if language == "rust":
+            if option == "-O" or option.startswith("-Copt-level="):
+                continue
+            if option == "-C" and i + 1 < len(options) and options[i + 1].startswith("opt-level="):
+                skip = True
+                continue
+        elif option.startswith("-O"):
+            continue
+        result.append(option)
+    if language == "rust":
+        return result + ["-C", f"opt-level={level}"]
+    return result + [f"-O{level}"]
+
+
+def describe(values):
+    """min, median, mean and sample standard deviation of a list of timings"""
+    if not values:
+        return None
+    return {
+        "min": round(min(values), 6),
+        "median": round(statistics.median(values), 6),
+        "mean": round(statistics.fmean(values), 6),
+        "stddev": round(statistics.stdev(values), 6) if len(values) > 1 else 0.0
+    }
+
+
+def add_speedups(variants):
+    """Set each variant's median wall time speed-up over the first one"""
+    baseline = variants[0].get("wall_time") if variants else None
+    for variant in variants:
+        wall_time = variant.get("wall_time")
+        if baseline and wall_time and wall_time["median"] > 0:
+            variant["speedup"] = round(baseline["median"] / wall_time["median"], 3)
+        else:
+            variant["speedup"] = None
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import subprocess
+import threading
+
+_INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s*<([^>]+)>\s*(//.*)?$')
+_SKIPPABLE_PATTERN = re.compile(r'^\s*(//.*)?$')
+
+
+def leading_system_includes(source):
+    """Return the <...> includes at the very top of a source file
+
+    Only includes that come before any other line qualify, since a
+    precompiled header has to be the first thing the compiler sees.
+    """
+    includes = []
+    for line in source.splitlines():
+        match = _INCLUDE_PATTERN.match(line)
+        if match:
+            if match.group(1) not in includes:
+                includes.append(match.group(1))
+        elif not _SKIPPABLE_PATTERN.match(line):
+            break
+    return includes
+
+
+def pch_relevant_options(options):
+    """Drop options that cannot affect whether a PCH is usable"""
+    relevant = []
+    for option in options:
+        if option in ("-w", "-s") or option.startswith(("-W", "-l", "-L", "-fdiagnostics")):
+            continue
+        relevant.append(option)
+    return relevant
+
+
+class PchCache:
+    """Precompiled headers for C++ include sets that submissions share"""
+
+    # Built as soon as they are first requested
+    COMMON_INCLUDE_SETS = [
+        ["bits/stdc++.h"],
+        ["iostream"],
+        ["iostream", "vector"],
+        ["iostream", "vector", "algorithm"],
+        ["iostream", "string"],
+    ]
+    # Other include sets get a PCH once they have been seen this many times
+    BUILD_AFTER_USES = 3
+    BUILD_TIMEOUT = 120
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._uses = {}
+        self._building = set()
+        self._baseline = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, compiler_path, compiler_version, options, includes):
+        digest = hashlib.sha256()
+        for part in [compiler_path, compiler_version, *pch_relevant_options(options), "", *includes]:
+            digest.update(f"{len(part)}:{part}".encode("utf-8", "surrogateescape"))
+        return digest.hexdigest()[:24]
+
+    def _paths(self, key):
+        pch_dir = os.path.join(self.cache_dir, key)
+        header_path = os.path.join(pch_dir, "pch.h")
+        return pch_dir, header_path, header_path + ".gch"
+
+    def options_for(self, compiler_cmd, compiler_version, source):
+        """Return (extra compiler options, key) for a C++ compile
+
+        The options are empty when no PCH is ready yet; in that case a build
+        is started in the background once the include set is common enough.
+        """
+        includes = leading_system_includes(source)
+        if not includes:
+            return [], None
+
+        compiler, options = compiler_cmd[0], compiler_cmd[1:]
+        key = self.key(compiler, compiler_version, options, includes)
+        _, header_path, gch_path = self._paths(key)
+        if os.path.exists(gch_path):
+            # GCC falls back to including the header text if the PCH turns out incompatible
+            return ["-include", header_path], key
+
+        with self._lock:
+            self._uses[key] = self._uses.get(key, 0) + 1
+            wanted = includes in self.COMMON_INCLUDE_SETS or self._uses[key] >= self.BUILD_AFTER_USES
+            start = wanted and key not in self._building
+            if start:
+                self._building.add(key)
+        if start:
+            threading.Thread(
+                target=self.build,
+                args=(compiler, pch_relevant_options(options), includes, key),
+                daemon=True
+            ).start()
+        return [], key
+
+    def build(self, compiler, options, includes, key):
+        """Compile the precompiled header for an include set"""
+        pch_dir, header_path, gch_path = self._paths(key)
+        try:
+            os.makedirs(pch_dir, exist_ok=True)
+            with open(header_path, "w") as f:
+                f.write("".join(f"#include <{include}>\n" for include in includes))
+
+            tmp_path = f"{gch_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            result = subprocess.run(
+                [compiler, *options, "-x", "c++-header", header_path, "-o", tmp_path],
+                capture_output=True,
+                text=True,
+                timeout=self.BUILD_TIMEOUT
+            )
+            if result.returncode == 0:
+                os.replace(tmp_path, gch_path)
+                return True
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        except (OSError, subprocess.SubprocessError):
+            return False
+        finally:
+            with self._lock:
+                self._building.discard(key)
+
+    def record(self, key, used_pch, compile_time):
+        """Track compile times and return the estimated time a PCH saved"""
+        if key is None:
+            return None
+        with self._lock:
+            if not used_pch:
+                previous = self._baseline.get(key, compile_time)
+                self._baseline[key] = 0.8 * previous + 0.2 * compile_time
+                return None
+            baseline = self._baseline.get(key)
+        return round(baseline - compile_time, 4) if baseline is not None else None
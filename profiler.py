@@ -0,0 +1,124 @@
+import os
+import pstats
+import re
+import subprocess
+
+# Functions reported per profile
+TOP_FUNCTIONS = 20
+# Written by cProfile into the workspace; gprof's gmon.out lands next to it
+PYTHON_PROFILE = "profile.out"
+GMON_OUT = "gmon.out"
+
+# Build flags for a gprof profile. -pg instruments C and C++ with call
+# counts; Rust only links the gmon runtime and gets sampled self times.
+PROFILE_OPTIONS = {
+    "c": ["-pg"],
+    "cpp": ["-pg"],
+    "rust": ["-C", "link-arg=-pg"],
+}
+
+_GPROF_ROW = re.compile(
+    r'^\s*([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+(?:(\d+)\s+([\d.]+)\s+([\d.]+)\s+)?(\S.*)$'
+)
+_GPROF_UNIT = re.compile(r'\b(\w+)/call')
+_GPROF_SAMPLE = re.compile(r'Each sample counts as ([\d.]+) seconds')
+_SECONDS = {"s": 1, "ms": 1e-3, "us": 1e-6, "ns": 1e-9}
+
+
+def python_command(source_file_path, profile_path):
+    return ["python", "-m", "cProfile", "-o", profile_path, source_file_path]
+
+
+def unavailable(tool, reason):
+    """A profile that could not be taken"""
+    return {"tool": tool, "functions": [], "error": reason}
+
+
+def _no_data(tool):
+    return unavailable(tool, "No profile data: the program has to exit normally")
+
+
+def read_python_profile(profile_path, top=TOP_FUNCTIONS):
+    """Top functions by cumulative time from a cProfile output file"""
+    try:
+        stats = pstats.Stats(profile_path).stats
+    except (OSError, EOFError, TypeError, ValueError):
+        return _no_data("cProfile")
+
+    functions = []
+    for (filename, line, name), (_, calls, self_time, total_time, callers) in stats.items():
+        if filename == "~" and not callers:
+            # cProfile's own exec() of the script
+            continue
+        functions.append({
+            "name": name,
+            # Built-in functions have no source location
+            "location": "" if filename == "~" else f"{os.path.basename(filename)}:{line}",
+            "calls": calls,
+            "self_time": round(self_time, 6),
+            "total_time": round(total_time, 6)
+        })
+    total = max((f["total_time"] for f in functions), default=0)
+    functions.sort(key=lambda f: f["total_time"], reverse=True)
+    for function in functions:
+        function["percent"] = round(100 * function["total_time"] / total, 2) if total else 0.0
+    return {"tool": "cProfile", "sorted_by": "total_time", "total_time": round(total, 6), "functions": functions[:top]}
+
+
+def parse_gprof(text, top=TOP_FUNCTIONS):
+    """Rows of a gprof flat profile (gprof -b -p)"""
+    scale = None
+    sample_period = None
+    functions = []
+    for line in text.splitlines():
+        sample = _GPROF_SAMPLE.search(line)
+        if sample:
+            sample_period = float(sample.group(1))
+            continue
+        if "/call" in line:
+            unit = _GPROF_UNIT.search(line)
+            scale = _SECONDS.get(unit.group(1)) if unit else None
+            continue
+        match = _GPROF_ROW.match(line)
+        if not match:
+            continue
+        percent, _, self_time, calls, _, total_per_call, name = match.groups()
+        total_time = None
+        if calls is not None and scale is not None:
+            total_time = round(int(calls) * float(total_per_call) * scale, 6)
+        functions.append({
+            "name": name.strip(),
+            "location": "",
+            "calls": int(calls) if calls is not None else None,
+            "self_time": float(self_time),
+            "total_time": total_time,
+            "percent": float(percent)
+        })
+    return {
+        "tool": "gprof",
+        "sorted_by": "self_time",
+        # Self times are counted in samples of this many seconds
+        "sample_period": sample_period,
+        "total_time": round(sum(f["self_time"] for f in functions), 6),
+        "functions": functions[:top]
+    }
+
+
+def read_gprof_profile(executable_path, gmon_path, timeout=None, top=TOP_FUNCTIONS):
+    """Flat profile of an executable built with PROFILE_OPTIONS"""
+    if not os.path.exists(gmon_path):
+        return _no_data("gprof")
+    try:
+        result = subprocess.run(
+            ["gprof", "-b", "-p", executable_path, gmon_path],
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+    except FileNotFoundError:
+        return unavailable("gprof", "gprof is not installed")
+    except subprocess.TimeoutExpired:
+        return unavailable("gprof", "gprof timed out")
+    if result.returncode != 0:
+        return unavailable("gprof", result.stderr.strip())
+    return parse_gprof(result.stdout, top)
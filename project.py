@@ -0,0 +1,72 @@
+import json
+import os
+import re
+
+MAX_FILES = 64
+MAX_TOTAL_BYTES = 4 * 1024 * 1024
+
+# Files compiled to their own object; everything else is only included
+TRANSLATION_UNIT_EXTENSIONS = {
+    "c": (".c",),
+    "cpp": (".cpp", ".cc", ".cxx"),
+}
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.+-]*(/[A-Za-z0-9_][A-Za-z0-9_.+-]*)*$')
+# Names the build itself writes into the workspace
+RESERVED_NAMES = {"main.exe"}
+OBJECT_DIR = ".objects"
+
+
+class BuildError(Exception):
+    """A translation unit failed to compile; the message is the compiler's output"""
+
+
+def parse_files(value):
+    """Decode the files field of a request: a JSON object of path -> content"""
+    if not value:
+        return None
+    try:
+        files = json.loads(value)
+    except ValueError:
+        raise ValueError("files must be a JSON object mapping paths to contents")
+    if not isinstance(files, dict) or not all(isinstance(content, str) for content in files.values()):
+        raise ValueError("files must be a JSON object mapping paths to contents")
+    return files
+
+
+def project_files(code, files, language, main_name):
+    """Validate a multi-file project and return {relative path: content}
+
+    The editor's code, if any, becomes main_name alongside the other files.
+    Raises ValueError with a message for the user.
+    """
+    if language not in TRANSLATION_UNIT_EXTENSIONS:
+        raise ValueError("Multi-file projects are supported for C and C++")
+    files = dict(files)
+    if code.strip():
+        if main_name in files:
+            raise ValueError(f"{main_name} is given both as code and in files")
+        files[main_name] = code
+    if len(files) > MAX_FILES:
+        raise ValueError(f"Too many files (limit: {MAX_FILES})")
+    if sum(len(content) for content in files.values()) > MAX_TOTAL_BYTES:
+        raise ValueError(f"Project too large (limit: {MAX_TOTAL_BYTES // 1024 // 1024} MB)")
+    for name in files:
+        if not _NAME_PATTERN.match(name) or name in RESERVED_NAMES:
+            raise ValueError(f"Invalid file name: {name}")
+    if not translation_units(files, language):
+        raise ValueError("No source files to compile")
+    return files
+
+
+def translation_units(names, language):
+    return sorted(name for name in names if name.endswith(TRANSLATION_UNIT_EXTENSIONS[language]))
+
+
+def is_link_option(option):
+    """Options that only matter when linking, and must follow the objects"""
+    return option.startswith(("-l", "-L", "-Wl,")) or option in ("-static", "-s", "-rdynamic")
+
+
+def object_path(workspace, source):
+    return os.path.join(workspace, OBJECT_DIR, *source.split("/")) + ".o"
@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from runner import UsagePopen
+
+# Runs inside each worker interpreter. The modules are imported up front,
+# readiness is signalled on a separate pipe, and the worker then blocks
+# until a header line with the script path arrives on stdin. The header is
+# read one byte at a time so that nothing of the user's input is buffered
+# ahead of sys.stdin, sys.stdin.buffer or open(0).
+BOOTSTRAP = r'''
+import os, sys, types, traceback
+for _name in {modules!r}:
+    try:
+        __import__(_name)
+    except ImportError:
+        pass
+if {ready_fd} >= 0:
+    os.write({ready_fd}, b"1")
+    os.close({ready_fd})
+
+_header = b""
+while not _header.endswith(b"\n"):
+    _byte = os.read(0, 1)
+    if not _byte:
+        sys.exit(0)
+    _header += _byte
+
+_path = __import__("json").loads(_header)
+sys.argv = [_path]
+sys.path[0] = os.path.dirname(_path)
+_main = types.ModuleType("__main__")
+_main.__file__ = _path
+sys.modules["__main__"] = _main
+try:
+    with open(_path, "rb") as _f:
+        _code = compile(_f.read(), _path, "exec")
+    exec(_code, _main.__dict__)
+except SystemExit:
+    raise
+except BaseException as _e:
+    # Report the traceback as `python main.py` would, without this frame
+    traceback.print_exception(type(_e), _e, _e.__traceback__.tb_next)
+    sys.exit(1)
+'''
+
+
+class PythonPool:
+    """Pre-started Python interpreters that each run a single script"""
+
+    PRELOAD_MODULES = [
+        "math", "re", "json", "random", "string", "itertools", "functools",
+        "collections", "heapq", "bisect", "datetime", "decimal", "fractions",
+        "statistics", "typing",
+    ]
+
+    def __init__(self, size, interpreter="python", modules=None, limits=None):
+        self.size = size
+        # Applied when a worker starts, since it execs long before its script runs
+        self.limits = limits
+        self.interpreter = interpreter
+        self.modules = self.PRELOAD_MODULES if modules is None else modules
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._starting = 0
+        self._pid = None
+
+    def _spawn(self):
+        ready_read = ready_write = -1
+        try:
+            # Windows cannot pass the readiness pipe; its workers are used as soon as they start
+            if os.name == "posix":
+                ready_read, ready_write = os.pipe()
+            cmd = [self.interpreter, "-c", BOOTSTRAP.format(modules=list(self.modules), ready_fd=ready_write)]
+            cmd, preexec_fn = self.limits.command(cmd) if self.limits else (cmd, None)
+            process = UsagePopen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=(ready_write,) if ready_write >= 0 else (),
+                preexec_fn=preexec_fn,
+                start_new_session=self.limits is not None
+            )
+            if ready_write >= 0:
+                os.close(ready_write)
+                ready_write = -1
+                # Only hand out workers that have finished their imports
+                if not os.read(ready_read, 1):
+                    process.wait()
+                    return
+            self._idle.put(process)
+        finally:
+            # Also when starting the worker failed, e.g. out of fds or memory
+            for fd in (ready_read, ready_write):
+                if fd >= 0:
+                    os.close(fd)
+            with self._lock:
+                self._starting -= 1
+
+    def refill(self):
+        """Start replacement workers in the background up to the pool size
+
+        Call this after a pooled run has finished so that starting the
+        replacement does not compete with the run for CPU.
+        """
+        with self._lock:
+            # Workers belong to the process that started them; start afresh after a fork
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = queue.Queue()
+                self._starting = 0
+            missing = self.size - self._idle.qsize() - self._starting
+            self._starting += max(missing, 0)
+        for _ in range(missing):
+            threading.Thread(target=self._spawn, daemon=True).start()
+
+    def start(self):
+        self.refill()
+
+    def acquire(self):
+        """Return an idle worker process, or None if none is ready"""
+        if self._pid != os.getpid():
+            self.refill()
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    self.misses += 1
+                return None
+            if process.poll() is None:
+                break
+        with self._lock:
+            self.hits += 1
+        return process
+
+    @staticmethod
+    def script_header(source_file_path):
+        """First line of stdin that tells a worker which script to run"""
+        return json.dumps(os.path.abspath(source_file_path)) + "\n"
+
+    def stats(self):
+        """Return the pool size, idle workers, and runs that found a worker or none"""
+        with self._lock:
+            return {"size": self.size, "idle": self._idle.qsize(), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            process.kill()
+            process.wait()
+
+
+def benchmark(runs=30, interpreter="python", pause=0.05):
+    """Compare cold interpreter starts with pooled workers on a small script"""
+    script = "import collections, math\nprint(sum(map(int, input().split())))\n"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "main.py")
+        with open(path, "w") as f:
+            f.write(script)
+
+        cold = []
+        for _ in range(runs):
+            time.sleep(pause)
+            start = time.perf_counter()
+            subprocess.run([interpreter, path], input="1 2 3\n", capture_output=True, text=True)
+            cold.append(time.perf_counter() - start)
+
+        pool = PythonPool(2, interpreter)
+        pool.start()
+        warm = []
+        try:
+            for _ in range(runs):
+                # Mimic requests arriving slower than workers are replaced
+                deadline = time.time() + 5
+                while pool._idle.empty() and time.time() < deadline:
+                    time.sleep(0.01)
+                time.sleep(pause)
+                start = time.perf_counter()
+                process = pool.acquire()
+                process.communicate((PythonPool.script_header(path) + "1 2 3\n").encode())
+                warm.append(time.perf_counter() - start)
+                pool.refill()
+        finally:
+            pool.close()
+
+    cold_ms = 1000 * sum(cold) / runs
+    warm_ms = 1000 * sum(warm) / runs
+    return {
+        "runs": runs,
+        "cold_ms": round(cold_ms, 2),
+        "pooled_ms": round(warm_ms, 2),
+        "saved_ms": round(cold_ms - warm_ms, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the warm Python interpreter pool")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--interpreter", default="python")
+    args = parser.parse_args()
+    json.dump(benchmark(args.runs, args.interpreter), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import ast
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import SharedState
+
+# Sources of run-to-run variation. Programs that mention any of these are
+# never memoized; everything else is assumed to depend only on its input.
+# Addresses count too, since ASLR moves them on every run, and so do
+# paths of the per-request workspace.
+NONDETERMINISTIC_PATTERNS = {
+    "python": re.compile(
+        r'\b(random|secrets|uuid|time|datetime|urandom|getpid|environ|getenv|threading|'
+        r'multiprocessing|concurrent|asyncio|subprocess|socket|open|hash|id|set|frozenset|ctypes|addressof|'
+        r'argv|__file__)\b|\bobject\s*\('
+    ),
+    "c": re.compile(
+        r'\b(rand|srand|random|time|clock|clock_gettime|gettimeofday|getpid|getenv|pthread_\w+|fork|'
+        r'fopen|open|__TIME__|__DATE__|uintptr_t|intptr_t)\b|%[-+ #0-9.*]*p'
+    ),
+    "cpp": re.compile(
+        r'\b(rand|srand|random|random_device|mt19937\w*|time|clock|chrono|getpid|getenv|thread|async|'
+        r'fopen|ifstream|ofstream|fstream|unordered_\w+|__TIME__|__DATE__|uintptr_t|intptr_t|addressof|'
+        r'reinterpret_cast)\b|%[-+ #0-9.*]*p|<<\s*(&|this\b)|void\s*\*'
+    ),
+    "rust": re.compile(
+        r'\b(rand|time|Instant|SystemTime|thread|process|env|fs|HashMap|HashSet|RandomState|'
+        r'as_ptr|addr_of\w*)\b|\{[^{}]*:[^{}]*p\}|\*(const|mut)\b'
+    ),
+}
+
+
+# Comments and string literals of a Python program. f-strings are kept,
+# since their replacement fields are code.
+_PYTHON_NOISE_PATTERN = re.compile(
+    r'#[^\n]*'
+    r'|(?<!\w)([rRbBuUfF]{0,2})(\'\'\'|"""|\'|")(?:\\.|(?!\2).)*\2',
+    re.S
+)
+
+
+def _strip_python_noise(code):
+    """Blank out the comments and plain string literals of Python code"""
+    def blank(match):
+        prefix = match.group(1) or ''
+        return match.group(0) if 'f' in prefix.lower() else ' '
+    return _PYTHON_NOISE_PATTERN.sub(blank, code)
+
+
+def _has_default_repr_class(code):
+    """Whether Python code defines a class whose instances print an address
+
+    That is any class without its own __repr__ or __str__, unless it is a
+    dataclass. Code that does not parse defines no classes.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return False
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ClassDef):
+            continue
+        methods = {item.name for item in node.body
+                   if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        if methods & {'__repr__', '__str__'}:
+            continue
+        decorators = [ast.unparse(decorator) for decorator in node.decorator_list]
+        if any(re.match(r'(dataclasses\.)?dataclass\b', decorator) for decorator in decorators):
+            continue
+        return True
+    return False
+
+
+def is_deterministic(language, code):
+    """Guess whether a program's output depends only on its code and input"""
+    pattern = NONDETERMINISTIC_PATTERNS.get(language)
+    if pattern is None:
+        return False
+    if language == "python":
+        if _has_default_repr_class(code):
+            return False
+        code = _strip_python_noise(code)
+    return pattern.search(code) is None
+
+
+def result_size(result):
+    """Rough memory footprint of a result dict in bytes"""
+    def strings(value):
+        if isinstance(value, str):
+            return len(value)
+        if isinstance(value, dict):
+            return sum(strings(item) for item in value.values())
+        if isinstance(value, (list, tuple)):
+            # Streamed results keep their events
+            return sum(strings(item) for item in value)
+        return 0
+    return 512 + strings(result)
+
+
+class _Pending:
+    """A result being computed by the caller that claimed its key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+    def wait(self):
+        """Copy of the result once computed, or None if its computation failed"""
+        self.done.wait()
+        if self.result is None:
+            return None
+        return dict(self.result, cached=True)
+
+
+class ResultCache:
+    """In-memory LRU of compile-and-run results with in-flight coalescing
+
+    Results expire after ttl seconds and the least recently used are evicted
+    beyond max_bytes. A request identical to one still running waits for
+    that run's result instead of starting its own.
+
+    Entries belong to this process. With stats_path the hit, miss,
+    coalescing and eviction counts are a SharedState of all processes.
+    """
+
+    TTL = 60
+    MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, ttl=None, max_bytes=None, stats_path=None):
+        self.ttl = self.TTL if ttl is None else ttl
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        self.counters = SharedState(stats_path)
+        self._lock = threading.Lock()
+        # key -> (expires at, size, result)
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._bytes = 0
+
+    @staticmethod
+    def make_key(language, code, compiler_options, user_input, files=None):
+        digest = hashlib.sha256()
+        extra_files = [part for name in sorted(files or {}) for part in (name, files[name])]
+        for part in [language, *compiler_options, "", code, user_input, *extra_files]:
+            data = part.encode("utf-8", "surrogateescape")
+            digest.update(f"{len(data)}:".encode())
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """Return a copy of the result for key, running compute() at most once at a time
+
+        Results for which cacheable(result) is false are handed to requests
+        that were waiting for them but are not kept.
+        """
+        cached, pending, leader = self.claim(key)
+        if cached is not None:
+            return cached
+        if not leader:
+            result = pending.wait()
+            # None if the run we waited for raised; try again ourselves
+            return compute() if result is None else result
+
+        result = None
+        try:
+            result = compute()
+            return result
+        finally:
+            self.release(key, pending, result, cacheable)
+
+    def claim(self, key):
+        """Look up key for a caller that computes the result itself when needed
+
+        For callers that cannot hand get_or_compute() a function, such as
+        streaming runs. Returns (cached, pending, leader): a copy of the
+        cached result, or the pending computation of key. A leader has to
+        compute the result and pass it to release(), even if that failed;
+        everyone else may pending.wait() for it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                cached = dict(entry[2], cached=True)
+            else:
+                cached = None
+                if entry:
+                    self._drop(key)
+                pending = self._pending.get(key)
+                leader = pending is None
+                if leader:
+                    pending = self._pending[key] = _Pending()
+        # Counted outside the lock, since a shared counter waits on a file lock
+        if cached is not None:
+            self.counters.add(hits=1)
+            return cached, None, False
+        self.counters.add(**{"misses" if leader else "coalesced": 1})
+        return None, pending, leader
+
+    def release(self, key, pending, result, cacheable=None):
+        """Publish the leader's result for key, or None if computing it failed"""
+        try:
+            if result is not None:
+                pending.result = dict(result)
+                if cacheable is None or cacheable(result):
+                    self._store(key, pending.result)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def _store(self, key, result):
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        evictions = 0
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, result)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                evictions += 1
+        if evictions:
+            self.counters.add(evictions=evictions)
+
+    def stats(self):
+        counters = self.counters.read()
+        with self._lock:
+            return {
+                "hits": counters.get("hits", 0),
+                "misses": counters.get("misses", 0),
+                "coalesced": counters.get("coalesced", 0),
+                "evictions": counters.get("evictions", 0),
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
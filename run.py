@@ -1,17 +1,45 @@
+import time
+
+# Reference point for the reported startup times
+LAUNCHED = time.perf_counter()
+
+import argparse
 import sys
-import subprocess
 import webbrowser
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QMessageBox
 )
-from PySide6.QtCore import QProcess, Qt
+from PySide6.QtCore import QObject, QTimer, Qt, Signal
+
+HOST = "127.0.0.1"
+PORT = 5000
+URL = f"http://{HOST}:{PORT}"
+# Seconds to wait for running compiles when the window closes
+STOP_TIMEOUT = 10
+
+
+class ServerSignals(QObject):
+    # Emitted from the server thread; Qt delivers it on the GUI thread
+    first_page = Signal(float)
+
 
 class FlaskLauncher(QWidget):
-    def __init__(self):
+    def __init__(self, open_browser=False):
         super().__init__()
         self.setWindowTitle("Flask App Launcher")
         self.setFixedSize(350, 180)
-        self.process = None
+        self.server = None
+        self.reused = False
+        self.open_when_ready = open_browser
+        self.signals = ServerSignals()
+        self.signals.first_page.connect(self.on_first_page)
+
+        self.ready_timer = QTimer(self)
+        self.ready_timer.setInterval(50)
+        self.ready_timer.timeout.connect(self.check_ready)
+        self.stop_timer = QTimer(self)
+        self.stop_timer.setInterval(100)
+        self.stop_timer.timeout.connect(self.check_stopped)
 
         layout = QVBoxLayout()
         layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -37,64 +65,97 @@ class FlaskLauncher(QWidget):
         self.setLayout(layout)
 
     def start_flask(self):
-        if self.process is not None:
+        if self.server is not None or self.reused:
             QMessageBox.warning(self, "Warning", "Flask server is already running.")
             return
 
-        self.process = QProcess(self)
-        self.process.setProgram(sys.executable)
-        self.process.setArguments(["main.py"])
-        self.process.setWorkingDirectory(".")
-        self.process.readyReadStandardOutput.connect(self.handle_stdout)
-        self.process.readyReadStandardError.connect(self.handle_stderr)
-        self.process.started.connect(self.on_started)
-        self.process.finished.connect(self.on_finished)
-        self.process.start()
+        # Imported on first use so that the window shows without waiting for werkzeug
+        from serve import ServerThread, healthy
 
-        self.status_label.setText("Starting Flask server...")
         self.start_btn.setEnabled(False)
-        self.stop_btn.setEnabled(True)
+        if healthy(HOST, PORT):
+            # Another launcher or serve.py already serves this machine
+            self.reused = True
+            self.on_ready()
+            return
+
+        self.server = ServerThread(HOST, PORT, on_first_page=self.signals.first_page.emit, launched=LAUNCHED)
+        self.server.start()
+        self.status_label.setText("Starting Flask server...")
+        self.ready_timer.start()
+
+    def check_ready(self):
+        from serve import healthy
+
+        if self.server is None:
+            self.ready_timer.stop()
+        elif not self.server.is_alive():
+            self.ready_timer.stop()
+            error = self.server.error or "The server exited."
+            self.server = None
+            self.on_finished()
+            QMessageBox.critical(self, "Error", error)
+        elif healthy(HOST, PORT, timeout=0.2):
+            self.ready_timer.stop()
+            self.on_ready()
+
+    def on_ready(self):
+        elapsed = time.perf_counter() - LAUNCHED
+        print(f"Server ready {elapsed:.2f} s after launch", flush=True)
+        if self.reused:
+            self.status_label.setText(f"Using the server already running at {URL}.")
+        else:
+            self.status_label.setText(f"Flask server is running (ready in {elapsed:.2f} s).")
+            self.stop_btn.setEnabled(True)
         self.open_btn.setEnabled(True)
+        if self.open_when_ready:
+            self.open_browser()
+
+    def on_first_page(self, elapsed):
+        print(f"First page served {elapsed:.2f} s after launch", flush=True)
+        self.status_label.setText(f"Flask server is running (first page in {elapsed:.2f} s).")
 
     def stop_flask(self):
-        if self.process is not None:
-            self.process.terminate()
-            self.process.waitForFinished(3000)
-            self.process = None
-            self.status_label.setText("Flask server stopped.")
-            self.start_btn.setEnabled(True)
+        if self.server is not None:
+            # Running compiles are allowed to finish
+            self.server.stop()
+            self.ready_timer.stop()
             self.stop_btn.setEnabled(False)
             self.open_btn.setEnabled(False)
+            self.status_label.setText("Stopping Flask server...")
+            self.stop_timer.start()
 
-    def open_browser(self):
-        webbrowser.open("http://localhost:5000")
-
-    def handle_stdout(self):
-        output = self.process.readAllStandardOutput().data().decode()
-        if "Running on" in output:
-            self.status_label.setText("Flask server is running.")
-        # Optionally, print output to a log or console
+    def check_stopped(self):
+        if self.server is None or not self.server.is_alive():
+            self.stop_timer.stop()
+            self.server = None
+            self.on_finished()
 
-    def handle_stderr(self):
-        error = self.process.readAllStandardError().data().decode()
-        # Optionally, print error to a log or console
-
-    def on_started(self):
-        self.status_label.setText("Flask server is running.")
+    def open_browser(self):
+        webbrowser.open(URL)
 
     def on_finished(self):
         self.status_label.setText("Flask server stopped.")
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
         self.open_btn.setEnabled(False)
-        self.process = None
+        self.reused = False
 
     def closeEvent(self, event):
-        self.stop_flask()
+        if self.server is not None:
+            self.server.stop()
+            self.server.join(STOP_TIMEOUT)
         event.accept()
 
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    launcher = FlaskLauncher()
+    parser = argparse.ArgumentParser(description="Desktop launcher for the offline compiler")
+    parser.add_argument("--open", action="store_true", help="open the web interface once the server is ready")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    launcher = FlaskLauncher(open_browser=args.open)
     launcher.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    # Start once the window is on screen
+    QTimer.singleShot(0, launcher.start_flask)
+    sys.exit(app.exec())
@@ -1,4 +1,9 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
+
+# One-directory builds start fastest: nothing is unpacked on launch.
+# Set OFFLINE_COMPILER_ONEFILE=1 for a single self-extracting executable.
+ONEFILE = os.environ.get("OFFLINE_COMPILER_ONEFILE") == "1"
 
 
 a = Analysis(
@@ -9,33 +14,63 @@ a = Analysis(
          ('static', 'static'),
     ('templates', 'templates'),
     ],
-    hiddenimports=['flask', 'PySide6.QtWidgets', 'PySide6.QtCore'],
+    # main and serve are imported lazily by the launcher
+    hiddenimports=['flask', 'main', 'serve', 'PySide6.QtWidgets', 'PySide6.QtCore'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=['download_dependencies.py'],
+    excludes=['download_dependencies', 'benchmark', 'tkinter'],
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='run',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if ONEFILE:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='run',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='run',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        # UPX-compressed libraries would be decompressed on every launch
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='run',
+    )
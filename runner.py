@@ -0,0 +1,364 @@
+import codecs
+import io
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+
+from limits import classify
+from tracing import tracer
+
+CHUNK_SIZE = 4096
+# Chunks buffered between the pipe readers and the consumer; when full the
+# readers stop reading and the child blocks on its own pipe writes
+MAX_PENDING_CHUNKS = 64
+# How long to keep draining pipes after the child was killed
+DRAIN_TIMEOUT = 1
+# Characters of stderr kept to recognise how a limit showed up
+STDERR_TAIL = 4096
+# Seconds between reads of a running program's memory high-water mark
+MEMORY_SAMPLE_INTERVAL = 0.01
+
+
+def _read_hwm(pid, program=None):
+    """VmHWM of a running process in KB from /proc, or None
+
+    With program, only while the process runs that executable rather than a
+    launcher that has yet to exec it.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            status = f.read()
+    except OSError:
+        return None
+    fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+    # The kernel keeps 15 characters of the name
+    if program is not None and fields.get("Name", "").strip() != program[:15]:
+        return None
+    hwm = fields.get("VmHWM")
+    return int(hwm.split()[0]) if hwm else None
+
+
+class UsagePopen(subprocess.Popen):
+    """Popen that keeps the child's resource usage once it has been reaped
+
+    Only wait() and communicate() collect it, since they reap through
+    _try_wait; poll() does not, so use returncode to check for exit.
+
+    Peak memory does not come from this rusage: its ru_maxrss carries the
+    high-water mark of the server the child was forked from across exec.
+    When the child is a UsageLauncher attached with attach_usage(), it is
+    the figure the launcher reports. Otherwise, or when the launcher was
+    killed before reporting, it is the last VmHWM read by sample_memory()
+    while the program ran.
+    """
+
+    rusage = None
+    peak_rss_kb = None
+    # PID of the program a usage launcher started, and its report pipe
+    program_pid = None
+    _usage_pipe = None
+
+    def _try_wait(self, wait_flags):
+        if not hasattr(os, "wait4"):
+            return super()._try_wait(wait_flags)
+        try:
+            pid, sts, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Same as Popen: the child was reaped elsewhere and its status is lost
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+        return pid, sts
+
+    def attach_usage(self, fd):
+        """Take the program's PID and peak memory from a usage launcher writing to fd"""
+        self._usage_pipe = os.fdopen(fd, "rb")
+        # Written as soon as the launcher has forked; EOF if it never ran
+        line = self._usage_pipe.readline()
+        self.program_pid = int(line) if line.strip() else None
+
+    def read_usage(self):
+        """Read the launcher's report once it has exited and close its pipe"""
+        if self._usage_pipe is None:
+            return
+        try:
+            line = self._usage_pipe.readline()
+            if line.strip():
+                self.peak_rss_kb = int(line)
+        finally:
+            self._usage_pipe.close()
+            self._usage_pipe = None
+
+    def stop(self, timeout=DRAIN_TIMEOUT):
+        """Kill the child and reap it
+
+        A usage launcher is asked to kill its program instead, so that it
+        reaps the program and the rusage covers it; it is killed itself
+        only if it does not exit within timeout.
+        """
+        if self.program_pid is not None:
+            self.terminate()
+            try:
+                self.wait(timeout)
+                return
+            except subprocess.TimeoutExpired:
+                pass
+        self.kill()
+        self.wait()
+
+    def sample_memory(self, program=None):
+        """Record the memory high-water mark of the still running child"""
+        if self.returncode is not None:
+            # Reaped; the PID may belong to another process by now
+            return
+        if self.program_pid is not None:
+            hwm = _read_hwm(self.program_pid)
+        else:
+            hwm = _read_hwm(self.pid, program)
+        if hwm is not None:
+            self.peak_rss_kb = hwm
+
+    def usage(self):
+        """Return CPU times in seconds and peak RSS in KB, if known"""
+        if self.rusage is None:
+            return {"cpu_user_time": None, "cpu_system_time": None, "max_rss_kb": self.peak_rss_kb}
+        return {
+            "cpu_user_time": round(self.rusage.ru_utime, 4),
+            "cpu_system_time": round(self.rusage.ru_stime, 4),
+            "max_rss_kb": self.peak_rss_kb
+        }
+
+
+def _pump(pipe, name, events, translate_newlines=False):
+    """Forward decoded chunks from pipe to events until EOF"""
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    if translate_newlines:
+        # Same as reading a text mode pipe: \r\n and \r become \n
+        decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+    try:
+        while True:
+            data = pipe.read1(CHUNK_SIZE)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                events.put((name, text))
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            events.put((name, tail))
+    except (OSError, ValueError):
+        pass
+    finally:
+        pipe.close()
+        events.put((name, None))
+
+
+def _feed(pipe, user_input):
+    try:
+        if user_input:
+            pipe.write(user_input.encode())
+    except (BrokenPipeError, OSError):
+        pass
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _clip(text, limit):
+    """Return the longest prefix of text that encodes to at most limit bytes"""
+    return text.encode()[:limit].decode(errors="ignore")
+
+
+def _kill_group(pid):
+    """Kill what is left of a process group, e.g. children that outlived the run"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (OSError, AttributeError):
+        pass
+
+
+def run_status(info, limit):
+    """Overall status of a finished run from its exit info"""
+    if info["timed_out"]:
+        return "timeout"
+    if info["truncated"]:
+        return "output_limit"
+    if limit:
+        return limit
+    return "ok" if info["returncode"] == 0 else "runtime_error"
+
+
+def stream_process(cmd, user_input="", timeout=None, cwd=None, env=None,
+                   output_limit=None, kill_on_limit=True, translate_newlines=False, limits=None):
+    """Run cmd and yield its output as it is produced
+
+    cmd is an argument list, or a UsagePopen that was already started
+    with binary stdin, stdout and stderr pipes.
+
+    Yields ("stdout", text) and ("stderr", text) chunks, then a final
+    ("exit", info) with the return code, whether the timeout was hit, the
+    wall time and resource usage. Closing the generator early kills the
+    process.
+
+    Once stdout and stderr together exceed output_limit bytes the output is
+    cut off there and info["truncated"] is set. The process is then killed,
+    or with kill_on_limit=False left to finish while the rest of its output
+    is read and discarded.
+
+    With limits (a ResourceLimits) the child runs with its rlimits and nice
+    level in a process group of its own, and a cgroup if configured; a
+    started process must have been created with the same limits.
+    info["status"] tells how the run ended: "ok", "runtime_error",
+    "timeout", "output_limit" or the limit it ran into.
+    """
+    start = time.perf_counter()
+    cgroup = limits.cgroup() if limits else None
+    # Memory samples are only taken once launchers have exec'd this program
+    program = None if isinstance(cmd, subprocess.Popen) else os.path.basename(cmd[0])
+    if isinstance(cmd, subprocess.Popen):
+        process = cmd
+        if cgroup:
+            cgroup.add(process.pid)
+    else:
+        usage_read = usage_write = None
+        try:
+            if limits and limits.usage_launcher_path():
+                usage_read, usage_write = os.pipe()
+            cmd, preexec_fn = limits.command(cmd, cgroup, usage_write) if limits else (cmd, None)
+            with tracer.span("spawn"):
+                process = UsagePopen(
+                    cmd,
+                    cwd=cwd,
+                    env=env,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    preexec_fn=preexec_fn,
+                    start_new_session=limits is not None,
+                    pass_fds=() if usage_write is None else (usage_write,)
+                )
+                if usage_read is not None:
+                    os.close(usage_write)
+                    usage_write = None
+                    process.attach_usage(usage_read)
+                    usage_read = None
+        except BaseException:
+            for fd in (usage_read, usage_write):
+                if fd is not None:
+                    os.close(fd)
+            if cgroup:
+                cgroup.close()
+            raise
+    events = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+    for pipe, name in [(process.stdout, "stdout"), (process.stderr, "stderr")]:
+        threading.Thread(target=_pump, args=(pipe, name, events, translate_newlines), daemon=True).start()
+    threading.Thread(target=_feed, args=(process.stdin, user_input), daemon=True).start()
+
+    deadline = start + timeout if timeout else None
+    open_streams = 2
+    timed_out = False
+    truncated = False
+    captured = 0
+    stderr_tail = ""
+    cgroup_events = None
+    cgroup_peak = None
+    next_sample = start
+    try:
+        while open_streams:
+            now = time.perf_counter()
+            remaining = deadline - now if deadline else None
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+            if now >= next_sample:
+                process.sample_memory(program)
+                next_sample = now + MEMORY_SAMPLE_INTERVAL
+            try:
+                name, text = events.get(timeout=min(remaining, MEMORY_SAMPLE_INTERVAL) if deadline else MEMORY_SAMPLE_INTERVAL)
+            except queue.Empty:
+                continue
+            if text is None:
+                open_streams -= 1
+                continue
+            if name == "stderr":
+                stderr_tail = (stderr_tail + text)[-STDERR_TAIL:]
+            if truncated:
+                continue
+            if output_limit is not None:
+                size = len(text.encode())
+                if captured + size > output_limit:
+                    text = _clip(text, output_limit - captured)
+                    truncated = True
+                captured += size
+            if text:
+                yield name, text
+            if truncated and kill_on_limit:
+                break
+
+        while not timed_out and not (truncated and kill_on_limit):
+            # A program may close its output and keep running
+            process.sample_memory(program)
+            remaining = deadline - time.perf_counter() if deadline else None
+            try:
+                process.wait(timeout=max(min(remaining, MEMORY_SAMPLE_INTERVAL), 0) if deadline else MEMORY_SAMPLE_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                timed_out = deadline is not None and time.perf_counter() >= deadline
+    finally:
+        if process.returncode is None:
+            process.stop()
+        process.read_usage()
+        if limits:
+            _kill_group(process.pid)
+        if cgroup:
+            cgroup_events = cgroup.events()
+            cgroup_peak = cgroup.memory_peak_kb()
+            cgroup.close()
+        # Unblock the readers so their threads exit
+        drain_deadline = time.perf_counter() + DRAIN_TIMEOUT
+        while open_streams and time.perf_counter() < drain_deadline:
+            try:
+                if events.get(timeout=0.05)[1] is None:
+                    open_streams -= 1
+            except queue.Empty:
+                pass
+
+    info = {
+        "returncode": process.returncode,
+        "timed_out": timed_out,
+        "truncated": truncated,
+        "run_time": round(time.perf_counter() - start, 4)
+    }
+    info.update(process.usage())
+    if cgroup_peak is not None:
+        # Covers the whole run, including children and what sampling missed
+        info["max_rss_kb"] = cgroup_peak
+    limit = None if timed_out else classify(process.returncode, stderr_tail, cgroup_events)
+    info["status"] = run_status(info, limit)
+    yield "exit", info
+
+
+def capture_process(cmd, user_input="", timeout=None, cwd=None, env=None,
+                    output_limit=None, kill_on_limit=True, limits=None):
+    """Run cmd to completion and collect its output
+
+    A bounded replacement for Popen.communicate() with text mode pipes:
+    output is read in chunks and at most output_limit bytes are kept.
+    Returns the exit info from stream_process with "stdout" and "stderr"
+    added.
+    """
+    output = {"stdout": [], "stderr": []}
+    for name, data in stream_process(cmd, user_input, timeout, cwd, env,
+                                     output_limit, kill_on_limit, translate_newlines=True, limits=limits):
+        if name == "exit":
+            info = data
+        else:
+            output[name].append(data)
+    info["stdout"] = "".join(output["stdout"])
+    info["stderr"] = "".join(output["stderr"])
+    return info
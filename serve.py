@@ -0,0 +1,387 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import WSGIRequestHandler, get_sockaddr, make_server, select_address_family
+from werkzeug.wsgi import ClosingIterator
+
+DEFAULT_HOST = os.environ.get("OFFLINE_COMPILER_HOST", "0.0.0.0")
+DEFAULT_PORT = int(os.environ.get("OFFLINE_COMPILER_PORT", "5000"))
+# Worker processes; defaults to one per core
+DEFAULT_WORKERS = int(os.environ.get("OFFLINE_COMPILER_WORKERS", "0")) or os.cpu_count() or 1
+# Requests a worker serves before it is replaced; 0 never recycles
+DEFAULT_MAX_REQUESTS = int(os.environ.get("OFFLINE_COMPILER_MAX_REQUESTS", "0"))
+# Seconds a stopping worker waits for in-flight requests and jobs
+DEFAULT_GRACEFUL_TIMEOUT = int(os.environ.get("OFFLINE_COMPILER_GRACEFUL_TIMEOUT", "60"))
+# Seconds a client connection may sit idle, including between keep-alive requests
+DEFAULT_CLIENT_TIMEOUT = int(os.environ.get("OFFLINE_COMPILER_CLIENT_TIMEOUT", "30"))
+
+# A worker that exits sooner than this after starting is restarted with a delay
+MIN_WORKER_LIFETIME = 1
+# Identifies this service in /healthz responses
+SERVICE_NAME = "offline-compiler"
+
+
+class RequestTracker:
+    """WSGI middleware counting requests, including responses still streaming"""
+
+    def __init__(self, app, on_request=None):
+        self.app = app
+        self.on_request = on_request
+        self.active = 0
+        self.total = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self.active += 1
+            self.total += 1
+            total = self.total
+        if self.on_request:
+            self.on_request(total)
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._finish()
+            raise
+        return ClosingIterator(response, self._finish)
+
+    def _finish(self):
+        with self._idle:
+            self.active -= 1
+            self._idle.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Wait until no request is in progress; False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self.active == 0, timeout)
+
+
+class RequestHandler(WSGIRequestHandler):
+    def setup(self):
+        self.timeout = self.server.client_timeout
+        super().setup()
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # Don't keep connections open on a worker that is going away
+        if self.server.draining:
+            self.close_connection = True
+
+
+class Worker:
+    """An HTTP server for one process that stops gracefully
+
+    stop() closes the listening socket to new connections; serve() then
+    waits up to graceful_timeout for in-flight requests and for on_drain,
+    which receives the seconds left. After max_requests requests the
+    worker stops itself.
+    """
+
+    def __init__(self, app, host=DEFAULT_HOST, port=DEFAULT_PORT, fd=None, max_requests=0,
+                 graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT, client_timeout=DEFAULT_CLIENT_TIMEOUT,
+                 on_drain=None):
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.on_drain = on_drain
+        self.tracker = RequestTracker(app, self._counted)
+        self.server = make_server(host, port, self.tracker, threaded=True, request_handler=RequestHandler, fd=fd)
+        self.server.client_timeout = client_timeout or None
+        self.server.draining = False
+        if fd is not None:
+            # Workers share the socket; a blocking accept() that lost the race
+            # for a connection would keep this one from ever stopping
+            self.server.socket.setblocking(False)
+        self.port = self.server.port
+
+    def _counted(self, total):
+        if self.max_requests and total >= self.max_requests:
+            self.stop()
+
+    def stop(self):
+        """Begin a graceful stop; safe to call from signal handlers and other threads"""
+        if self.server.draining:
+            return
+        self.server.draining = True
+        # shutdown() blocks until serve_forever() returns
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def serve(self):
+        """Serve until stopped; True if everything finished in time"""
+        self.server.serve_forever()
+        deadline = time.monotonic() + self.graceful_timeout
+        drained = self.tracker.wait_idle(self.graceful_timeout)
+        if self.on_drain and self.on_drain(max(deadline - time.monotonic(), 0)) is False:
+            drained = False
+        self.server.server_close()
+        return drained
+
+
+class ServerThread(threading.Thread):
+    """Runs the service on a background thread of the calling process
+
+    Without an app, main is imported on the new thread, so that a GUI can
+    show its window before Flask and the compiler have loaded. on_first_page
+    is called with the seconds since launched once the editor page has been
+    served.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, app=None, on_first_page=None, launched=None):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.app = app
+        self.on_first_page = on_first_page
+        self.launched = time.perf_counter() if launched is None else launched
+        self.worker = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def run(self):
+        try:
+            app, on_drain = self.app, None
+            if app is None:
+                import main as service
+                app, on_drain = service.app, service.drain
+            worker = Worker(self._timed(app), self.host, self.port, on_drain=on_drain)
+        except SystemExit:
+            # make_server exits when it cannot bind
+            self.error = f"Could not listen on {self.host}:{self.port}"
+            return
+        except Exception as e:
+            self.error = str(e)
+            return
+        with self._lock:
+            self.worker = worker
+            self.port = worker.port
+            if self._stopping:
+                worker.stop()
+        worker.serve()
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            if self.worker:
+                self.worker.stop()
+
+    def _timed(self, app):
+        if not self.on_first_page:
+            return app
+        pending = [True]
+
+        def timed_app(environ, start_response):
+            response = app(environ, start_response)
+            if environ.get("PATH_INFO") == "/" and environ.get("REQUEST_METHOD") == "GET":
+                try:
+                    pending.pop()
+                except IndexError:
+                    pass
+                else:
+                    self.on_first_page(time.perf_counter() - self.launched)
+            return response
+
+        return timed_app
+
+
+def healthy(host, port, timeout=0.5):
+    """True if this service answers /healthz at host:port"""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request("GET", "/healthz")
+        response = connection.getresponse()
+        return response.status == 200 and json.loads(response.read()).get("service") == SERVICE_NAME
+    except (OSError, http.client.HTTPException, ValueError, AttributeError):
+        return False
+    finally:
+        connection.close()
+
+
+def listen(host, port, backlog=128):
+    """Bind the listening socket that worker processes share"""
+    family = select_address_family(host, port)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(get_sockaddr(host, port, family))
+        sock.listen(backlog)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def _on_stop_signals(handler):
+    for name in ("SIGTERM", "SIGINT"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda signum, frame: handler())
+
+
+def _print_ready(host, port, workers):
+    display_host = "127.0.0.1" if host in ("0.0.0.0", "::", "") else host
+    print(f" * Running on http://{display_host}:{port} ({workers} worker{'s' if workers != 1 else ''})", flush=True)
+
+
+def _run_worker(app, sock, host, options):
+    """Body of a forked worker process; returns its exit status"""
+    max_requests = options["max_requests"]
+    if max_requests:
+        # Stagger recycling so that workers do not restart all at once
+        max_requests += random.randint(0, max_requests // 10)
+    worker = Worker(
+        app, host, sock.getsockname()[1], sock.fileno(),
+        max_requests=max_requests,
+        graceful_timeout=options["graceful_timeout"],
+        client_timeout=options["client_timeout"],
+        on_drain=options["on_drain"]
+    )
+    _on_stop_signals(worker.stop)
+    threading.Thread(target=_watch_parent, args=(os.getppid(), worker), daemon=True).start()
+    return 0 if worker.serve() else 1
+
+
+def _watch_parent(parent, worker):
+    """Stop a worker whose master was killed, so that it releases the port"""
+    while os.getppid() == parent:
+        time.sleep(1)
+    worker.stop()
+
+
+def _spawn(app, sock, host, options):
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 1
+    try:
+        status = _run_worker(app, sock, host, options)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def _reap(children):
+    """Forget workers that have exited; returns how many exited too early"""
+    early = 0
+    while children:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if not pid:
+            break
+        started = children.pop(pid, None)
+        if started is not None and time.monotonic() - started < MIN_WORKER_LIFETIME:
+            early += 1
+    return early
+
+
+def serve(app, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, max_requests=DEFAULT_MAX_REQUESTS,
+          graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT, client_timeout=DEFAULT_CLIENT_TIMEOUT, on_drain=None):
+    """Serve app until SIGTERM or SIGINT
+
+    Forks workers that accept connections on one shared socket and replaces
+    any that exit. Where fork is unavailable (Windows), or for a single
+    worker that is never recycled, a threaded server runs in this process.
+    """
+    options = {
+        "max_requests": max_requests,
+        "graceful_timeout": graceful_timeout,
+        "client_timeout": client_timeout,
+        "on_drain": on_drain
+    }
+    if not hasattr(os, "fork") or (workers <= 1 and not max_requests):
+        worker = Worker(app, host, port, graceful_timeout=graceful_timeout, client_timeout=client_timeout,
+                        on_drain=on_drain)
+        _on_stop_signals(worker.stop)
+        _print_ready(host, worker.port, 1)
+        return worker.serve()
+
+    sock = listen(host, port)
+    stopping = False
+
+    def stop():
+        # Only a flag: the handler runs on the main thread, between any two
+        # bytecodes of the loop below, so it must not take a lock
+        nonlocal stopping
+        stopping = True
+
+    _on_stop_signals(stop)
+    _print_ready(host, sock.getsockname()[1], workers)
+
+    children = {}
+    try:
+        while not stopping:
+            while len(children) < workers:
+                children[_spawn(app, sock, host, options)] = time.monotonic()
+            if _reap(children):
+                # Don't spin when workers crash on startup
+                time.sleep(MIN_WORKER_LIFETIME)
+            time.sleep(0.2)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + graceful_timeout + 5
+        while children and time.monotonic() < deadline:
+            _reap(children)
+            time.sleep(0.1)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        sock.close()
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the compiler service with multiple worker processes")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes (default: one per core)")
+    parser.add_argument("--max-requests", type=int, default=DEFAULT_MAX_REQUESTS,
+                        help="replace a worker after this many requests (0: never)")
+    parser.add_argument("--graceful-timeout", type=int, default=DEFAULT_GRACEFUL_TIMEOUT,
+                        help="seconds to wait for running requests and jobs when stopping")
+    parser.add_argument("--client-timeout", type=int, default=DEFAULT_CLIENT_TIMEOUT,
+                        help="seconds an idle client connection is kept open (0: no limit)")
+    parser.add_argument("--build-timeout", type=int, help="compile time limit in seconds")
+    parser.add_argument("--run-timeout", type=int, help="program run time limit in seconds")
+    args = parser.parse_args(argv)
+
+    # Imported here so that --help works without the app's dependencies
+    import main as service
+
+    if args.build_timeout:
+        service.CodeCompiler.BUILD_TIMEOUT = args.build_timeout
+    if args.run_timeout:
+        service.CodeCompiler.EXECUTION_TIMEOUT = args.run_timeout
+
+    serve(
+        service.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        graceful_timeout=args.graceful_timeout,
+        client_timeout=args.client_timeout,
+        on_drain=service.drain
+    )
+
+
+if __name__ == '__main__':
+    main()
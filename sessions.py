@@ -0,0 +1,128 @@
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from cargo_cache import file_lock
+
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,128}$')
+
+
+def directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class SessionWorkspaces:
+    """Persistent per-session working directories for incremental builds
+
+    A browser session sends the same token with every compile and gets the
+    same directory back, so compiler state from the previous run is reused.
+    Directories idle for longer than idle_timeout are deleted, and one that
+    grows beyond quota_bytes is emptied after the run that crossed it.
+    """
+
+    IDLE_TIMEOUT = 30 * 60
+    QUOTA_BYTES = 512 * 1024 * 1024
+    # How often a lease checks for idle sessions
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, root, idle_timeout=None, quota_bytes=None):
+        self.root = root
+        self.idle_timeout = self.IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.quota_bytes = self.QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._last_sweep = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def valid_token(token):
+        return bool(token) and TOKEN_PATTERN.match(token) is not None
+
+    def _paths(self, token):
+        return os.path.join(self.root, token), os.path.join(self.root, f"{token}.lock")
+
+    @contextmanager
+    def _locked(self, token):
+        """Serialize use of one session across threads and server processes"""
+        with self._locks_lock:
+            thread_lock = self._locks.setdefault(token, threading.Lock())
+        lock_path = self._paths(token)[1]
+        with thread_lock:
+            while True:
+                with file_lock(lock_path) as lock_file:
+                    # sweep() may have removed the file while we waited for it;
+                    # then the lock is on a file nobody else will open
+                    if self._is_file(lock_file, lock_path):
+                        yield
+                        return
+
+    @staticmethod
+    def _is_file(lock_file, path):
+        try:
+            held, current = os.fstat(lock_file.fileno()), os.stat(path)
+        except OSError:
+            return False
+        return (held.st_dev, held.st_ino) == (current.st_dev, current.st_ino)
+
+    @contextmanager
+    def lease(self, token):
+        """Yield the session's directory, creating it on first use"""
+        if not self.valid_token(token):
+            raise ValueError("Invalid session token")
+        self._maybe_sweep()
+
+        session_dir, _ = self._paths(token)
+        with self._locked(token):
+            os.makedirs(session_dir, exist_ok=True)
+            # The directory's mtime records when the session was last used
+            os.utime(session_dir)
+            try:
+                yield session_dir
+            finally:
+                if directory_size(session_dir) > self.quota_bytes:
+                    shutil.rmtree(session_dir, ignore_errors=True)
+
+    def _maybe_sweep(self):
+        now = time.time()
+        with self._locks_lock:
+            if now - self._last_sweep < self.SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        threading.Thread(target=self.sweep, daemon=True).start()
+
+    def sweep(self):
+        """Delete sessions that have been idle for longer than idle_timeout"""
+        for name in os.listdir(self.root):
+            if not self.valid_token(name):
+                continue
+            session_dir, lock_path = self._paths(name)
+            try:
+                if time.time() - os.path.getmtime(session_dir) < self.idle_timeout:
+                    continue
+            except OSError:
+                continue
+            with self._locked(name):
+                # Check again in case the session was used while waiting for the lock
+                try:
+                    if time.time() - os.path.getmtime(session_dir) < self.idle_timeout:
+                        continue
+                except OSError:
+                    continue
+                shutil.rmtree(session_dir, ignore_errors=True)
+                # Waiters holding the old file notice it is gone and lock the new one
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+            with self._locks_lock:
+                self._locks.pop(name, None)
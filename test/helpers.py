@@ -0,0 +1,14 @@
+import shutil
+import tempfile
+import unittest
+
+from main import CodeCompiler
+
+
+class CompilerTestCase(unittest.TestCase):
+    """Gives every test a CodeCompiler with a cache directory of its own"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        self.compiler = CodeCompiler(cache_dir=self.cache_dir)
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from artifact_cache import ArtifactCache, private_dir
+from main import CodeCompiler
+
+
+class ArtifactCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _artifact(self, name, size):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_hit_and_miss(self):
+        cache = ArtifactCache(os.path.join(self.dir, "cache"), 1024)
+        dest = os.path.join(self.dir, "out")
+        self.assertFalse(cache.fetch("k", dest))
+        cache.store("k", self._artifact("a", 10))
+        self.assertTrue(cache.fetch("k", dest))
+        self.assertEqual(os.path.getsize(dest), 10)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        # Another server process using the directory counts the same hits
+        self.assertEqual(ArtifactCache(cache.cache_dir, 1024).stats()["hits"], 1)
+
+    def test_lru_eviction(self):
+        cache = ArtifactCache(os.path.join(self.dir, "cache"), 250)
+        cache.store("old", self._artifact("a", 100))
+        cache.store("used", self._artifact("b", 100))
+        os.utime(os.path.join(cache.cache_dir, "old"), (1, 1))
+        os.utime(os.path.join(cache.cache_dir, "used"), (2, 2))
+        cache.fetch("used", os.path.join(self.dir, "out"))
+        cache.store("new", self._artifact("c", 100))
+        self.assertFalse(os.path.exists(os.path.join(cache.cache_dir, "old")))
+        self.assertTrue(os.path.exists(os.path.join(cache.cache_dir, "used")))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_key_depends_on_options(self):
+        cache = ArtifactCache(os.path.join(self.dir, "cache"), 1024)
+        key = cache.make_key("int main(){}", "c", ["gcc"])
+        self.assertEqual(key, cache.make_key("int main(){}", "c", ["gcc"]))
+        self.assertNotEqual(key, cache.make_key("int main(){}", "c", ["gcc", "-O2"]))
+        self.assertNotEqual(key, cache.make_key("int main(){}", "cpp", ["gcc"]))
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "needs user IDs")
+    def test_private_dir(self):
+        path = private_dir(os.path.join(self.dir, "new", "cache"))
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "needs user IDs")
+    def test_private_dir_refuses_others(self):
+        shared = os.path.join(self.dir, "shared")
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+        with self.assertRaises(PermissionError):
+            private_dir(shared)
+        link = os.path.join(self.dir, "link")
+        os.symlink(self.dir, link)
+        with self.assertRaises(PermissionError):
+            private_dir(link)
+        with unittest.mock.patch("os.getuid", return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                private_dir(self.dir)
+
+    @unittest.skipUnless(shutil.which("gcc"), "gcc not installed")
+    def test_recompile_uses_cache(self):
+        compiler = CodeCompiler(cache_dir=os.path.join(self.dir, "cache"))
+        code = '#include <stdio.h>\nint main(){int n; scanf("%d",&n); printf("%d\\n", n*2);}'
+        first = compiler.compile_and_execute(code, "2", "c", [])
+        second = compiler.compile_and_execute(code, "21", "c", [])
+        self.assertEqual(first["output"], "4\n")
+        self.assertEqual(second["output"], "42\n")
+        self.assertIn("build_time", second)
+        self.assertIn("run_time", second)
+        stats = compiler.artifact_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import build_assets
+import main
+
+
+class BuildAssetsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.static = os.path.join(self.dir, "static")
+        self.dist = os.path.join(self.static, "dist")
+        os.makedirs(os.path.join(self.static, "css", "lib"))
+        with open(os.path.join(self.static, "css", "lib", "a.css"), "w") as f:
+            f.write("/* comment */\n.a { background: url('../img/x.png?v=1'); }\n.b { src: url(data:font/woff2;base64,AA) }\n")
+        os.makedirs(os.path.join(self.static, "js"))
+        with open(os.path.join(self.static, "js", "a.js"), "w") as f:
+            f.write("var a = 1\n//# sourceMappingURL=a.js.map\n")
+        with open(os.path.join(self.static, "js", "b.js"), "w") as f:
+            f.write("(function () {})()")
+        self.bundles = {"editor.css": ["css/lib/a.css"], "editor.js": ["js/a.js", "js/b.js"]}
+
+    def test_build(self):
+        manifest = build_assets.build(self.bundles, self.static, self.dist)
+        self.assertRegex(manifest["editor.js"], r'^editor\.[0-9a-f]{12}\.js$')
+        with open(os.path.join(self.dist, manifest["editor.js"])) as f:
+            js = f.read()
+        self.assertNotIn("sourceMappingURL", js)
+        self.assertIn("var a = 1\n;\n(function () {})()", js)
+        with open(os.path.join(self.dist, manifest["editor.css"])) as f:
+            css = f.read()
+        self.assertNotIn("comment", css)
+        self.assertIn("url('../css/img/x.png?v=1')", css)
+        self.assertIn("url(data:font/woff2;base64,AA)", css)
+        with gzip.open(os.path.join(self.dist, manifest["editor.css"] + ".gz"), "rt") as f:
+            self.assertEqual(f.read(), css)
+        with open(os.path.join(self.dist, build_assets.MANIFEST_NAME)) as f:
+            self.assertEqual(json.load(f), manifest)
+
+        # A rebuild after a change replaces the old bundle
+        with open(os.path.join(self.static, "js", "b.js"), "a") as f:
+            f.write(";var b = 2")
+        new_manifest = build_assets.build(self.bundles, self.static, self.dist)
+        self.assertNotEqual(new_manifest["editor.js"], manifest["editor.js"])
+        self.assertFalse(os.path.exists(os.path.join(self.dist, manifest["editor.js"])))
+
+    def test_bundled_files_exist(self):
+        for files in build_assets.BUNDLES.values():
+            for path in files:
+                self.assertTrue(os.path.exists(os.path.join(build_assets.STATIC_DIR, path)), path)
+
+    def test_page_defers_lazy_bundles(self):
+        with mock.patch.object(main, "DIST_DIR", self.dist):
+            html = main.app.test_client().get("/").get_data(as_text=True)
+        self.assertIn('<script src="/static/js/codemirror/mode/rust/rust.min.js">', html)
+        self.assertNotIn('<script src="/static/js/codemirror/mode/python/python.min.js">', html)
+        self.assertNotIn('<script src="/static/js/beautify/beautify.min.js">', html)
+        # Hints open on every keystroke, so they load with the editor
+        self.assertIn('<script src="/static/js/codemirror/addon/hint/show-hint.min.js">', html)
+        self.assertIn('/static/css/codemirror/addon/hint/show-hint.min.css', html)
+        self.assertIn('"mode-python.js": ["/static/js/codemirror/mode/python/python.min.js"]', html)
+
+    def test_route(self):
+        manifest = build_assets.build(self.bundles, self.static, self.dist)
+        with mock.patch.object(main, "DIST_DIR", self.dist), mock.patch.object(main, "_asset_manifest", (None, None)):
+            client = main.app.test_client()
+            response = client.get(f"/static/dist/{manifest['editor.js']}", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertIn("immutable", response.headers["Cache-Control"])
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertTrue(response.content_type.startswith("text/javascript"))
+
+            plain = client.get(f"/static/dist/{manifest['editor.js']}")
+            self.assertNotIn("Content-Encoding", plain.headers)
+            self.assertEqual(gzip.decompress(response.data), plain.data)
+
+            self.assertEqual(client.get("/static/dist/manifest.json").status_code, 404)
+            self.assertIn(manifest["editor.css"], client.get("/").get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
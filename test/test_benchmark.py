@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark import HttpClient, InProcessClient, LocalServer, load_corpus, percentile, run_benchmark
+
+
+class BenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        corpus = os.path.join(self.dir, "corpus")
+        os.makedirs(corpus)
+        with open(os.path.join(corpus, "double.py"), "w") as f:
+            f.write("print(int(input()) * 2)\n")
+        with open(os.path.join(corpus, "double.py.in"), "w") as f:
+            f.write("21\n")
+        with open(os.path.join(corpus, "notes.txt"), "w") as f:
+            f.write("not a program\n")
+        self.programs = load_corpus(corpus)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([3], 0.95), 3)
+
+    def test_in_process(self):
+        self.assertEqual([program["name"] for program in self.programs], ["double.py"])
+        client = InProcessClient(os.path.join(self.dir, "cache"))
+        results = run_benchmark(client, self.programs, iterations=3, concurrency=2, cold=True)
+        self.assertEqual(results["requests"], 3)
+        self.assertEqual(results["languages"]["python"]["errors"], 0)
+        self.assertEqual(results["languages"]["python"]["run"]["count"], 3)
+        self.assertIsNotNone(results["latency"]["p99"])
+
+    def test_cached_responses_are_reported_apart(self):
+        client = InProcessClient(os.path.join(self.dir, "cache"), result_cache=True)
+        results = run_benchmark(client, self.programs, iterations=3, warmup=1)
+        python = results["languages"]["python"]
+        self.assertEqual(results["cached_requests"], 3)
+        self.assertEqual((python["requests"], python["cached"]["count"]), (0, 3))
+        self.assertIsNone(python["run"])
+
+    def test_http(self):
+        server = LocalServer(os.path.join(self.dir, "cache"))
+        self.addCleanup(server.close)
+        results = run_benchmark(HttpClient(server.url), self.programs, iterations=2, concurrency=2)
+        self.assertEqual(results["requests"], 2)
+        self.assertEqual(results["errors"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
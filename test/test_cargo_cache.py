@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cargo_cache import CargoCache, find_external_crates
+
+
+class CargoCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.cache = CargoCache(self.dir)
+
+    def test_key_ignores_order_and_duplicates(self):
+        self.assertEqual(self.cache.key(["rand", "regex"]), self.cache.key(["regex", "rand", "rand"]))
+        self.assertNotEqual(self.cache.key(["rand"]), self.cache.key(["regex"]))
+
+    def test_target_dir_is_shared_per_dependency_set(self):
+        env = self.cache.build_env(["rand"])
+        self.assertEqual(env["CARGO_TARGET_DIR"], self.cache.target_dir(["rand"]))
+        self.assertTrue(env["CARGO_TARGET_DIR"].startswith(self.dir))
+
+    def test_prepare_reuses_lockfile(self):
+        state_dir = os.path.dirname(self.cache.target_dir(["rand"]))
+        with open(os.path.join(state_dir, "Cargo.lock"), "w") as f:
+            f.write("# resolved\n")
+        project = os.path.join(self.dir, "project")
+        os.makedirs(project)
+        self.cache.prepare(project, ["rand"])
+        with open(os.path.join(project, "Cargo.lock")) as f:
+            self.assertEqual(f.read(), "# resolved\n")
+
+    def test_manifest_pins_vendored_versions(self):
+        self.cache = CargoCache(self.dir, os.path.join(self.dir, "vendor"))
+        os.makedirs(self.cache.vendor_dir)
+        unvendored_key = self.cache.key(["rand"])
+        with open(self.cache.vendor_manifest_path, "w") as f:
+            f.write('{"rand": "0.8.5"}')
+        manifest = self.cache.manifest(["rand", "regex"])
+        self.assertIn('rand = "=0.8.5"', manifest)
+        self.assertIn('regex = "*"', manifest)
+        self.assertNotEqual(unvendored_key, self.cache.key(["rand"]))
+
+        project = os.path.join(self.dir, "project")
+        os.makedirs(project)
+        self.cache.prepare(project, ["rand"])
+        with open(os.path.join(project, ".cargo", "config.toml")) as f:
+            self.assertIn('replace-with = "vendored-sources"', f.read())
+
+
+class FindExternalCratesTest(unittest.TestCase):
+    def test_use_and_bare_paths(self):
+        code = """
+use rand::Rng;
+use serde_json as json;
+fn main() {
+    let n = regex::Regex::new("a").unwrap();
+}
+"""
+        self.assertEqual(find_external_crates(code), ["rand", "regex", "serde_json"])
+
+    def test_ignores_std_locals_comments_and_strings(self):
+        code = """
+use std::io::{self, Write};
+use std::collections::hash_map::{self, HashMap};
+mod util { pub fn helper() {} }
+use util::helper;
+enum shape { Circle }
+// use fake::Thing;
+fn main() {
+    let s = "serde::Serialize";
+    io::stdout().flush().unwrap();
+    util::helper();
+    let m: HashMap<i32, i32> = HashMap::new();
+    let e = hash_map::RandomState::new();
+    let x = i32::MAX + u8::from(1u8) as i32;
+    let v = (0..3).collect::<Vec<_>>();
+    let c = shape::Circle;
+}
+#[rustfmt::skip]
+fn f<'a>(x: &'a str) -> char { 'a' }
+"""
+        self.assertEqual(find_external_crates(code), [])
+
+    def test_extern_crate_and_grouped_use(self):
+        code = "extern crate rand;\nuse regex;\nuse {itertools::Itertools, core::fmt};\n#[tokio::main]\nasync fn main() {}"
+        self.assertEqual(find_external_crates(code), ["itertools", "rand", "regex", "tokio"])
+
+    def test_ignores_local_functions_and_constants(self):
+        code = """
+fn id<T>(x: T) -> T { x }
+const fn pair<T: Copy>(x: T) -> (T, T) { (x, x) }
+const LIMITS: [u8; 2] = [1, 2];
+static mut counter: u32 = 0;
+struct Grid;
+impl Grid { const SIZE: usize = 3; }
+fn main() {
+    println!("{}", id::<i32>(5));
+    let p = pair::<u8>(1);
+    let n = Grid::SIZE + LIMITS.len();
+    unsafe { counter += 1; }
+}
+"""
+        self.assertEqual(find_external_crates(code), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import hashlib
+import http.server
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from contextlib import redirect_stderr, redirect_stdout
+
+from download_dependencies import Installer, make_mirror
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves server.files from memory, honouring Range requests"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        status, start = 200, 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"][len("bytes="):-1])
+            status = 206
+        self.send_response(status)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+
+def entry(path, data, url=None):
+    result = {"path": path, "sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+    if url:
+        result["url"] = url
+    return result
+
+
+class InstallerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.files = {}
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.static_dir = os.path.join(self.tmp, "static")
+
+        self.js = b"var cm = 1;\n" * 1000
+        self.css = b".cm { color: red }\n"
+        self.font = os.urandom(2048)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as z:
+            z.writestr("fa/webfonts/fa.woff2", self.font)
+            z.writestr("fa/README", b"unused")
+        self.server.files = {
+            "/cm/codemirror.min.js": self.js,
+            "/cm/codemirror.min.css": self.css,
+            "/fa.zip": archive.getvalue(),
+        }
+        member = entry("fonts/fa.woff2", self.font)
+        member["name"] = "fa/webfonts/fa.woff2"
+        self.manifest = {
+            "files": [
+                entry("js/codemirror.min.js", self.js, f"{self.base}/cm/codemirror.min.js"),
+                entry("css/codemirror.min.css", self.css, f"{self.base}/cm/codemirror.min.css"),
+            ],
+            "archives": [{"url": f"{self.base}/fa.zip", "sha256": None, "members": [member]}],
+        }
+
+    def _install(self, static_dir=None, **kwargs):
+        installer = Installer(self.manifest, static_dir or self.static_dir,
+                              download_dir=os.path.join(self.tmp, "downloads"), **kwargs)
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            return installer.run()
+
+    def _read(self, path, static_dir=None):
+        with open(os.path.join(static_dir or self.static_dir, *path.split("/")), "rb") as f:
+            return f.read()
+
+    def test_install_and_skip(self):
+        self.assertEqual(self._install(), {})
+        self.assertEqual(self._read("js/codemirror.min.js"), self.js)
+        self.assertEqual(self._read("css/codemirror.min.css"), self.css)
+        self.assertEqual(self._read("fonts/fa.woff2"), self.font)
+        self.assertFalse(os.listdir(os.path.join(self.tmp, "downloads")))
+
+        self.server.requests.clear()
+        self.assertEqual(self._install(), {})
+        self.assertEqual(self.server.requests, [])
+
+    def test_checksum_mismatch(self):
+        self.manifest["files"][0]["sha256"] = "0" * 64
+        failures = self._install(retries=1)
+        self.assertEqual(list(failures), ["js/codemirror.min.js"])
+        self.assertEqual(os.listdir(os.path.join(self.static_dir, "js")), [])
+
+    def test_resume(self):
+        path = os.path.join(self.static_dir, "js", "codemirror.min.js")
+        os.makedirs(os.path.dirname(path))
+        with open(path + ".part", "wb") as f:
+            f.write(self.js[:5000])
+        self.assertEqual(self._install(), {})
+        self.assertEqual(self._read("js/codemirror.min.js"), self.js)
+        self.assertIn(("/cm/codemirror.min.js", "bytes=5000-"), self.server.requests)
+
+    def test_mirrors(self):
+        self._install()
+        tarball = os.path.join(self.tmp, "mirror.tar.gz")
+        make_mirror(self.manifest, tarball, self.static_dir)
+
+        # The upstream URLs are never used in mirror mode
+        self.server.files = {f"/mirror/{path}": data for path, data in [
+            ("js/codemirror.min.js", self.js), ("css/codemirror.min.css", self.css), ("fonts/fa.woff2", self.font)
+        ]}
+        for mirror in (tarball, self.static_dir, f"{self.base}/mirror"):
+            with self.subTest(mirror=mirror):
+                target = tempfile.mkdtemp(dir=self.tmp)
+                self.assertEqual(self._install(target, mirror=mirror), {})
+                self.assertEqual(self._read("js/codemirror.min.js", target), self.js)
+                self.assertEqual(self._read("fonts/fa.woff2", target), self.font)
+
+
+if __name__ == '__main__':
+    unittest.main()
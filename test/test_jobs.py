@@ -0,0 +1,132 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import main
+from jobs import JobManager, QueueFull, parse_pool_sizes
+from test.helpers import CompilerTestCase
+
+
+class JobManagerTest(unittest.TestCase):
+    def _wait(self, manager, job_id):
+        deadline = time.time() + 10
+        while manager.get(job_id).status in ("queued", "running"):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        return manager.get(job_id)
+
+    def test_runs_jobs(self):
+        manager = JobManager(lambda value: {"output": value * 2})
+        job = manager.submit("python", {"value": 21})
+        job = self._wait(manager, job.id)
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.result, {"output": 42})
+
+    def test_failed_job(self):
+        def explode():
+            raise RuntimeError("boom")
+
+        manager = JobManager(explode)
+        job = self._wait(manager, manager.submit("c", {}).id)
+        self.assertEqual(job.status, "failed")
+        self.assertIn("boom", job.result["compile_error"])
+
+    def test_queue_full(self):
+        release = threading.Event()
+        manager = JobManager(lambda: release.wait(), workers={"rust": 1}, queue_limit=1)
+        self.addCleanup(release.set)
+        manager.submit("rust", {})
+        # Wait for the worker to pick the first job so the second fills the queue
+        deadline = time.time() + 5
+        while manager._queues["rust"].qsize():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        manager.submit("rust", {})
+        with self.assertRaises(QueueFull) as ctx:
+            manager.submit("rust", {})
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+    def test_shared_state_dir(self):
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir, True)
+        manager = JobManager(lambda value: {"output": value}, state_dir=state_dir)
+        job = self._wait(manager, manager.submit("python", {"value": 1}).id)
+        # Another server process sees the job through the directory
+        other = JobManager(lambda: None, state_dir=state_dir)
+        self.assertEqual(other.get(job.id).to_dict(), job.to_dict())
+        self.assertIsNone(other.get("0" * 32))
+
+    def test_sweep_keeps_unfinished_jobs(self):
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir, True)
+        old = time.time() - 7200
+        jobs = {
+            "a" * 32: {"status": "running", "started_at": old, "finished_at": None},
+            "b" * 32: {"status": "done", "started_at": old, "finished_at": old},
+        }
+        for job_id, fields in jobs.items():
+            path = os.path.join(state_dir, f"{job_id}.json")
+            with open(path, "w") as f:
+                json.dump(dict(fields, job_id=job_id, language="rust", result=None, created_at=old), f)
+            os.utime(path, (old, old))
+
+        manager = JobManager(lambda: None, job_ttl=3600, state_dir=state_dir)
+        self.assertEqual(manager.get("a" * 32).status, "running")
+        self.assertIsNone(manager.get("b" * 32))
+
+    def test_shutdown(self):
+        release = threading.Event()
+        manager = JobManager(lambda: release.wait(), workers={"rust": 1})
+        manager.submit("rust", {})
+        self.assertFalse(manager.shutdown(timeout=0.1))
+        with self.assertRaises(QueueFull):
+            manager.submit("rust", {})
+        release.set()
+        self.assertTrue(manager.shutdown(timeout=5))
+
+    def test_parse_pool_sizes(self):
+        self.assertEqual(parse_pool_sizes("python=4, rust=1"), {"python": 4, "rust": 1})
+        self.assertEqual(parse_pool_sizes(""), {})
+
+
+class JobRoutesTest(CompilerTestCase):
+    def setUp(self):
+        super().setUp()
+        manager = JobManager(self.compiler.compile_and_execute, state_dir=os.path.join(self.cache_dir, "jobs"))
+        self.addCleanup(manager.shutdown, 10)
+        for name, value in (("compiler", self.compiler), ("jobs", manager)):
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = main.app.test_client()
+
+    def test_submit_and_poll(self):
+        response = self.client.post('/jobs', data={'code': 'print(input())', 'input': 'hi', 'language': 'python'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["job_id"]
+
+        deadline = time.time() + 10
+        while True:
+            data = self.client.get(f'/jobs/{job_id}').get_json()
+            if data["status"] not in ("queued", "running"):
+                break
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.05)
+        self.assertEqual(data["status"], "done")
+        self.assertEqual(data["result"]["output"], "hi\n")
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/jobs/missing').status_code, 404)
+
+    def test_rejects_unsupported_language(self):
+        response = self.client.post('/jobs', data={'code': 'x', 'language': 'cobol'})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
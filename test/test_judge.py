@@ -0,0 +1,81 @@
+import shutil
+import unittest
+
+from main import app
+from test.helpers import CompilerTestCase
+
+
+class JudgeTest(CompilerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.compiler.EXECUTION_TIMEOUT = 1
+
+    @unittest.skipUnless(shutil.which("gcc"), "gcc not installed")
+    def test_verdicts_with_single_compile(self):
+        code = """
+#include <stdio.h>
+int main() {
+    int n;
+    scanf("%d", &n);
+    if (n < 0) return 1;
+    if (n == 0) for (;;);
+    printf("%d\\n", n * n);
+    return 0;
+}
+"""
+        cases = [
+            {"input": "3", "expected": "9"},
+            {"input": "4", "expected": "15\n"},
+            {"input": "-1", "expected": "1"},
+            {"input": "0", "expected": "0"},
+            {"input": "5"},
+        ]
+        result = self.compiler.judge(code, "c", [], cases)
+        self.assertTrue(result["success"])
+        self.assertEqual(
+            [case["verdict"] for case in result["cases"]],
+            ["accepted", "wrong_answer", "runtime_error", "time_limit_exceeded", "ok"]
+        )
+        self.assertEqual(result["cases"][2]["exit_code"], 1)
+        self.assertEqual(result["summary"], {"total": 5, "passed": 2, "verdict": "wrong_answer"})
+        self.assertEqual(self.compiler.artifact_cache.stats()["misses"], 1)
+
+    def test_compile_error(self):
+        result = self.compiler.judge("int main( {", "c", [], [{"input": ""}])
+        self.assertFalse(result["success"])
+        self.assertTrue(result["compile_error"])
+        self.assertEqual(result["cases"], [])
+
+    def test_route(self):
+        client = app.test_client()
+        response = client.post('/judge', json={
+            "code": "print(int(input()) + 1)",
+            "language": "python",
+            "cases": [{"input": "1", "expected": "2"}, {"input": "2", "expected": "2"}]
+        })
+        data = response.get_json()
+        self.assertEqual([case["verdict"] for case in data["cases"]], ["accepted", "wrong_answer"])
+        self.assertEqual(client.post('/judge', json={"code": "x", "cases": "nope"}).status_code, 400)
+
+    def test_route_checks_types(self):
+        client = app.test_client()
+        valid = {"code": "print(input())", "language": "python", "cases": [{"input": "1", "expected": "1"}]}
+        for change, message in [
+            ({"code": 42}, "code must be a string"),
+            ({"language": ["python"]}, "language must be a string"),
+            ({"options": {"-O2": True}}, "options must be a string or a list of strings"),
+            ({"options": ["-O2", 3]}, "options must be a string or a list of strings"),
+            ({"cases": [{"input": 1}]}, "cases[0].input must be a string"),
+            ({"cases": [{"input": "1"}, {"input": "2", "expected": 2}]}, "cases[1].expected must be a string or null"),
+        ]:
+            with self.subTest(change=change):
+                response = client.post('/judge', json=dict(valid, **change))
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json()["error"], message)
+        self.assertEqual(client.post('/judge', json=["not", "an", "object"]).status_code, 400)
+        response = client.post('/judge', json=dict(valid, options=["-u"], cases=[{"input": "1", "expected": None}]))
+        self.assertEqual(response.get_json()["cases"][0]["verdict"], "ok")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from limits import Cgroup, ResourceLimits, UsageLauncher, classify, user_task_count
+from main import CodeCompiler
+from runner import capture_process
+from test.helpers import CompilerTestCase
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "needs rlimits and /proc")
+class ResourceLimitsTest(unittest.TestCase):
+    def setUp(self):
+        self.limits = ResourceLimits(
+            memory_bytes=256 * 1024 * 1024, cpu_seconds=1, open_files=32,
+            file_size_bytes=1024 * 1024, nice=5, cgroup=""
+        )
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def _run(self, code):
+        return capture_process([sys.executable, "-c", code], timeout=10, cwd=self.dir, limits=self.limits)
+
+    def test_statuses(self):
+        cases = {
+            "print(1)": "ok",
+            "raise SystemExit(3)": "runtime_error",
+            "x = bytearray(512 * 1024 * 1024)": "memory_limit",
+            "while True: pass": "cpu_limit",
+            "open('big', 'wb').write(b'x' * 2 * 1024 * 1024)": "file_size_limit",
+            "files = [open(__import__('os').devnull) for _ in range(100)]": "open_files_limit",
+        }
+        for code, status in cases.items():
+            with self.subTest(status=status):
+                self.assertEqual(self._run(code)["status"], status)
+
+    def test_nice_level(self):
+        info = self._run("import os; print(os.nice(0))")
+        self.assertEqual(int(info["stdout"]), os.nice(0) + 5)
+
+    def test_leftover_children_are_killed(self):
+        code = "import subprocess, sys; print(subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']).pid)"
+        pid = int(self._run(code)["stdout"])
+        deadline = time.time() + 5
+        while self._alive(pid):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.05)
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # A zombie only waits for init to reap it
+                return f.read().rsplit(") ", 1)[1][0] != "Z"
+        except FileNotFoundError:
+            return False
+
+    def test_judge_verdict(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        compiler = CodeCompiler(cache_dir=cache_dir)
+        compiler.limits = self.limits
+        result = compiler.judge("x = bytearray(512 * 1024 * 1024)", "python", [], [{"input": ""}])
+        self.assertEqual(result["cases"][0]["verdict"], "memory_limit_exceeded")
+        self.assertIn("Memory limit exceeded", result["cases"][0]["runtime_error"])
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_classify(self):
+        self.assertIsNone(classify(0, "MemoryError"))
+        self.assertIsNone(classify(1, "Traceback: ValueError"))
+        self.assertEqual(classify(-6, "terminate called after throwing an instance of 'std::bad_alloc'"), "memory_limit")
+        self.assertEqual(classify(1, "fork: Resource temporarily unavailable"), "process_limit")
+        # Only as the way a failed run ended
+        self.assertIsNone(classify(0, "fork: Resource temporarily unavailable"))
+        self.assertIsNone(classify(1, "read: Resource temporarily unavailable\nretrying\n1\n2\nValueError: bad input"))
+        self.assertEqual(classify(-9, "", {"oom_kill": 1, "pids_max": 0}), "memory_limit")
+        self.assertEqual(classify(0, "", {"oom_kill": 0, "pids_max": 2}), "process_limit")
+
+
+@unittest.skipUnless(os.name == "posix", "needs POSIX launchers")
+class CommandTest(unittest.TestCase):
+    def test_launchers(self):
+        limits = ResourceLimits(memory_bytes=0, cpu_seconds=2, processes=0, open_files=0,
+                                file_size_bytes=0, nice=3, cgroup="")
+        cmd, preexec_fn = limits.command(["prog", "arg"])
+        if not (limits.PRLIMIT and limits.NICE_COMMAND):
+            self.skipTest("prlimit or nice not installed")
+        self.assertIsNone(preexec_fn)
+        self.assertEqual(cmd, [limits.PRLIMIT, "--cpu=2:3", "--", limits.NICE_COMMAND, "-n", "3", "prog", "arg"])
+
+    @unittest.skipIf("OFFLINE_COMPILER_PROCESS_LIMIT" in os.environ, "process limit set in the environment")
+    @unittest.skipUnless(os.path.isdir("/proc/self/task"), "needs /proc")
+    def test_process_rlimit_relative_to_the_user(self):
+        import resource
+        limits = ResourceLimits(cgroup="")
+        nproc = dict((which, soft) for which, soft, _ in limits.rlimits()).get(resource.RLIMIT_NPROC)
+        # The user's own processes and threads, this one included, plus the headroom
+        hard = resource.getrlimit(resource.RLIMIT_NPROC)[1]
+        self.assertEqual(nproc, min(user_task_count() + limits.PROCESS_HEADROOM, hard))
+        self.assertGreater(user_task_count(), 0)
+        # A cgroup's pids.max bounds the run instead
+        self.assertEqual(ResourceLimits(cgroup="/sys/fs/cgroup/runs").process_limit(), 0)
+
+    def test_warns_without_a_process_bound(self):
+        with self.assertWarns(RuntimeWarning):
+            ResourceLimits(processes=0, cgroup="").warn_if_unbounded()
+        self.assertIsNone(ResourceLimits(processes=0, cgroup="/sys/fs/cgroup/runs").unbounded_processes())
+
+    def test_fallback_without_prlimit(self):
+        limits = ResourceLimits(cpu_seconds=2, nice=0, cgroup="")
+        limits.PRLIMIT = None
+        cmd, preexec_fn = limits.command(["prog"])
+        self.assertEqual(cmd, ["prog"])
+        self.assertTrue(callable(preexec_fn))
+
+    def test_enters_cgroup_before_exec(self):
+        parent = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, parent, True)
+        limits = ResourceLimits(memory_bytes=0, cpu_seconds=0, processes=0, open_files=0,
+                                file_size_bytes=0, nice=0, cgroup="")
+        cmd, preexec_fn = limits.command(["sh", "-c", "echo $$"], Cgroup(parent))
+        self.assertIsNone(preexec_fn)
+        pid = subprocess.run(cmd, capture_output=True, text=True).stdout.strip()
+        with open(os.path.join(parent, "cgroup.procs")) as f:
+            self.assertEqual(f.read().strip(), pid)
+
+
+@unittest.skipUnless(os.name == "posix" and UsageLauncher.COMPILER, "needs a C compiler")
+class UsageLauncherTest(CompilerTestCase):
+    def test_trivial_c_program_reports_peak_memory(self):
+        result = self.compiler.compile_and_execute("int main(void) { return 0; }", "", "c", [])
+        self.assertTrue(result["success"])
+        self.assertIsNotNone(result["max_rss_kb"])
+        # The program's own figure, not the server's
+        self.assertLess(result["max_rss_kb"], 20 * 1024)
+
+    def test_ends_like_the_program(self):
+        limits = ResourceLimits(usage_launcher=UsageLauncher(self.cache_dir), cgroup="")
+        for code, returncode in [("print(1)", 0), ("raise SystemExit(3)", 3),
+                                 ("import os; os.kill(os.getpid(), 9)", -9)]:
+            with self.subTest(code=code):
+                info = capture_process([sys.executable, "-c", code], timeout=10, limits=limits)
+                self.assertEqual(info["returncode"], returncode)
+                self.assertIsNotNone(info["max_rss_kb"])
+
+
+class CgroupTest(unittest.TestCase):
+    def setUp(self):
+        # A plain directory standing in for a delegated cgroup v2 parent
+        self.parent = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.parent, True)
+
+    def test_create_and_events(self):
+        limits = ResourceLimits(memory_bytes=64 * 1024 * 1024, processes=1000, cgroup=self.parent)
+        group = limits.cgroup()
+        with open(os.path.join(self.parent, "cgroup.subtree_control")) as f:
+            self.assertEqual(f.read(), "+cpu +memory +pids")
+        with open(os.path.join(group.path, "memory.max")) as f:
+            self.assertEqual(f.read(), str(64 * 1024 * 1024))
+        with open(os.path.join(group.path, "pids.max")) as f:
+            self.assertEqual(f.read(), str(ResourceLimits.CGROUP_PROCESSES))
+        with open(os.path.join(group.path, "memory.events"), "w") as f:
+            f.write("low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n")
+        self.assertEqual(group.events(), {"oom_kill": 1, "pids_max": 0})
+        self.assertIsNone(group.memory_peak_kb())
+        with open(os.path.join(group.path, "memory.peak"), "w") as f:
+            f.write(f"{8 * 1024 * 1024}\n")
+        self.assertEqual(group.memory_peak_kb(), 8 * 1024)
+
+    def test_unusable_parent(self):
+        self.assertIsNone(Cgroup.create(os.path.join(self.parent, "missing")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import app
+from metrics import Metrics, SharedState
+from test.helpers import CompilerTestCase
+
+
+class MetricsTest(unittest.TestCase):
+    def test_render_histograms(self):
+        metrics = Metrics()
+        metrics.observe("c", {"build_time": 0.3, "run_time": 0.02, "max_rss_kb": 1500})
+        metrics.observe("c", {"build_time": 2.0, "run_time": None})
+        text = metrics.render()
+        labels = 'language="c"'
+        self.assertIn(f'offline_compiler_build_time_seconds_bucket{{{labels},le="0.5"}} 1', text)
+        self.assertIn(f'offline_compiler_build_time_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'offline_compiler_build_time_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'offline_compiler_run_time_seconds_count{{{labels}}} 1', text)
+        self.assertIn(f'offline_compiler_max_rss_bytes_bucket{{{labels},le="4194304"}} 1', text)
+        self.assertIn("# TYPE offline_compiler_cpu_user_seconds histogram", text)
+
+    def test_processes_share_series(self):
+        # Two worker processes, or a worker and the one that replaced it
+        path = os.path.join(tempfile.mkdtemp(), "stats", "metrics.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(os.path.dirname(path)))
+        first, second = Metrics(path), Metrics(path)
+        first.observe("c", {"run_time": 0.02})
+        second.observe("c", {"run_time": 0.2})
+        # Each process's observations reach the file once it flushes
+        self.assertIn('offline_compiler_run_time_seconds_count{language="c"} 1', second.render())
+        SharedState.flush_all()
+        self.assertIn('offline_compiler_run_time_seconds_count{language="c"} 2', Metrics(path).render())
+
+
+def _add_counts(path, times):
+    state = SharedState(path, flush_interval=0.01)
+    for _ in range(times):
+        state.add(hits=1, misses=2)
+    state.flush()
+
+
+class SharedStateTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "stats", "counters.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(os.path.dirname(self.path)))
+
+    def test_batches_additions(self):
+        state = SharedState(self.path, flush_interval=60)
+        state.add(hits=1)
+        state.add(hits=2, misses=1)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(state.read(), {"hits": 3, "misses": 1})
+        self.assertEqual(SharedState(self.path).read(), {"hits": 3, "misses": 1})
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_concurrent_processes(self):
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=_add_counts, args=(self.path, 500)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(SharedState(self.path).read(), {"hits": 2000, "misses": 4000})
+
+
+class ResourceUsageTest(CompilerTestCase):
+    @unittest.skipUnless(hasattr(os, "wait4") and os.path.exists("/proc/self/status"), "needs wait4 and /proc")
+    def test_python_result_has_usage(self):
+        code = "data = bytearray(64 * 1024 * 1024)\nsum(range(10 ** 6))\nprint(len(data))"
+        result = self.compiler.compile_and_execute(code, "", "python", [])
+        self.assertEqual(result["output"], str(64 * 1024 * 1024) + "\n")
+        self.assertGreater(result["max_rss_kb"], 64 * 1024)
+        self.assertGreater(result["cpu_user_time"] + result["cpu_system_time"], 0)
+        self.assertGreaterEqual(result["run_time"], result["cpu_user_time"])
+        self.assertIn('run_time_seconds_count{language="python"} 1', self.compiler.metrics.render())
+
+    @unittest.skipUnless(hasattr(os, "wait4") and shutil.which("gcc"), "needs wait4 and gcc")
+    def test_timeout_has_usage(self):
+        self.compiler.EXECUTION_TIMEOUT = 1
+        result = self.compiler.compile_and_execute("int main() { for (;;); }", "", "c", [])
+        self.assertIsNone(result["exit_code"])
+        # How much CPU a niced program gets depends on the machine's load
+        self.assertGreater(result["cpu_user_time"], 0)
+        self.assertLessEqual(result["cpu_user_time"], result["run_time"] + 0.1)
+        self.assertIn("build_time", result)
+
+    def test_route(self):
+        response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+
+
+if __name__ == '__main__':
+    unittest.main()
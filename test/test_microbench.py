@@ -0,0 +1,75 @@
+import shutil
+import unittest
+
+from main import app
+from microbench import describe, parse_opt_levels, with_opt_level
+from test.helpers import CompilerTestCase
+
+LOOP_C = '#include <stdio.h>\nint main() { long s = 0; for (long i = 0; i < 1000000; i++) s += i % 7; printf("%ld\\n", s); }\n'
+
+
+class HelpersTest(unittest.TestCase):
+    def test_with_opt_level(self):
+        self.assertEqual(with_opt_level(["-Wall", "-O2", "-lm"], "c", "3"), ["-Wall", "-lm", "-O3"])
+        self.assertEqual(with_opt_level(["-O", "-C", "opt-level=1", "-Copt-level=2", "-g"], "rust", "s"),
+                         ["-g", "-C", "opt-level=s"])
+
+    def test_parse_opt_levels(self):
+        self.assertEqual(parse_opt_levels("O0, -O2,3,O3", "cpp"), ["0", "2", "3"])
+        self.assertIsNone(parse_opt_levels(" ", "c"))
+        with self.assertRaises(ValueError):
+            parse_opt_levels("fast", "rust")
+        with self.assertRaises(ValueError):
+            parse_opt_levels("O2", "python")
+
+    def test_describe(self):
+        self.assertEqual(describe([3.0, 1.0, 2.0]), {"min": 1.0, "median": 2.0, "mean": 2.0, "stddev": 1.0})
+        self.assertEqual(describe([1.5])["stddev"], 0.0)
+        self.assertIsNone(describe([]))
+
+
+class BenchmarkProgramTest(CompilerTestCase):
+    @unittest.skipUnless(shutil.which("gcc"), "gcc not installed")
+    def test_opt_level_comparison(self):
+        result = self.compiler.benchmark_program(LOOP_C, "", "c", ["-Wall"], runs=3, warmup=1, opt_levels=["0", "2"])
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["output"].strip(), "2999997")
+        benchmark = result["benchmark"]
+        self.assertTrue(benchmark["outputs_match"])
+        self.assertFalse(benchmark["time_limited"])
+        self.assertEqual([v["options"] for v in benchmark["variants"]], ["-Wall -O0", "-Wall -O2"])
+        self.assertEqual([v["runs"] for v in benchmark["variants"]], [3, 3])
+        self.assertEqual(benchmark["variants"][0]["speedup"], 1.0)
+        self.assertEqual(set(benchmark["variants"][1]["wall_time"]), {"min", "median", "mean", "stddev"})
+
+        # Builds of the same source and options come from the artifact cache
+        hits = self.compiler.artifact_cache.stats()["hits"]
+        self.compiler.benchmark_program(LOOP_C, "", "c", ["-Wall"], runs=1, warmup=0, opt_levels=["0", "2"])
+        self.assertEqual(self.compiler.artifact_cache.stats()["hits"], hits + 2)
+
+    def test_failing_program(self):
+        result = self.compiler.benchmark_program("raise SystemExit(2)", "", "python", [], runs=3)
+        self.assertFalse(result["success"])
+        variant = result["benchmark"]["variants"][0]
+        self.assertEqual((variant["runs"], variant["status"]), (0, "runtime_error"))
+
+    def test_time_limit(self):
+        self.compiler.BENCHMARK_TIME_LIMIT = 0
+        result = self.compiler.benchmark_program("print(1)", "", "python", [], runs=5)
+        self.assertTrue(result["benchmark"]["time_limited"])
+
+
+class BenchmarkRouteTest(unittest.TestCase):
+    def test_route(self):
+        client = app.test_client()
+        data = client.post('/compile', data={
+            'code': 'print(input())', 'input': 'hi', 'language': 'python', 'benchmark': '1', 'runs': '2', 'warmup': '0'
+        }).get_json()
+        self.assertEqual(data["output"].strip(), "hi")
+        self.assertEqual(data["benchmark"]["variants"][0]["runs"], 2)
+        data = client.post('/compile', data={'code': 'x', 'language': 'c', 'benchmark': '1', 'runs': 'many'}).get_json()
+        self.assertEqual(data["compile_error"], "runs must be a whole number")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import shutil
+import unittest
+
+from pch_cache import leading_system_includes, pch_relevant_options
+from test.helpers import CompilerTestCase
+
+
+class PchHelpersTest(unittest.TestCase):
+    def test_leading_system_includes(self):
+        source = "// solution\n#include <vector>\n\n#include <iostream> // io\n#include \"local.h\"\n#include <map>\n"
+        self.assertEqual(leading_system_includes(source), ["vector", "iostream"])
+        self.assertEqual(leading_system_includes("#define N 10\n#include <vector>\n"), [])
+
+    def test_pch_relevant_options(self):
+        self.assertEqual(
+            pch_relevant_options(["-O2", "-Wall", "-std=c++17", "-lm", "-DLOCAL", "-w"]),
+            ["-O2", "-std=c++17", "-DLOCAL"]
+        )
+
+
+@unittest.skipUnless(shutil.which("g++"), "g++ not installed")
+class PchCompileTest(CompilerTestCase):
+    CODE = "#include <vector>\n#include <cstdio>\nint main() { std::vector<int> v(%d); printf(\"%%zu\\n\", v.size()); }\n"
+
+    def test_uses_pch_once_built(self):
+        first = self.compiler.compile_and_execute(self.CODE % 1, "", "cpp", ["-O1"])
+        self.assertEqual(first["pch"]["used"], False)
+
+        compiler_path, version = self.compiler.artifact_cache.compiler_version("g++")
+        key = self.compiler.pch_cache.key("g++", version, ["-O1"], ["vector", "cstdio"])
+        self.assertTrue(self.compiler.pch_cache.build("g++", ["-O1"], ["vector", "cstdio"], key))
+
+        second = self.compiler.compile_and_execute(self.CODE % 2, "", "cpp", ["-O1", "-Wall"])
+        self.assertEqual(second["output"], "2\n")
+        self.assertEqual(second["pch"]["used"], True)
+        self.assertIsNotNone(second["pch"]["saved_time"])
+
+        # Different code generation flags must not pick up the PCH
+        third = self.compiler.compile_and_execute(self.CODE % 3, "", "cpp", ["-O0"])
+        self.assertEqual(third["output"], "3\n")
+        self.assertEqual(third["pch"]["used"], False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import shutil
+import unittest
+
+from main import app
+from profiler import parse_gprof
+from test.helpers import CompilerTestCase
+
+GPROF_OUTPUT = """Flat profile:
+
+Each sample counts as 0.01 seconds.
+  %   cumulative   self              self     total
+ time   seconds   seconds    calls  ms/call  ms/call  name
+ 75.00      0.03     0.03        2    15.00    20.00  fib(int)
+ 25.00      0.04     0.01                             frame_dummy
+  0.00      0.04     0.00       30     0.00     0.00  std::vector<long, std::allocator<long> >::push_back(long&&)
+"""
+
+FIB_C = '#include <stdio.h>\nlong fib(int n) { return n < 2 ? n : fib(n - 1) + fib(n - 2); }\nint main() { printf("%ld\\n", fib(25)); }\n'
+FIB_PY = "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n\nprint(fib(15))\n"
+
+
+class ParseGprofTest(unittest.TestCase):
+    def test_flat_profile(self):
+        profile = parse_gprof(GPROF_OUTPUT)
+        self.assertEqual(profile["sample_period"], 0.01)
+        self.assertEqual([f["name"] for f in profile["functions"]],
+                         ["fib(int)", "frame_dummy", "std::vector<long, std::allocator<long> >::push_back(long&&)"])
+        self.assertEqual(profile["functions"][0]["calls"], 2)
+        self.assertAlmostEqual(profile["functions"][0]["total_time"], 0.04)
+        self.assertIsNone(profile["functions"][1]["calls"])
+        self.assertEqual(parse_gprof(GPROF_OUTPUT, top=1)["functions"][0]["percent"], 75.0)
+
+
+class ProfileModeTest(CompilerTestCase):
+    def test_python(self):
+        result = self.compiler.compile_and_execute(FIB_PY, "", "python", [], profile=True)
+        self.assertEqual(result["output"].strip(), "610")
+        functions = {f["name"]: f for f in result["profile"]["functions"]}
+        self.assertEqual(functions["fib"]["calls"], 1973)
+        self.assertEqual(functions["fib"]["location"], "main.py:1")
+        # Profiled runs are never served from the result cache
+        self.assertNotIn("cached", self.compiler.compile_and_execute(FIB_PY, "", "python", [], profile=True))
+
+    @unittest.skipUnless(shutil.which("gcc") and shutil.which("gprof"), "needs gcc and gprof")
+    def test_c(self):
+        result = self.compiler.compile_and_execute(FIB_C, "", "c", ["-O0"], profile=True)
+        self.assertEqual(result["output"].strip(), "75025")
+        self.assertEqual(result["profile"]["tool"], "gprof")
+        self.assertIn("fib", [f["name"] for f in result["profile"]["functions"]])
+        self.assertNotIn("profile", self.compiler.compile_and_execute(FIB_C, "", "c", ["-O0"]))
+
+    @unittest.skipUnless(shutil.which("gcc") and shutil.which("gprof"), "needs gcc and gprof")
+    def test_abnormal_exit(self):
+        code = '#include <stdlib.h>\nint main() { abort(); }\n'
+        result = self.compiler.compile_and_execute(code, "", "c", [], profile=True)
+        self.assertEqual(result["profile"]["functions"], [])
+        self.assertIn("exit normally", result["profile"]["error"])
+
+    def test_stream_route(self):
+        response = app.test_client().post('/compile/stream', data={
+            'code': FIB_PY, 'language': 'python', 'profile': '1'
+        })
+        body = response.get_data(as_text=True)
+        self.assertIn('"tool": "cProfile"', body.split("event: exit")[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+import main
+from main import CodeCompiler
+from project import parse_files, project_files
+from test.helpers import CompilerTestCase
+from workspace import WorkspacePool
+
+MAIN = '#include <stdio.h>\n#include "util/add.h"\nint main() { int a, b; scanf("%d %d", &a, &b); printf("%d\\n", add(a, b)); }\n'
+ADD_H = 'int add(int a, int b);\n'
+ADD_C = '#include "add.h"\nint add(int a, int b) { return a + b; }\n'
+
+
+class ProjectFilesTest(unittest.TestCase):
+    def test_validation(self):
+        files = project_files(MAIN, {"util/add.h": ADD_H, "util/add.c": ADD_C}, "c", "main.c")
+        self.assertEqual(sorted(files), ["main.c", "util/add.c", "util/add.h"])
+        for name in ("../x.c", "/etc/x.c", "a//b.c", ".hidden.c", "main.exe"):
+            with self.assertRaises(ValueError):
+                project_files(MAIN, {name: ADD_C}, "c", "main.c")
+        with self.assertRaises(ValueError):
+            project_files("", {"add.h": ADD_H}, "c", "main.c")
+        with self.assertRaises(ValueError):
+            project_files(MAIN, {"add.c": ADD_C}, "python", "main.py")
+
+    def test_parse_files(self):
+        self.assertIsNone(parse_files(""))
+        self.assertEqual(parse_files('{"a.c": "int x;"}'), {"a.c": "int x;"})
+        for value in ("[1]", '{"a.c": 1}', "{"):
+            with self.assertRaises(ValueError):
+                parse_files(value)
+
+
+class ProjectBuildTest(CompilerTestCase):
+    def test_build_and_run(self):
+        result = self.compiler.compile_and_execute(
+            MAIN, "2 3", "c", [], files={"util/add.h": ADD_H, "util/add.c": ADD_C})
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["output"].strip(), "5")
+        self.assertEqual(result["objects"], {"total": 2, "reused": 0})
+
+    def test_unchanged_objects_are_reused(self):
+        files = {"util/add.h": ADD_H, "util/add.c": ADD_C}
+        self.compiler.compile_and_execute(MAIN, "2 3", "c", [], files=files)
+        # Only main.c changes, so util/add.c comes from the object cache
+        result = self.compiler.compile_and_execute(MAIN.replace("%d\\n", "sum %d\\n"), "2 3", "c", [], files=files)
+        self.assertEqual(result["output"].strip(), "sum 5")
+        self.assertEqual(result["objects"], {"total": 2, "reused": 1})
+
+    def test_debug_objects_are_reused_across_workspaces(self):
+        files = {"util/add.h": ADD_H, "util/add.c": ADD_C}
+        self.compiler.compile_and_execute(MAIN, "2 3", "c", ["-g"], files=files)
+        other = CodeCompiler(cache_dir=self.cache_dir)
+        other.workspaces = WorkspacePool(os.path.join(self.cache_dir, "other-workspaces"))
+        result = other.compile_and_execute(MAIN.replace("%d\\n", "sum %d\\n"), "2 3", "c", ["-g"], files=files)
+        self.assertEqual(result["output"].strip(), "sum 5")
+        self.assertEqual(result["objects"], {"total": 2, "reused": 1})
+
+    def test_link_options_follow_objects(self):
+        code = '#include "sq.h"\n#include <stdio.h>\nint main() { printf("%.1f\\n", root(16.0)); }\n'
+        files = {
+            "sq.h": "double root(double x);\n",
+            "sq.c": '#include <math.h>\n#include "sq.h"\ndouble root(double x) { return sqrt(x); }\n'
+        }
+        result = self.compiler.compile_and_execute(code, "", "c", ["-O0", "-lm"], files=files)
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["output"].strip(), "4.0")
+
+    def test_compile_error(self):
+        result = self.compiler.compile_and_execute(
+            MAIN, "", "cpp", [], files={"util/add.h": ADD_H, "util/add.cpp": "int add(int a, int b) { return a + ; }\n"})
+        self.assertFalse(result["success"])
+        self.assertIn("util/add.cpp", result["compile_error"])
+
+
+class ProjectRouteTest(CompilerTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(main, "compiler", self.compiler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = main.app.test_client()
+
+    def test_compile_route(self):
+        response = self.client.post('/compile', data={
+            'code': MAIN, 'input': '4 5', 'language': 'c',
+            'files': json.dumps({"util/add.h": ADD_H, "util/add.c": ADD_C})
+        })
+        data = response.get_json()
+        self.assertTrue(data["success"], data)
+        self.assertEqual(data["output"].strip(), "9")
+
+    def test_unsupported_language(self):
+        response = self.client.post('/compile', data={
+            'code': 'print(1)', 'language': 'python', 'files': json.dumps({"util.py": "x = 1"})
+        })
+        self.assertEqual(response.get_json()["compile_error"], "Multi-file projects are supported for C and C++")
+
+    def test_invalid_files(self):
+        response = self.client.post('/compile', data={'code': MAIN, 'language': 'c', 'files': '["add.c"]'})
+        self.assertIn("files must be", response.get_json()["compile_error"])
+
+
+if __name__ == '__main__':
+    unittest.main()
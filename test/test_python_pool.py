@@ -0,0 +1,96 @@
+import os
+import re
+import time
+import unittest
+from unittest import mock
+
+import main
+from main import CodeCompiler
+from python_pool import PythonPool
+from test.helpers import CompilerTestCase
+
+
+class PythonPoolTest(CompilerTestCase):
+    PROGRAMS = [
+        ("print(input()[::-1])", "abc\n"),
+        ("import sys\nprint(sys.stdin.readline().strip(), open(0).read().split())", "first\n2 3\n"),
+        ("import os, sys\nprint(__name__, os.path.basename(sys.argv[0]), os.path.basename(__file__))", ""),
+        ("import sys\nprint('bye')\nsys.exit(3)", ""),
+        ("def f():\n    return 1 / 0\nf()", ""),
+        ("print('unclosed'", ""),
+    ]
+
+    def _pooled_compiler(self):
+        compiler = CodeCompiler(cache_dir=self.cache_dir)
+        compiler.python_pool = PythonPool(1)
+        compiler.python_pool.start()
+        self.addCleanup(compiler.python_pool.close)
+        return compiler
+
+    def _wait_for_worker(self, pool):
+        deadline = time.time() + 10
+        while pool._idle.empty():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def test_pooled_runs_match_fresh_interpreter(self):
+        pooled = self._pooled_compiler()
+        for code, user_input in self.PROGRAMS:
+            with self.subTest(code=code):
+                self._wait_for_worker(pooled.python_pool)
+                expected = self.compiler.compile_and_execute(code, user_input, "python", [])
+                actual = pooled.compile_and_execute(code, user_input, "python", [])
+                self.assertEqual(actual["success"], expected["success"])
+                self.assertEqual(actual["output"], expected["output"])
+                # Tracebacks name the per-request temp dir, so compare file names only
+                self.assertEqual(_strip_paths(actual["runtime_error"]), _strip_paths(expected["runtime_error"]))
+        self.assertEqual(pooled.python_pool.hits, len(self.PROGRAMS))
+
+    def test_streaming_and_judge_use_workers(self):
+        pooled = self._pooled_compiler()
+        self._wait_for_worker(pooled.python_pool)
+        events = list(pooled.stream_compile_and_execute("print(input() * 2)", "ab\n", "python", []))
+        self.assertEqual("".join(data for event, data in events if event == "stdout"), "abab\n")
+        self.assertEqual(pooled.python_pool.hits, 1)
+
+        self._wait_for_worker(pooled.python_pool)
+        result = pooled.judge("print(input() * 2)", "python", [], [{"input": "x", "expected": "xx"}])
+        self.assertEqual(result["cases"][0]["verdict"], "accepted")
+        self.assertEqual(pooled.python_pool.hits, 2)
+
+    def test_stats_route(self):
+        pooled = self._pooled_compiler()
+        self._wait_for_worker(pooled.python_pool)
+        pooled.compile_and_execute("print(1)", "", "python", [])
+        pooled.compile_and_execute("print(2)", "", "python", [])
+        with mock.patch.object(main, "compiler", pooled):
+            stats = main.app.test_client().get('/cache/stats').get_json()["python_pool"]
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["hits"] + stats["misses"], 2)
+        self.assertGreaterEqual(stats["hits"], 1)
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc")
+    def test_failed_start_closes_pipe(self):
+        pool = PythonPool(1, interpreter=os.path.join(self.cache_dir, "missing-python"))
+        pool._starting = 1
+        before = len(os.listdir("/proc/self/fd"))
+        with self.assertRaises(OSError):
+            pool._spawn()
+        self.assertEqual(len(os.listdir("/proc/self/fd")), before)
+        self.assertEqual(pool._starting, 0)
+
+    def test_timeout(self):
+        pooled = self._pooled_compiler()
+        pooled.EXECUTION_TIMEOUT = 1
+        self._wait_for_worker(pooled.python_pool)
+        result = pooled.compile_and_execute("while True: pass", "", "python", [])
+        self.assertFalse(result["success"])
+        self.assertIn("timed out", result["runtime_error"])
+
+
+def _strip_paths(text):
+    return re.sub(r'File ".*[/\\\\]', 'File "', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
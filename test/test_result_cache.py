@@ -0,0 +1,180 @@
+import threading
+import time
+import unittest
+
+from result_cache import ResultCache, is_deterministic
+from test.helpers import CompilerTestCase
+
+
+class ResultCacheTest(unittest.TestCase):
+    def test_hit_and_expiry(self):
+        cache = ResultCache(ttl=0.2)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"output": "42"}
+
+        self.assertEqual(cache.get_or_compute("k", compute), {"output": "42"})
+        self.assertEqual(cache.get_or_compute("k", compute), {"output": "42", "cached": True})
+        time.sleep(0.3)
+        self.assertEqual(cache.get_or_compute("k", compute), {"output": "42"})
+        self.assertEqual(len(calls), 2)
+
+    def test_uncacheable_results(self):
+        cache = ResultCache()
+        cache.get_or_compute("k", lambda: {"output": ""}, cacheable=lambda result: False)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_memory_bound(self):
+        cache = ResultCache(max_bytes=3000)
+        for key in "abcd":
+            cache.get_or_compute(key, lambda: {"output": "x" * 500})
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], 3000)
+        self.assertGreater(stats["evictions"], 0)
+        # Least recently used entries go first
+        self.assertTrue(cache.get_or_compute("d", dict).get("cached"))
+        self.assertFalse(cache.get_or_compute("a", dict).get("cached"))
+
+    def test_coalescing(self):
+        cache = ResultCache()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {"output": "done"}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        deadline = time.time() + 5
+        while cache.stats()["coalesced"] < 3:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(result.get("cached", False) for result in results), [False, True, True, True])
+
+    def test_failed_leader(self):
+        cache = ResultCache()
+        started = threading.Event()
+        release = threading.Event()
+
+        def explode():
+            started.set()
+            release.wait(5)
+            raise RuntimeError("boom")
+
+        leader = threading.Thread(target=lambda: self.assertRaises(RuntimeError, cache.get_or_compute, "k", explode))
+        leader.start()
+        started.wait(5)
+        results = []
+        follower = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", lambda: {"output": "ok"})))
+        follower.start()
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(results, [{"output": "ok"}])
+
+    def test_is_deterministic(self):
+        self.assertTrue(is_deterministic("python", "print(sum(map(int, input().split())))"))
+        self.assertFalse(is_deterministic("python", "import random\nprint(random.random())"))
+        self.assertFalse(is_deterministic("c", "int main() { srand(time(0)); return rand(); }"))
+        self.assertFalse(is_deterministic("rust", "use std::collections::HashMap;"))
+        self.assertFalse(is_deterministic("cobol", "DISPLAY 'HI'"))
+        # Printed addresses change with ASLR on every run
+        for language, code in [
+            ("c", 'int main() { int x; printf("%p\\n", (void *) &x); }'),
+            ("c", 'int main() { int x; printf("%#18p\\n", &x); }'),
+            ("cpp", "int main() { int x; std::cout << &x; }"),
+            ("cpp", "struct A { void show() { std::cout << this; } };"),
+            ("cpp", "int main() { int x; std::cout << static_cast<void *>(&x); }"),
+            ("python", "print(hex(id(object())))"),
+            ("rust", 'fn main() { let x = 1; println!("{:p}", &x); }'),
+            ("rust", 'fn main() { let v = vec![1]; println!("{:?}", v.as_ptr()); }'),
+        ]:
+            self.assertFalse(is_deterministic(language, code), code)
+        # Default object reprs hold an address, and workspace paths differ per request
+        for code in [
+            "print(object())",
+            "class A: pass\nprint(A())",
+            "class A:\n    def __eq__(self, other):\n        return True\nprint([A()])",
+            "import sys\nprint(sys.argv[0])",
+            "print(__file__)",
+            "print(f'{id(1)}')",
+        ]:
+            self.assertFalse(is_deterministic("python", code), code)
+        # Words in strings and comments do not count, nor classes with their own repr
+        for code in [
+            'print("set up")',
+            "print('time: %d' % 5)  # no time() here",
+            "print('''id\nset''')",
+            "class A:\n    def __repr__(self):\n        return 'A'\nprint(A())",
+            "from dataclasses import dataclass\n@dataclass\nclass P:\n    x: int\nprint(P(1))",
+        ]:
+            self.assertTrue(is_deterministic("python", code), code)
+        self.assertTrue(is_deterministic("cpp", "int main() { int x; std::cin >> x; std::cout << x * 2; }"))
+        self.assertTrue(is_deterministic("c", 'int main() { printf("%d%%\\n", 5); }'))
+        self.assertTrue(is_deterministic("rust", 'fn main() { println!("{:>5}", 1); }'))
+
+
+class CompilerResultCacheTest(CompilerTestCase):
+    def test_repeated_submission(self):
+        first = self.compiler.compile_and_execute("print(input())", "hi", "python", [])
+        second = self.compiler.compile_and_execute("print(input())", "hi", "python", [])
+        other_input = self.compiler.compile_and_execute("print(input())", "bye", "python", [])
+        self.assertNotIn("cached", first)
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["output"], first["output"])
+        self.assertEqual(other_input["output"].strip(), "bye")
+
+    def test_streamed_runs(self):
+        stream = self.compiler.stream_compile_and_execute
+        first = list(stream("print(input())", "hi", "python", []))
+        second = list(stream("print(input())", "hi", "python", []))
+        self.assertEqual(second[:-1], first[:-1])
+        self.assertNotIn("cached", first[-1][1])
+        self.assertTrue(second[-1][1]["cached"])
+        # Separate from the results of /compile
+        self.assertNotIn("cached", self.compiler.compile_and_execute("print(input())", "hi", "python", []))
+
+    def test_streamed_runs_coalesce(self):
+        code = "print(sum(range(10 ** 6)))"
+        leader = self.compiler.stream_compile_and_execute(code, "", "python", [])
+        self.assertEqual(next(leader)[0], "compile")
+        followers = []
+        thread = threading.Thread(
+            target=lambda: followers.append(list(self.compiler.stream_compile_and_execute(code, "", "python", [])))
+        )
+        thread.start()
+        deadline = time.time() + 5
+        while self.compiler.result_cache.stats()["coalesced"] < 1:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        rest = list(leader)
+        thread.join(5)
+        self.assertEqual(followers[0][-1][1]["cached"], True)
+        self.assertEqual("".join(data for event, data in followers[0] if event == "stdout"), "499999500000\n")
+        self.assertNotIn("cached", rest[-1][1])
+
+    def test_abandoned_stream_is_not_kept(self):
+        leader = self.compiler.stream_compile_and_execute("print(1)", "", "python", [])
+        next(leader)
+        leader.close()
+        self.assertNotIn("cached", list(self.compiler.stream_compile_and_execute("print(1)", "", "python", []))[-1][1])
+
+    def test_nondeterministic_program(self):
+        code = "import random\nprint(random.random())"
+        self.compiler.compile_and_execute(code, "", "python", [])
+        self.assertNotIn("cached", self.compiler.compile_and_execute(code, "", "python", []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+
+from runner import capture_process, stream_process
+
+
+class StreamProcessTest(unittest.TestCase):
+    def _collect(self, events):
+        output = {"stdout": "", "stderr": ""}
+        exit_info = None
+        for name, data in events:
+            if name == "exit":
+                exit_info = data
+            else:
+                output[name] += data
+        return output, exit_info
+
+    def test_streams_output_and_exit_status(self):
+        code = "import sys; print(input()); print('oops', file=sys.stderr); sys.exit(3)"
+        output, exit_info = self._collect(stream_process([sys.executable, "-c", code], "hello\n", timeout=10))
+        self.assertEqual(output, {"stdout": "hello\n", "stderr": "oops\n"})
+        self.assertEqual(exit_info["returncode"], 3)
+        self.assertFalse(exit_info["timed_out"])
+        self.assertIn("max_rss_kb", exit_info)
+
+    @unittest.skipUnless(os.path.exists("/proc/self/status"), "needs /proc")
+    def test_peak_memory_is_the_programs(self):
+        # The memory of the process starting the program must not show up in its figure
+        ballast = b"x" * (200 << 20)
+        code = "import time; data = b'x' * (50 << 20); time.sleep(0.2)"
+        output, exit_info = self._collect(stream_process([sys.executable, "-c", code], timeout=10))
+        self.assertGreater(exit_info["max_rss_kb"], 50 * 1024)
+        self.assertLess(exit_info["max_rss_kb"], 150 * 1024)
+        del ballast
+
+    def test_timeout_kills_process(self):
+        code = "import time; print('started', flush=True); time.sleep(30)"
+        output, exit_info = self._collect(stream_process([sys.executable, "-c", code], timeout=1))
+        self.assertEqual(output["stdout"], "started\n")
+        self.assertTrue(exit_info["timed_out"])
+        self.assertLess(exit_info["run_time"], 10)
+
+    def test_first_chunk_arrives_before_exit(self):
+        code = "import time; print('early', flush=True); time.sleep(30)"
+        events = stream_process([sys.executable, "-c", code], timeout=20)
+        received = ""
+        while received != "early\n":
+            name, data = next(events)
+            self.assertEqual(name, "stdout")
+            received += data
+        events.close()
+
+
+class CaptureProcessTest(unittest.TestCase):
+    FLOOD = "import sys\nwhile True: sys.stdout.write('x' * 1000 + '\\n')"
+
+    def test_output_limit_kills(self):
+        info = capture_process([sys.executable, "-c", self.FLOOD], timeout=10, output_limit=10000)
+        self.assertTrue(info["truncated"])
+        self.assertFalse(info["timed_out"])
+        self.assertEqual(len(info["stdout"]), 10000)
+        self.assertLess(info["run_time"], 5)
+
+    def test_output_limit_drains(self):
+        code = "import sys\nfor _ in range(1000): print('y' * 1000)\nprint('done', file=sys.stderr)\nsys.exit(2)"
+        info = capture_process([sys.executable, "-c", code], timeout=10, output_limit=5000, kill_on_limit=False)
+        self.assertTrue(info["truncated"])
+        self.assertEqual(info["returncode"], 2)
+        self.assertEqual(len(info["stdout"]), 5000)
+        self.assertEqual(info["stderr"], "")
+
+    def test_text_mode_parity(self):
+        code = "import sys; sys.stdout.buffer.write('caf\\u00e9\\r\\nx\\r'.encode()); print(input())"
+        info = capture_process([sys.executable, "-c", code], "in\n", timeout=10, output_limit=100)
+        self.assertEqual(info["stdout"], "caf\u00e9\nx\nin\n")
+        self.assertFalse(info["truncated"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import http.client
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from serve import ServerThread, Worker, healthy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def slow_app(environ, start_response):
+    delay = float(environ.get("QUERY_STRING") or 0)
+    time.sleep(delay)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+class WorkerTest(unittest.TestCase):
+    def _start(self, **kwargs):
+        worker = Worker(slow_app, "127.0.0.1", 0, **kwargs)
+        result = {}
+        thread = threading.Thread(target=lambda: result.setdefault("drained", worker.serve()))
+        thread.start()
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(worker.stop)
+        return worker, thread, result
+
+    def _get(self, worker, path="/"):
+        connection = http.client.HTTPConnection("127.0.0.1", worker.port, timeout=10)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def test_stop_waits_for_running_requests(self):
+        worker, thread, result = self._start()
+        responses = []
+        client = threading.Thread(target=lambda: responses.append(self._get(worker, "/?0.5")))
+        client.start()
+        deadline = time.time() + 5
+        while not worker.tracker.active:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        worker.stop()
+        client.join(10)
+        thread.join(10)
+        self.assertEqual(responses, [(200, b"ok")])
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(result["drained"])
+
+    def test_max_requests(self):
+        worker, thread, result = self._start(max_requests=2)
+        self.assertEqual(self._get(worker), (200, b"ok"))
+        self.assertEqual(self._get(worker), (200, b"ok"))
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+    def test_on_drain(self):
+        calls = []
+
+        def on_drain(timeout):
+            calls.append(timeout)
+            return False
+
+        worker, thread, result = self._start(graceful_timeout=5, on_drain=on_drain)
+        worker.stop()
+        thread.join(10)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(0 < calls[0] <= 5)
+        self.assertFalse(result["drained"])
+
+
+class ServerThreadTest(unittest.TestCase):
+    def test_health_and_first_page(self):
+        from main import app
+
+        first_page = []
+        server = ServerThread("127.0.0.1", 0, app=app, on_first_page=first_page.append)
+        server.start()
+        self.addCleanup(server.join, 10)
+        self.addCleanup(server.stop)
+        deadline = time.time() + 10
+        while server.worker is None:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+        self.assertTrue(healthy("127.0.0.1", server.port))
+        self.assertEqual(first_page, [])
+        connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+        connection.request("GET", "/")
+        self.assertEqual(connection.getresponse().status, 200)
+        connection.close()
+        self.assertEqual(len(first_page), 1)
+
+        server.stop()
+        server.join(10)
+        self.assertFalse(server.is_alive())
+        self.assertFalse(healthy("127.0.0.1", server.port))
+
+    def test_port_in_use(self):
+        worker = Worker(slow_app, "127.0.0.1", 0)
+        self.addCleanup(worker.server.server_close)
+        server = ServerThread("127.0.0.1", worker.port, app=slow_app)
+        with mock.patch("sys.stderr"):
+            server.start()
+            server.join(10)
+        self.assertIn("Could not listen", server.error)
+        # Something else is listening, but it is not this service
+        self.assertFalse(healthy("127.0.0.1", worker.port, timeout=0.2))
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+class PreforkTest(unittest.TestCase):
+    def test_serve_and_terminate(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        env = dict(os.environ, OFFLINE_COMPILER_CACHE_DIR=cache_dir)
+        process = subprocess.Popen(
+            [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", "0", "--workers", "2"],
+            cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        self.addCleanup(process.kill)
+        port = int(re.search(r":(\d+)", process.stdout.readline()).group(1))
+
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        connection.request("POST", "/compile", "code=print(6*7)&language=python",
+                           {"Content-Type": "application/x-www-form-urlencoded"})
+        response = connection.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertIn(b"42", response.read())
+        connection.close()
+
+        process.send_signal(signal.SIGTERM)
+        self.assertEqual(process.wait(20), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from cargo_cache import file_lock
+from main import CodeCompiler, app
+from sessions import SessionWorkspaces
+
+TOKEN = "0123456789abcdef0123456789abcdef"
+
+
+class SessionWorkspacesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_valid_token(self):
+        self.assertTrue(SessionWorkspaces.valid_token(TOKEN))
+        for token in ["", "short", "../" + TOKEN, TOKEN + "/x", "x" * 200, None]:
+            self.assertFalse(SessionWorkspaces.valid_token(token))
+
+    def test_lease_persists_until_quota(self):
+        sessions = SessionWorkspaces(self.dir, quota_bytes=1000)
+        with sessions.lease(TOKEN) as path:
+            with open(os.path.join(path, "state"), "w") as f:
+                f.write("x" * 10)
+        with sessions.lease(TOKEN) as same:
+            self.assertEqual(same, path)
+            self.assertEqual(os.listdir(path), ["state"])
+            with open(os.path.join(path, "big"), "w") as f:
+                f.write("x" * 2000)
+        self.assertFalse(os.path.exists(path))
+        with self.assertRaises(ValueError):
+            with sessions.lease("bad token"):
+                pass
+
+    def test_sweep_removes_idle_sessions(self):
+        sessions = SessionWorkspaces(self.dir, idle_timeout=60)
+        other = TOKEN[::-1]
+        with sessions.lease(TOKEN) as idle_path, sessions.lease(other) as active_path:
+            pass
+        os.utime(idle_path, (time.time() - 120, time.time() - 120))
+        sessions.sweep()
+        self.assertFalse(os.path.exists(idle_path))
+        self.assertTrue(os.path.exists(active_path))
+        self.assertEqual(list(sessions._locks), [other])
+
+    def test_lock_follows_a_replaced_lock_file(self):
+        sessions = SessionWorkspaces(self.dir)
+        lock_path = os.path.join(self.dir, f"{TOKEN}.lock")
+        entered = threading.Event()
+
+        def use_session():
+            with sessions._locked(TOKEN):
+                entered.set()
+
+        # Another process holds the lock while it removes the file, as sweep() does,
+        # and a third one locks the file created after that
+        with file_lock(lock_path):
+            thread = threading.Thread(target=use_session)
+            thread.start()
+            time.sleep(0.1)
+            os.remove(lock_path)
+            new_lock = file_lock(lock_path)
+            new_lock.__enter__()
+        try:
+            self.assertFalse(entered.wait(0.2))
+        finally:
+            new_lock.__exit__(None, None, None)
+        self.assertTrue(entered.wait(5))
+        thread.join()
+
+    def test_route_rejects_invalid_token(self):
+        response = app.test_client().post('/compile', data={
+            "code": "fn main() {}", "language": "rust", "session": "../../etc"
+        })
+        self.assertEqual(response.get_json()["compile_error"], "Invalid session token")
+
+
+@unittest.skipUnless(shutil.which("rustc"), "rustc not installed")
+class IncrementalRustTest(unittest.TestCase):
+    CODE = "fn value() -> i32 { %d }\nfn main() { println!(\"{}\", value()); }\n"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.compiler = CodeCompiler(cache_dir=os.path.join(self.dir, "cache"))
+
+    def test_session_keeps_incremental_state(self):
+        for value in (1, 2, 1):
+            result = self.compiler.compile_and_execute(self.CODE % value, "", "rust", [], session=TOKEN)
+            self.assertEqual(result["output"], f"{value}\n")
+        session_dir = os.path.join(self.compiler.sessions.root, TOKEN)
+        self.assertTrue(os.listdir(os.path.join(session_dir, "incremental")))
+
+        # Without a session the build happens in a throwaway workspace
+        result = self.compiler.compile_and_execute(self.CODE % 3, "", "rust", [])
+        self.assertEqual(result["output"], "3\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+from main import app
+from tracing import NO_SPAN, Tracer
+
+
+class TracerTest(unittest.TestCase):
+    def test_disabled(self):
+        tracer = Tracer(enabled=False)
+        self.assertIs(tracer.request("compile"), NO_SPAN)
+        self.assertIs(tracer.span("run"), NO_SPAN)
+        self.assertEqual(tracer.slowest(), [])
+
+    def test_spans_outside_a_request(self):
+        self.assertIs(Tracer(enabled=True).span("run"), NO_SPAN)
+
+    def test_nested_spans_are_logged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "trace.log")
+            tracer = Tracer(enabled=True, log_path=log_path)
+            with tracer.request("compile", "abc-1", language="c") as scope:
+                with tracer.span("compile"):
+                    with tracer.span("run") as span:
+                        span.set(status="ok")
+                tracer.annotate(cached=False)
+            self.assertEqual(scope.request_id, "abc-1")
+            with open(log_path) as f:
+                lines = [json.loads(line) for line in f]
+
+        self.assertEqual([(line["span"], line["depth"]) for line in lines], [("compile", 0), ("compile", 1), ("run", 2)])
+        self.assertEqual({line["request_id"] for line in lines}, {"abc-1"})
+        self.assertEqual(lines[0]["attrs"], {"language": "c", "cached": False})
+        self.assertEqual(lines[2]["attrs"], {"status": "ok"})
+
+    def test_bad_request_id_is_replaced(self):
+        tracer = Tracer(enabled=True)
+        with tracer.request("compile", "no spaces\nplease") as scope:
+            pass
+        self.assertRegex(scope.request_id, r'^[0-9a-f]{32}$')
+
+    def test_error_phase(self):
+        tracer = Tracer(enabled=True)
+        with tracer.request("compile", "r1"):
+            try:
+                with tracer.span("compile"), tracer.span("link"):
+                    raise OSError("disk full")
+            except OSError as e:
+                info = tracer.error_info(e)
+        self.assertEqual(info, {"type": "OSError", "message": "disk full", "phase": "link", "request_id": "r1"})
+        record = tracer.slowest()[0]
+        self.assertEqual(record["error"], "OSError")
+        self.assertEqual([span.get("error") for span in record["spans"]], [None, "OSError", "OSError"])
+
+    def test_slowest(self):
+        tracer = Tracer(enabled=True, keep=2)
+        # Trace start, root span start and end for each request
+        clock = iter([0.0, 0.0, 1.0, 10.0, 10.0, 13.0, 20.0, 20.0, 22.0])
+        with mock.patch("tracing.time.perf_counter", lambda: next(clock)):
+            for request_id in ("a", "b", "c"):
+                with tracer.request("compile", request_id):
+                    pass
+        self.assertEqual([record["request_id"] for record in tracer.slowest()], ["b", "c"])
+        self.assertEqual(tracer.slowest(limit=1)[0]["duration_ms"], 3000.0)
+
+    def test_slowest_reads_the_shared_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "trace.log")
+            # Two worker processes writing to one log
+            for worker, request_id in ((101, "a"), (102, "b")):
+                with mock.patch("tracing.os.getpid", return_value=worker):
+                    tracer = Tracer(enabled=True, log_path=log_path)
+                    with tracer.request("compile", request_id, language="c"):
+                        with tracer.span("run"):
+                            pass
+                        if request_id == "b":
+                            tracer.error_info(OSError("disk full"))
+            with open(log_path, "a") as f:
+                f.write('{"truncated\n')
+            records = Tracer(enabled=True, log_path=log_path).slowest()
+
+        self.assertEqual({record["request_id"]: record["worker"] for record in records}, {"a": 101, "b": 102})
+        record = next(record for record in records if record["request_id"] == "b")
+        self.assertEqual(record["error"], "OSError")
+        self.assertEqual(record["attrs"], {"language": "c"})
+        self.assertEqual([span["span"] for span in record["spans"]], ["compile", "run"])
+        self.assertNotIn("request_id", record["spans"][0])
+
+
+class TracingRouteTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(main, "tracer", Tracer(enabled=True))
+        self.tracer = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Spans in other modules report to the tracer they imported
+        for module in ("runner", "workspace"):
+            patcher = mock.patch(f"{module}.tracer", self.tracer)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_compile_is_traced(self):
+        client = app.test_client()
+        response = client.post('/compile', data={'code': 'print("traced")', 'language': 'python'},
+                               headers={'X-Request-ID': 'req-42'})
+        self.assertEqual(response.headers['X-Request-ID'], 'req-42')
+
+        requests = client.get('/debug/slow').get_json()["requests"]
+        self.assertEqual(requests[0]["request_id"], "req-42")
+        spans = [span["span"] for span in requests[0]["spans"]]
+        self.assertEqual(spans[0], "compile")
+        self.assertIn("write_source", spans)
+        self.assertIn("run", spans)
+
+    def test_debug_slow_is_local(self):
+        client = app.test_client()
+        response = client.get('/debug/slow', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        self.assertEqual(response.status_code, 403)
+        self.tracer.enabled = False
+        self.assertEqual(client.get('/debug/slow').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from workspace import WorkspacePool
+
+
+class WorkspacePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def _wait_until(self, condition):
+        deadline = time.time() + 10
+        while not condition():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def test_lease_gives_empty_dirs_and_cleans_up(self):
+        pool = WorkspacePool(self.root, size=2)
+        with pool.lease() as path:
+            self.assertEqual(os.listdir(path), [])
+            os.makedirs(os.path.join(path, "sub", "dir"))
+            with open(os.path.join(path, "sub", "file"), "w") as f:
+                f.write("data")
+        self.assertFalse(os.path.exists(path))
+
+        with pool.lease() as first, pool.lease() as second, pool.lease() as third:
+            self.assertEqual(len({first, second, third}), 3)
+            for path in (first, second, third):
+                self.assertEqual(os.listdir(path), [])
+
+        trash = os.path.join(pool._dir, "trash")
+        self._wait_until(lambda: not os.listdir(trash))
+
+    def test_reclaims_pools_of_dead_processes(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        stale = os.path.join(self.root, f"pool-{process.pid}-0a1b2c3d", "ws-0")
+        os.makedirs(stale)
+        alive = os.path.join(self.root, f"pool-{os.getppid()}-0a1b2c3d", "ws-0")
+        os.makedirs(alive)
+
+        with WorkspacePool(self.root, size=1).lease(), WorkspacePool(self.root, size=1).lease() as path:
+            self.assertEqual(os.listdir(path), [])
+        self.assertFalse(os.path.exists(os.path.dirname(stale)))
+        self.assertTrue(os.path.exists(alive))
+
+
+if __name__ == '__main__':
+    unittest.main()
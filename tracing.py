@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+
+# Request IDs accepted from clients in X-Request-ID
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+class _NoSpan:
+    """Stand-in returned when nothing is being traced; costs one attribute lookup"""
+
+    __slots__ = ()
+
+    request_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Span:
+    """One timed phase of a traced request"""
+
+    __slots__ = ("trace", "name", "attrs", "depth", "start", "duration", "error")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.depth = 0
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.depth = len(self.trace.stack)
+        self.trace.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        self.trace.stack.pop()
+        self.trace.spans.append(self)
+        if exc is not None:
+            self.error = exc_type.__name__
+            if not hasattr(exc, "trace_phase"):
+                # The innermost span an exception left is where it happened
+                try:
+                    exc.trace_phase = self.name
+                except AttributeError:
+                    pass
+        return False
+
+    def to_dict(self):
+        span = {
+            "span": self.name,
+            "depth": self.depth,
+            "start_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3)
+        }
+        if self.attrs:
+            span["attrs"] = self.attrs
+        if self.error:
+            span["error"] = self.error
+        return span
+
+
+class Trace:
+    """The spans of one request"""
+
+    def __init__(self, request_id, name, attrs):
+        self.request_id = request_id
+        self.name = name
+        self.attrs = attrs
+        self.time = time.time()
+        self.start = time.perf_counter()
+        self.stack = []
+        self.spans = []
+        self.error = None
+
+
+class _RequestScope:
+    def __init__(self, tracer, trace):
+        self.tracer = tracer
+        self.trace = trace
+        self.root = Span(trace, trace.name, trace.attrs)
+        self.previous = None
+
+    @property
+    def request_id(self):
+        return self.trace.request_id
+
+    def set(self, **attrs):
+        self.root.set(**attrs)
+
+    def __enter__(self):
+        self.previous = getattr(self.tracer._local, "trace", None)
+        self.tracer._local.trace = self.trace
+        self.root.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.root.__exit__(exc_type, exc, tb)
+        self.tracer._local.trace = self.previous
+        self.tracer._finish(self.trace, self.root)
+        return False
+
+
+class Tracer:
+    """Per-request phase timings, written as JSON lines and kept for /debug/slow
+
+    request() starts a trace on the current thread and span() times a phase
+    of it. Spans started on other threads, or with tracing disabled, are
+    not recorded and cost next to nothing. Each record names the process
+    that served it as "worker"; with a log, slowest() reads it back, so that
+    it covers every worker process writing to the same file.
+    """
+
+    ENABLED = os.environ.get("OFFLINE_COMPILER_TRACE", "0") == "1"
+    LOG_PATH = os.environ.get("OFFLINE_COMPILER_TRACE_LOG")
+    # Finished requests kept in memory for slowest()
+    KEEP = 500
+    # How much of the end of the log slowest() reads
+    LOG_TAIL_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, enabled=None, log_path=None, keep=None):
+        self.enabled = self.ENABLED if enabled is None else enabled
+        self.log_path = self.LOG_PATH if log_path is None else log_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=self.KEEP if keep is None else keep)
+
+    def request(self, name, request_id=None, **attrs):
+        """Context manager tracing one request; a client's request_id is kept if it is sane"""
+        if not self.enabled:
+            return NO_SPAN
+        if not request_id or not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        return _RequestScope(self, Trace(request_id, name, attrs))
+
+    def span(self, name, **attrs):
+        """Context manager timing a phase of the current request"""
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return NO_SPAN
+        return Span(trace, name, attrs)
+
+    @property
+    def request_id(self):
+        trace = getattr(self._local, "trace", None)
+        return trace.request_id if trace else None
+
+    def annotate(self, **attrs):
+        """Add attributes to the current request as a whole"""
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.attrs.update(attrs)
+
+    def error_info(self, exc):
+        """Structured description of an unexpected exception for a response
+
+        The exception is also recorded against the current request, which
+        would otherwise look successful once the error has been handled.
+        """
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.error = type(exc).__name__
+        return {
+            "type": type(exc).__name__,
+            "message": str(exc),
+            "phase": getattr(exc, "trace_phase", None),
+            "request_id": trace.request_id if trace else None
+        }
+
+    def _finish(self, trace, root):
+        spans = sorted(trace.spans, key=lambda span: span.start)
+        record = {
+            "request_id": trace.request_id,
+            "name": trace.name,
+            "worker": os.getpid(),
+            "time": round(trace.time, 3),
+            "duration_ms": round(root.duration * 1000, 3),
+            "attrs": root.attrs,
+            "spans": [span.to_dict() for span in spans]
+        }
+        if root.error or trace.error:
+            record["error"] = root.error or trace.error
+        with self._lock:
+            self._recent.append(record)
+        if self.log_path:
+            shared = {"request_id": trace.request_id, "time": record["time"], "worker": record["worker"]}
+            entries = [dict(span, **shared) for span in record["spans"]]
+            if "error" in record:
+                # Lets the log show errors handled inside the request, which no span saw
+                entries[0]["request_error"] = record["error"]
+            lines = "".join(json.dumps(entry, default=str) + "\n" for entry in entries)
+            try:
+                # One append per request keeps lines from concurrent processes whole
+                with open(self.log_path, "a") as f:
+                    f.write(lines)
+            except OSError:
+                pass
+
+    def slowest(self, limit=20):
+        """The slowest recently finished requests with their spans"""
+        if self.log_path:
+            recent = self._read_log()
+            if recent is not None:
+                return sorted(recent, key=lambda record: record["duration_ms"], reverse=True)[:limit]
+        with self._lock:
+            recent = list(self._recent)
+        return sorted(recent, key=lambda record: record["duration_ms"], reverse=True)[:limit]
+
+    def _read_log(self):
+        """The last requests in the log, from any process; None if it cannot be read"""
+        try:
+            with open(self.log_path, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(size - self.LOG_TAIL_BYTES, 0))
+                data = f.read()
+        except OSError:
+            return None
+        if size > self.LOG_TAIL_BYTES:
+            # Skip the line cut in half
+            data = data.partition(b"\n")[2]
+        recent = deque(maxlen=self._recent.maxlen)
+        record = None
+        for line in data.decode("utf-8", "replace").splitlines():
+            try:
+                span = json.loads(line)
+                request_id, worker, depth = span.pop("request_id"), span.pop("worker", None), span["depth"]
+                record_time, error = span.pop("time"), span.pop("request_error", None)
+            except (ValueError, KeyError, AttributeError):
+                continue
+            if depth == 0:
+                record = {
+                    "request_id": request_id,
+                    "name": span["span"],
+                    "worker": worker,
+                    "time": record_time,
+                    "duration_ms": span["duration_ms"],
+                    "attrs": span.get("attrs", {}),
+                    "spans": [span]
+                }
+                error = error or span.get("error")
+                if error:
+                    record["error"] = error
+                recent.append(record)
+            elif record is not None and (record["request_id"], record["worker"]) == (request_id, worker):
+                record["spans"].append(span)
+        return list(recent)
+
+
+# Shared by the server and the modules it calls into
+tracer = Tracer()
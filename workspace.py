@@ -0,0 +1,131 @@
+import itertools
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+
+from artifact_cache import private_dir, user_suffix
+from tracing import tracer
+
+
+def _noexec(path):
+    """True if programs cannot be executed from the filesystem holding path"""
+    try:
+        return bool(os.statvfs(path).f_flag & getattr(os, "ST_NOEXEC", 0))
+    except (OSError, AttributeError):
+        return True
+
+
+def default_root():
+    """Prefer RAM-backed /dev/shm, unless it is missing, read-only or noexec"""
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK) and not _noexec(shm):
+        return os.path.join(shm, f"offline-compiler{user_suffix()}")
+    return os.path.join(tempfile.gettempdir(), f"offline-compiler-workspaces{user_suffix()}")
+
+
+def _pid_alive(pid):
+    if os.name != "posix":
+        # os.kill() would terminate the process on Windows; never sweep there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WorkspacePool:
+    """Pre-created working directories that requests lease and give back
+
+    Every process keeps its directories under root/pool-<pid>-<id>. A returned
+    directory is renamed into a trash directory and replaced with a fresh
+    empty one, and a background thread deletes the trash. Pools left behind
+    by processes that are no longer running are deleted the same way.
+    """
+
+    SIZE = 8
+
+    def __init__(self, root=None, size=None):
+        self.root = root or default_root()
+        self.size = self.SIZE if size is None else size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._idle = []
+        self._counter = itertools.count()
+
+    def _start(self):
+        """Set up this process's pool; called with the lock held"""
+        # Other pools in the same process get their own directory
+        self._dir = os.path.join(self.root, f"pool-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self._trash_dir = os.path.join(self._dir, "trash")
+        self._idle = []
+        self._pending = queue.Queue()
+        private_dir(self.root)
+        os.makedirs(self._trash_dir)
+        threading.Thread(target=self._cleaner, daemon=True).start()
+        self._sweep()
+
+        for _ in range(self.size):
+            self._idle.append(self._new_dir())
+        self._pid = os.getpid()
+
+    def _sweep(self):
+        """Reclaim the pools of processes that exited without cleaning up"""
+        for name in os.listdir(self.root):
+            parts = name.split("-")
+            if len(parts) != 3 or parts[0] != "pool" or not parts[1].isdigit():
+                continue
+            pid = int(parts[1])
+            if pid != os.getpid() and not _pid_alive(pid):
+                self._discard(os.path.join(self.root, name))
+
+    def _new_dir(self):
+        path = os.path.join(self._dir, f"ws-{next(self._counter)}")
+        os.mkdir(path, 0o700)
+        return path
+
+    def _discard(self, path):
+        """Move path into the trash and queue it for deletion"""
+        trash_path = os.path.join(self._trash_dir, f"{os.path.basename(path)}-{next(self._counter)}")
+        try:
+            os.rename(path, trash_path)
+        except FileNotFoundError:
+            return
+        except OSError:
+            # Open files can prevent renaming on Windows
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        self._pending.put(trash_path)
+
+    def _cleaner(self):
+        while True:
+            shutil.rmtree(self._pending.get(), ignore_errors=True)
+
+    @contextmanager
+    def lease(self):
+        """Yield an empty directory for the duration of a request"""
+        with tracer.span("workspace.acquire"):
+            with self._lock:
+                # Directories belong to the process that created them; start afresh after a fork
+                if self._pid != os.getpid():
+                    self._start()
+                path = self._idle.pop() if self._idle else None
+            if path is None:
+                path = self._new_dir()
+        try:
+            yield path
+        finally:
+            with tracer.span("workspace.release"):
+                self._discard(path)
+                with self._lock:
+                    refill = self._pid == os.getpid() and len(self._idle) < self.size
+                if refill:
+                    fresh = self._new_dir()
+                    with self._lock:
+                        self._idle.append(fresh)